@@ -31,7 +31,7 @@ A Python package and CLI tool to work with w1 temperature sensors.
 # }
 
 import boto3
-from w1thermsensor import W1ThermSensor
+from w1thermsensor.bus import sweep
 
 # Modify these values for your setup
 namespace = "Climate Logging"
@@ -39,11 +39,9 @@ location = "Workshop"
 sensor_names = {"xxxxxxxxxxxx": "Indoor", "yyyyyyyyyyyy": "Outdoor"}
 
 metrics = []
-for sensor in W1ThermSensor.get_available_sensors():
-    print(
-        'Sensor "%s" has temperature %.2f'
-        % (sensor_names[sensor.id], sensor.get_temperature())
-    )
+# read every sensor once, all sensors of a bus at once where it's safe
+for sensor, temperature in sweep():
+    print('Sensor "%s" has temperature %.2f' % (sensor_names[sensor.id], temperature))
     metrics.append(
         {
             "MetricName": "Temperature",
@@ -52,7 +50,7 @@ for sensor in W1ThermSensor.get_available_sensors():
                 {"Name": "Placement", "Value": sensor_names[sensor.id]},
             ],
             "Unit": "None",
-            "Value": sensor.get_temperature(),
+            "Value": temperature,
         }
     )
 
@@ -31,7 +31,8 @@ INSTALL_REQUIRES = ["click"]
 EXTRAS_REQUIRES = {}
 
 EXTRAS_REQUIRES["async"] = ["aiofiles"]
-EXTRAS_REQUIRES["tests"] = EXTRAS_REQUIRES["async"] + \
+EXTRAS_REQUIRES["numpy"] = ["numpy"]
+EXTRAS_REQUIRES["tests"] = EXTRAS_REQUIRES["async"] + EXTRAS_REQUIRES["numpy"] + \
     ["coverage[toml]>=5.0.2", "pytest>5", "pytest-mock", "pytest-asyncio"]
 EXTRAS_REQUIRES["dev"] = (
     EXTRAS_REQUIRES["tests"] + ["flake8",
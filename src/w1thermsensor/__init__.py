@@ -29,7 +29,7 @@ from w1thermsensor.errors import (  # noqa
     W1ThermSensorError
 )
 from w1thermsensor.kernel import load_kernel_modules
-from w1thermsensor.sensors import Sensor  # noqa
+from w1thermsensor.sensors import PowerMode, Sensor  # noqa
 from w1thermsensor.units import Unit  # noqa
 
 # Load kernel modules automatically upon import.
@@ -0,0 +1,142 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from w1thermsensor.bus import ErrorCallback, sweep
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.units import Unit
+
+
+class Alarm(NamedTuple):
+    """Represents a sensor whose temperature crossed its alarm thresholds"""
+
+    sensor: W1ThermSensor
+    temperature: float
+    low: int
+    high: int
+
+
+#: Holds the type of the callbacks called with an alarm
+AlarmCallback = Callable[[Alarm], object]
+
+
+def set_alarms(
+    sensors: Iterable[W1ThermSensor], low: int, high: int, persist: bool = False
+) -> None:
+    """Set the same alarm thresholds for all given sensors.
+
+    See ``W1ThermSensor.set_alarms()`` for full reference.
+
+    :param list sensors: the sensors to set the alarm thresholds for.
+    :param int low: the low (TL) alarm threshold in Degrees Celsius.
+    :param int high: the high (TH) alarm threshold in Degrees Celsius.
+    :param bool persist: if the alarm thresholds should be written to the EEPROMs.
+
+    :raises W1ThermSensorError: if the alarm thresholds of a sensor could not be set
+    """
+    for sensor in sensors:
+        sensor.set_alarms(low, high, persist=persist)
+
+
+class AlarmMonitor:
+    """
+    Monitors a group of sensors for temperatures crossing their alarm thresholds.
+
+    The alarm thresholds are read once from the sensors and cached.
+    Every ``check()`` converts the temperatures with the fastest safe strategy
+    per bus, see ``w1thermsensor.bus.sweep()``, and evaluates the alarm condition
+    like the sensors do: the integer part of the raw temperature is compared
+    against the thresholds. Only the temperatures of the sensors in alarm are
+    converted into the requested unit and reported.
+
+    The monitor doesn't save any bus time: every ``check()`` reads every monitored
+    sensor, exactly like ``sweep()`` does. The 1-Wire alarm search, which finds the
+    sensors in alarm state without reading them, is not exposed by the Linux w1
+    kernel module via sysfs and thus not used.
+
+    Examples:
+        Report temperatures outside of 2 to 8 Degrees Celsius
+
+        >>> sensors = W1ThermSensor.get_available_sensors()
+        >>> set_alarms(sensors, 2, 8)
+        >>> monitor = AlarmMonitor(sensors, on_alarm=print)
+        >>> monitor.check()
+    """
+
+    def __init__(
+        self,
+        sensors: Optional[Iterable[W1ThermSensor]] = None,
+        on_alarm: Optional[AlarmCallback] = None,
+        on_clear: Optional[Callable[[W1ThermSensor], object]] = None,
+        on_error: Optional[ErrorCallback] = None,
+        unit: Unit = Unit.DEGREES_C,
+    ) -> None:
+        """Initializes an AlarmMonitor.
+
+        :param list sensors: the sensors to monitor. Defaults to all available sensors.
+        :param callable on_alarm: called with an ``Alarm`` whenever a sensor enters the
+                                  alarm state.
+        :param callable on_clear: called with the sensor whenever it leaves the alarm state.
+        :param callable on_error: called with the sensor and the error if reading a sensor
+                                  fails. If not given the error is raised.
+        :param unit: the unit of the reported temperatures.
+        """
+        self.sensors = (
+            list(sensors) if sensors is not None else W1ThermSensor.get_available_sensors()
+        )
+        self.on_alarm = on_alarm
+        self.on_clear = on_clear
+        self.on_error = on_error
+        self.unit = unit
+        self._thresholds: Dict[str, Tuple[int, int]] = {}
+        self._alarmed: Dict[str, Alarm] = {}
+        self.refresh_thresholds()
+
+    def refresh_thresholds(self) -> None:
+        """Read the alarm thresholds of all monitored sensors again.
+
+        :raises W1ThermSensorError: if the alarm thresholds of a sensor could not be read
+        """
+        self._thresholds = {s.id: s.get_alarms() for s in self.sensors}
+
+    @property
+    def alarms(self) -> List[Alarm]:
+        """Returns the alarms of the sensors currently in alarm state"""
+        return list(self._alarmed.values())
+
+    def check(self) -> List[Alarm]:
+        """Read all monitored sensors once and report the sensors in alarm state.
+
+        :returns: the alarms of the sensors currently in alarm state.
+        :rtype: list
+        """
+        for sensor, temperature in sweep(self.sensors, Unit.DEGREES_C, self.on_error):
+            low, high = self._thresholds[sensor.id]
+            # the sensor compares the integer part of the raw temperature
+            raw_integer = math.floor(temperature - sensor.offset)
+            if raw_integer <= low or raw_integer >= high:
+                alarm = Alarm(
+                    sensor,
+                    Unit.get_conversion_function(Unit.DEGREES_C, self.unit)(temperature),
+                    low,
+                    high,
+                )
+                is_new = sensor.id not in self._alarmed
+                self._alarmed[sensor.id] = alarm
+                if is_new and self.on_alarm:
+                    self.on_alarm(alarm)
+            elif sensor.id in self._alarmed:
+                del self._alarmed[sensor.id]
+                if self.on_clear:
+                    self.on_clear(sensor)
+
+        return self.alarms
@@ -37,16 +37,18 @@ class AsyncW1ThermSensor(W1ThermSensor):
     """
 
     def __init__(self, *args, **kwargs):  # pragma: no cover
-        try:
-            import aiofiles  # noqa
-        except ImportError:
-            raise W1ThermSensorError(
-                "Install the async extras to add support for AsyncW1ThermSensor: "
-                "pip install w1thermsensor[async]"
-            )
-
+        _check_async_support()
         super().__init__(*args, **kwargs)
 
+    @classmethod
+    def from_known(cls, *args, **kwargs) -> "AsyncW1ThermSensor":  # type: ignore
+        """Create a sensor of a known type and id without looking it up.
+
+        See ``W1ThermSensor.from_known()`` for full reference.
+        """
+        _check_async_support()
+        return super().from_known(*args, **kwargs)  # type: ignore
+
     async def get_raw_sensor_strings(self) -> List[str]:  # type: ignore
         """Reads the raw strings from the kernel module sysfs interface
 
@@ -175,3 +177,13 @@ class AsyncW1ThermSensor(W1ThermSensor):
         """
         raw_temperature_line = (await self.get_raw_sensor_strings())[1]
         return evaluate_resolution(raw_temperature_line)
+
+
+def _check_async_support():  # pragma: no cover
+    try:
+        import aiofiles  # noqa
+    except ImportError:
+        raise W1ThermSensorError(
+            "Install the async extras to add support for AsyncW1ThermSensor: "
+            "pip install w1thermsensor[async]"
+        )
@@ -0,0 +1,325 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+
+The binary log stores readings in 8 bytes each. A file starts with a header::
+
+    magic       4s  b"W1TL"
+    version     B
+    start       q   time of the first reading in milliseconds since the epoch
+    count       H   number of sensors
+    sensors         count times:
+      id_length B
+      id        s   id of the sensor
+      type      B   family code of the sensor
+      resolution B  resolution of the sensor in bits
+      offset    d   offset added to the raw temperatures in Degrees Celsius
+
+followed by the records, all little endian::
+
+    index       H   index of the sensor in the header
+    raw         h   raw temperature in 1/16 Degrees Celsius
+    delta       I   milliseconds since the previous record
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import BinlogError
+from w1thermsensor.frames import _import_numpy
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.streams import Stage
+from w1thermsensor.units import Unit
+
+MAGIC = b"W1TL"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sBqH")
+_SENSOR = struct.Struct("<BBd")
+_RECORD = struct.Struct("<HhI")
+
+#: Holds the number of raw counts per Degree Celsius
+RAW_SCALE = 16
+#: Holds the NumPy dtype of a record
+RECORD_DTYPE = [("index", "<u2"), ("raw", "<i2"), ("delta", "<u4")]
+#: Holds the number of records decoded at once when iterating
+_CHUNK_SIZE = 8192
+
+
+class BinlogSensor(NamedTuple):
+    """Represents a sensor in the header of a binary log"""
+
+    id: str
+    type: Sensor = Sensor.DS18B20
+    resolution: int = 12
+    #: Holds the offset added to the raw temperatures in Degrees Celsius
+    offset: float = 0.0
+
+
+def _encode_header(start: int, sensors: List[BinlogSensor]) -> bytes:
+    header = [_HEADER.pack(MAGIC, VERSION, start, len(sensors))]
+    for sensor in sensors:
+        sensor_id = sensor.id.encode("utf-8")
+        header.append(bytes([len(sensor_id)]) + sensor_id)
+        header.append(_SENSOR.pack(sensor.type.value, sensor.resolution, sensor.offset))
+    return b"".join(header)
+
+
+def _decode_header(data: Any) -> Tuple[int, List[BinlogSensor], int]:
+    """Returns the start, the sensors and the size of the header in the given data"""
+    if len(data) < _HEADER.size:
+        raise BinlogError("The binary log is truncated")
+
+    magic, version, start, count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BinlogError("The file is not a w1thermsensor binary log")
+    if version != VERSION:
+        raise BinlogError("The binary log version {0} is not supported".format(version))
+
+    sensors = []
+    position = _HEADER.size
+    try:
+        for _ in range(count):
+            length = data[position]
+            sensor_id = bytes(data[position + 1:position + 1 + length]).decode("utf-8")
+            position += 1 + length
+            family_code, resolution, offset = _SENSOR.unpack_from(data, position)
+            position += _SENSOR.size
+            sensors.append(BinlogSensor(sensor_id, Sensor(family_code), resolution, offset))
+    except (IndexError, struct.error, ValueError):
+        raise BinlogError("The header of the binary log is invalid")
+    return start, sensors, position
+
+
+class BinlogWriter(Stage):
+    """
+    Writes readings into a binary log.
+
+    The writer is a ``Stage`` which logs every reading passing through it, so it can be put
+    into a pipeline of readings, see ``w1thermsensor.streams.pipe()``.
+
+    The temperatures are stored as raw counts in 1/16 Degrees Celsius after subtracting the
+    sensor's offset, which is the precision of the sensors. The timestamps are stored with
+    millisecond precision as difference to the previous reading, thus the readings must be
+    logged in chronological order and at most about 49 days apart.
+
+    Examples:
+        Log a sensor every second
+
+        >>> sensor = W1ThermSensor()
+        >>> with BinlogWriter("readings.w1log", [BinlogSensor(sensor.id)]) as log:
+        ...     for reading in pipe(stream(sensor, 1), log):
+        ...         pass
+    """
+
+    def __init__(
+        self, path: Union[str, Path], sensors: Iterable[BinlogSensor], append: bool = False
+    ) -> None:
+        """Initializes a BinlogWriter.
+
+        :param str path: the path of the binary log.
+        :param list sensors: the sensors which are logged.
+        :param bool append: append to an existing binary log of the same sensors instead of
+                            replacing it.
+
+        :raises BinlogError: if the existing binary log is invalid or of other sensors.
+        """
+        self.path = Path(path)
+        self.sensors = list(sensors)
+        if len(self.sensors) >= 0xFFFF:
+            raise BinlogError("A binary log holds at most 65534 sensors")
+
+        self._indexes = {sensor.id: index for index, sensor in enumerate(self.sensors)}
+        self._last: Optional[int] = None
+        self._file: BinaryIO
+
+        if append and self.path.exists() and self.path.stat().st_size > 0:
+            with BinlogReader(self.path) as reader:
+                if reader.sensors != self.sensors:
+                    raise BinlogError("The binary log {0} is of other sensors".format(path))
+                self._last = reader.start + sum(reader.get_deltas())
+                end = reader._offset + len(reader) * _RECORD.size
+            # drop a record which was partially written, e.g. on power loss
+            os.truncate(str(self.path), end)
+            self._file = self.path.open("ab")
+        else:
+            self._file = self.path.open("wb")
+
+    def __enter__(self) -> "BinlogWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, reading: Reading) -> None:
+        """Log the given reading.
+
+        :raises BinlogError: if the reading cannot be logged.
+        """
+        index = self._indexes.get(reading.sensor_id)
+        if index is None:
+            raise BinlogError("The sensor {0} is not logged".format(reading.sensor_id))
+
+        celsius = Unit.get_conversion_function(reading.unit, Unit.DEGREES_C)(reading.temperature)
+        raw = round((celsius - self.sensors[index].offset) * RAW_SCALE)
+        if not -0x8000 <= raw <= 0x7FFF:
+            raise BinlogError(
+                "The temperature {0} is out of the range of the binary log".format(celsius)
+            )
+
+        timestamp = round(reading.timestamp * 1000)
+        if self._last is None:
+            self._file.write(_encode_header(timestamp, self.sensors))
+            self._last = timestamp
+
+        delta = timestamp - self._last
+        if not 0 <= delta <= 0xFFFFFFFF:
+            raise BinlogError(
+                "The reading at {0} is older than the previous one "
+                "or too far apart from it".format(reading.timestamp)
+            )
+
+        self._file.write(_RECORD.pack(index, raw, delta))
+        self._last = timestamp
+
+    def flush(self) -> Iterable[Reading]:
+        self._file.flush()
+        return ()
+
+    def close(self) -> None:
+        """Flush and close the binary log"""
+        self._file.close()
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        self.write(item)
+        return (item,)
+
+
+class BinlogReader:
+    """
+    Reads readings from a binary log.
+
+    The log is memory mapped and the records are decoded on access, thus opening even
+    large logs is instant. Iterating decodes the records sequentially, ``to_arrays()``
+    decodes all records at once with NumPy.
+
+    Examples:
+        Compute the mean temperature of every sensor
+
+        >>> with BinlogReader("readings.w1log") as log:
+        ...     timestamps, indexes, temperatures = log.to_arrays()
+        ...     means = [temperatures[indexes == i].mean() for i in range(len(log.sensors))]
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """Initializes a BinlogReader.
+
+        :param str path: the path of the binary log.
+
+        :raises BinlogError: if the binary log is invalid.
+        """
+        self.path = Path(path)
+        with self.path.open("rb") as log_file:
+            size = os.fstat(log_file.fileno()).st_size
+            if size == 0:
+                raise BinlogError("The binary log {0} is empty".format(path))
+            self._mmap = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        #: Holds the time of the first reading in milliseconds since the epoch
+        self.start, self.sensors, self._offset = _decode_header(self._mmap)
+        # ignore a record which is partially written
+        self._count = (len(self._mmap) - self._offset) // _RECORD.size
+        self._timestamps: Optional["array[int]"] = None
+
+    def __enter__(self) -> "BinlogReader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Reading]:
+        timestamp = self.start
+        for index, raw, delta in self._iter_records():
+            timestamp += delta
+            yield self._to_reading(index, raw, timestamp)
+
+    def __getitem__(self, position: int) -> Reading:
+        """Returns the reading at the given position in the log"""
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("binary log index out of range")
+
+        if self._timestamps is None:
+            # the timestamps are delta encoded, thus index them once for random access
+            timestamps = array("q")
+            timestamp = self.start
+            for delta in self.get_deltas():
+                timestamp += delta
+                timestamps.append(timestamp)
+            self._timestamps = timestamps
+
+        index, raw, _ = _RECORD.unpack_from(self._mmap, self._offset + position * _RECORD.size)
+        return self._to_reading(index, raw, self._timestamps[position])
+
+    def get_deltas(self) -> Iterator[int]:
+        """Returns the milliseconds between the records"""
+        return (delta for _, _, delta in self._iter_records())
+
+    def to_arrays(self) -> Tuple[Any, Any, Any]:
+        """Decode all records at once.
+
+        This requires NumPy: pip install w1thermsensor[numpy]
+
+        :returns: the timestamps in milliseconds since the epoch, the sensor indexes
+                  and the temperatures in Degrees Celsius as NumPy arrays.
+        :rtype: tuple
+        """
+        numpy = _import_numpy()
+        records = numpy.frombuffer(
+            self._mmap, dtype=RECORD_DTYPE, count=self._count, offset=self._offset
+        )
+        timestamps = self.start + numpy.cumsum(records["delta"], dtype=numpy.int64)
+        # copy the indexes, so the arrays don't keep the memory map open
+        indexes = records["index"].copy()
+        offsets = numpy.array([s.offset for s in self.sensors], dtype=numpy.float64)
+        temperatures = records["raw"] / RAW_SCALE + offsets[indexes]
+        return timestamps, indexes, temperatures
+
+    def _iter_records(self) -> Iterator[Tuple[int, int, int]]:
+        end = self._offset + self._count * _RECORD.size
+        chunk_size = _CHUNK_SIZE * _RECORD.size
+        for position in range(self._offset, end, chunk_size):
+            yield from _RECORD.iter_unpack(self._mmap[position:min(position + chunk_size, end)])
+
+    def _to_reading(self, index: int, raw: int, timestamp: int) -> Reading:
+        try:
+            sensor = self.sensors[index]
+        except IndexError:
+            raise BinlogError("The binary log references the unknown sensor {0}".format(index))
+        return Reading(sensor.id, timestamp / 1000, raw / RAW_SCALE + sensor.offset)
+
+
+def get_binlog_sensors(sensors: Iterable[W1ThermSensor]) -> List[BinlogSensor]:
+    """Returns the header entries for the given ``W1ThermSensor``s.
+
+    Reading the resolutions triggers a conversion of every sensor.
+    """
+    return [BinlogSensor(s.id, s.type, s.get_resolution(), s.offset) for s in sensors]
@@ -0,0 +1,453 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import time
+from enum import Enum
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.discovery import BUS_MASTER_GLOB, MASTER_SLAVES_FILE, parse_slave_name
+from w1thermsensor.errors import W1ThermSensorError
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import PowerMode
+from w1thermsensor.units import Unit
+
+#: Holds the type of the callbacks called with a sensor and the error reading it
+ErrorCallback = Callable[[W1ThermSensor, Exception], object]
+
+
+class ConversionStrategy(Enum):
+    """Supported strategies to convert the temperatures of the sensors on a bus"""
+
+    #: convert all sensors on the bus at once
+    BULK = "bulk"
+    #: convert the sensors one after the other
+    SERIAL = "serial"
+
+
+class BusMaster:
+    """
+    Represents a w1 bus master provided by the Linux w1 kernel module.
+
+    The kernel periodically searches every bus for joining and leaving slaves.
+    Each search occupies the bus and thus delays the temperature conversions.
+    Disable the background search once all sensors are connected and only search
+    on demand to leave more bus time for the temperature readings.
+
+    Examples:
+        List all bus masters
+
+        >>> BusMaster.get_available_bus_masters()
+
+        Disable the background search and search once on demand
+
+        >>> bus_master = BusMaster("w1_bus_master1")
+        >>> bus_master.disable_search()
+        >>> bus_master.search()
+
+        Read all sensors on the bus with the fastest safe conversion strategy
+
+        >>> for sensor, temperature in bus_master.sweep():
+        ...     print(sensor.id, temperature)
+
+    Note: root permissions are required to change the bus master settings.
+    """
+
+    #: Holds the search count which lets the kernel search continuously
+    SEARCH_CONTINUOUS = -1
+
+    #: Holds the attribute to trigger a bulk conversion of all sensors on the bus
+    BULK_READ_FILE = "therm_bulk_read"
+    #: Holds the attribute to enable the strong pull-up for parasitically powered sensors
+    PULLUP_FILE = "w1_master_pullup"
+
+    def __init__(self, name: str) -> None:
+        """Initializes a BusMaster.
+
+        :param str name: the name of the bus master, e.g. ``w1_bus_master1``.
+
+        :raises W1ThermSensorError: if the bus master does not exist
+        """
+        self.name = name
+        self.path = W1ThermSensor.BASE_DIRECTORY / name
+        self._power_modes: Dict[str, PowerMode] = {}
+        #: Holds if the bus master settings can be written, which requires root
+        self._writable = True
+
+        if not (self.path / MASTER_SLAVES_FILE).exists():
+            raise W1ThermSensorError("Could not find bus master {}".format(name))
+
+    @classmethod
+    def get_available_bus_masters(cls) -> List["BusMaster"]:
+        """Return all available bus masters.
+
+        :returns: a list of bus master instances.
+        :rtype: list
+        """
+        return [
+            cls(p.name)
+            for p in sorted(W1ThermSensor.BASE_DIRECTORY.glob(BUS_MASTER_GLOB))
+            if (p / MASTER_SLAVES_FILE).exists()
+        ]
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return "{}(name='{}')".format(self.__class__.__name__, self.name)
+
+    def _read_attribute(self, attribute: str) -> str:
+        try:
+            return (self.path / attribute).read_text().strip()
+        except IOError:
+            raise W1ThermSensorError(
+                "Failed to read {} of bus master {}".format(attribute, self.name)
+            )
+
+    def _write_attribute(self, attribute: str, value: object) -> None:
+        try:
+            (self.path / attribute).write_text("{}\n".format(value))
+        except IOError:
+            raise W1ThermSensorError(
+                "Failed to write {} of bus master {}. "
+                "You might have to be root to change the bus master settings".format(
+                    attribute, self.name
+                )
+            )
+
+    def get_slaves(self) -> List[str]:
+        """Get the names of all slaves connected to this bus master.
+
+        :returns: the slave names, e.g. ``28-00000588806a``.
+        :rtype: list
+        """
+        slaves = self._read_attribute(MASTER_SLAVES_FILE)
+        if slaves == "not found.":
+            return []
+        return slaves.split()
+
+    def get_slave_count(self) -> int:
+        """Get the amount of slaves connected to this bus master.
+
+        :returns: the amount of slaves, including the ones which are not supported sensors.
+        :rtype: int
+        """
+        return int(self._read_attribute("w1_master_slave_count"))
+
+    def get_sensors(self, sensor_class: Type[W1ThermSensor] = W1ThermSensor) -> List[W1ThermSensor]:
+        """Get the supported sensors connected to this bus master.
+
+        :param sensor_class: the class to instantiate the sensors with.
+
+        :returns: a list of sensor instances.
+        :rtype: list
+        """
+        sensors = []
+        for slave_name in self.get_slaves():
+            parsed = parse_slave_name(slave_name)
+            if parsed is not None:
+                sensors.append(sensor_class.from_known(*parsed))
+        return sensors
+
+    def get_search_interval(self) -> float:
+        """Get the interval between two searches of the kernel.
+
+        The interval can only be changed with the ``timeout`` and ``timeout_us``
+        parameters of the ``wire`` kernel module.
+
+        :returns: the search interval in seconds.
+        :rtype: float
+        """
+        interval = float(self._read_attribute("w1_master_timeout"))
+        if (self.path / "w1_master_timeout_us").exists():
+            interval += float(self._read_attribute("w1_master_timeout_us")) * 1e-6
+        return interval
+
+    def get_search_count(self) -> int:
+        """Get the amount of searches the kernel will still do.
+
+        :returns: the remaining searches or ``SEARCH_CONTINUOUS`` (-1)
+                  if the kernel searches continuously.
+        :rtype: int
+        """
+        return int(self._read_attribute("w1_master_search"))
+
+    def set_search_count(self, count: int) -> None:
+        """Set the amount of searches the kernel will do.
+
+        Once the kernel did the given amount of searches the background search stops.
+
+        :param int count: the amount of searches, ``0`` to disable
+                          or ``SEARCH_CONTINUOUS`` (-1) to search continuously.
+
+        :raises W1ThermSensorError: if the search count could not be changed
+        """
+        if count < self.SEARCH_CONTINUOUS:
+            raise ValueError("The given search count '{}' is invalid".format(count))
+
+        self._write_attribute("w1_master_search", count)
+
+    def enable_search(self) -> None:
+        """Let the kernel search continuously for joining and leaving slaves"""
+        self.set_search_count(self.SEARCH_CONTINUOUS)
+
+    def disable_search(self) -> None:
+        """Stop the kernel from searching for joining and leaving slaves"""
+        self.set_search_count(0)
+
+    def search(self, count: int = 1) -> None:
+        """Trigger an explicit search for joining and leaving slaves.
+
+        The kernel wakes up the search immediately. Afterwards the background search
+        stays disabled, unless it's enabled again with ``enable_search()``.
+
+        :param int count: the amount of searches to do.
+
+        :raises W1ThermSensorError: if the search could not be triggered
+        """
+        if count < 1:
+            raise ValueError("The given search count '{}' is invalid".format(count))
+
+        self.set_search_count(count)
+
+    def get_pullup(self) -> bool:
+        """Get if the strong pull-up for parasitically powered sensors is enabled.
+
+        :returns: if the strong pull-up is enabled.
+        :rtype: bool
+        """
+        return self._read_attribute(self.PULLUP_FILE) != "0"
+
+    def set_pullup(self, enabled: bool) -> None:
+        """Enable or disable the strong pull-up for parasitically powered sensors.
+
+        :param bool enabled: if the strong pull-up should be enabled.
+
+        :raises W1ThermSensorError: if the strong pull-up could not be changed
+        """
+        self._write_attribute(self.PULLUP_FILE, int(enabled))
+
+    def supports_bulk_conversion(self) -> bool:
+        """Returns if the kernel supports converting all sensors on this bus at once
+
+        Note: This is supported since kernel 5.10.
+        """
+        return (self.path / self.BULK_READ_FILE).exists()
+
+    def trigger_bulk_conversion(self) -> None:
+        """Start the temperature conversion of all sensors on this bus at once.
+
+        The following reads of the sensors return the converted temperatures
+        without starting another conversion.
+
+        :raises W1ThermSensorError: if the bulk conversion could not be triggered
+        """
+        self._write_attribute(self.BULK_READ_FILE, "trigger")
+
+    def _get_power_mode(self, sensor: W1ThermSensor) -> PowerMode:
+        # the power mode is cached because reading it takes a bus transaction
+        if sensor.id not in self._power_modes:
+            try:
+                self._power_modes[sensor.id] = sensor.get_power_mode()
+            except W1ThermSensorError:
+                # treat sensors with unknown power mode as parasitic to be safe
+                return PowerMode.PARASITE
+        return self._power_modes[sensor.id]
+
+    def select_conversion_strategy(self) -> ConversionStrategy:
+        """Select the fastest safe strategy to convert the temperatures of the sensors on this bus.
+
+        A bulk conversion converts all sensors on the bus at once, no matter which of them
+        are read afterwards. Parasitically powered sensors cannot be converted simultaneously
+        without a strong pull-up, thus a bulk conversion is only selected if all
+        sensors on the bus are externally powered. Otherwise the sensors are read one after
+        the other, with the strong pull-up enabled for the parasitic ones.
+
+        A bulk conversion is neither selected once triggering it failed,
+        e.g. because the process is not running as root.
+
+        :returns: the conversion strategy to use.
+        :rtype: ConversionStrategy
+        """
+        if (
+            self._writable
+            and self.supports_bulk_conversion()
+            and all(self._get_power_mode(s) is PowerMode.EXTERNAL for s in self.get_sensors())
+        ):
+            return ConversionStrategy.BULK
+
+        return ConversionStrategy.SERIAL
+
+    def sweep(
+        self,
+        sensors: Optional[Iterable[W1ThermSensor]] = None,
+        unit: Unit = Unit.DEGREES_C,
+        on_error: Optional[ErrorCallback] = None,
+    ) -> Iterator[Tuple[W1ThermSensor, float]]:
+        """Read the temperatures of the given sensors with the fastest safe strategy.
+
+        The temperatures are yielded as soon as they are read.
+        If the bulk conversion cannot be triggered or the strong pull-up cannot be enabled,
+        e.g. because the process is not running as root, the sensors are read one after
+        the other with the pull-up unchanged. This is remembered for the following sweeps.
+
+        :param list sensors: the sensors to read. Defaults to all sensors on this bus.
+        :param unit: the unit of the temperatures.
+        :param callable on_error: called with the sensor and the error if reading a sensor
+                                  fails. If not given the error is raised.
+
+        :returns: the sensors and their temperatures.
+        :rtype: iterator
+        """
+        for sensor, reading in self._sweep(sensors, unit, on_error):
+            yield sensor, reading.temperature
+
+    def sweep_readings(
+        self,
+        sensors: Optional[Iterable[W1ThermSensor]] = None,
+        unit: Unit = Unit.DEGREES_C,
+        on_error: Optional[ErrorCallback] = None,
+    ) -> Iterator[Reading]:
+        """Read the temperatures of the given sensors like ``sweep()`` and yield readings.
+
+        The readings are timestamped with the start of their conversion, thus all
+        readings of a bulk conversion share the exact same timestamp.
+
+        See ``sweep()`` for full reference.
+        """
+        for _, reading in self._sweep(sensors, unit, on_error):
+            yield reading
+
+    def _sweep(
+        self,
+        sensors: Optional[Iterable[W1ThermSensor]],
+        unit: Unit,
+        on_error: Optional[ErrorCallback],
+    ) -> Iterator[Tuple[W1ThermSensor, Reading]]:
+        sensors = self.get_sensors() if sensors is None else list(sensors)
+        if not sensors:
+            return
+
+        if self.select_conversion_strategy() is ConversionStrategy.BULK:
+            converted = time.time()
+            try:
+                self.trigger_bulk_conversion()
+            except W1ThermSensorError:
+                self._writable = False
+            else:
+                for sensor in sensors:
+                    yield from _read_temperature(sensor, unit, on_error, converted)
+                return
+
+        restore_pullup = None
+        try:
+            if (
+                self._writable
+                and (self.path / self.PULLUP_FILE).exists()
+                and any(self._get_power_mode(s) is PowerMode.PARASITE for s in sensors)
+            ):
+                pullup = self.get_pullup()
+                if not pullup:
+                    try:
+                        self.set_pullup(True)
+                    except W1ThermSensorError:
+                        self._writable = False
+                    else:
+                        restore_pullup = pullup
+
+            for sensor in sensors:
+                yield from _read_temperature(sensor, unit, on_error)
+        finally:
+            if restore_pullup is not None:
+                self.set_pullup(restore_pullup)
+
+
+def sweep(
+    sensors: Optional[Iterable[W1ThermSensor]] = None,
+    unit: Unit = Unit.DEGREES_C,
+    on_error: Optional[ErrorCallback] = None,
+) -> Iterator[Tuple[W1ThermSensor, float]]:
+    """Read the temperatures of the given sensors with the fastest safe strategy per bus.
+
+    The sensors are grouped by their bus master, which then selects the conversion strategy.
+    Sensors of an unknown bus master are read one after the other.
+
+    :param list sensors: the sensors to read. Defaults to all available sensors.
+    :param unit: the unit of the temperatures.
+    :param callable on_error: called with the sensor and the error if reading a sensor
+                              fails. If not given the error is raised.
+
+    :returns: the sensors and their temperatures.
+    :rtype: iterator
+    """
+    for sensor, reading in _sweep(sensors, unit, on_error):
+        yield sensor, reading.temperature
+
+
+def sweep_readings(
+    sensors: Optional[Iterable[W1ThermSensor]] = None,
+    unit: Unit = Unit.DEGREES_C,
+    on_error: Optional[ErrorCallback] = None,
+) -> Iterator[Reading]:
+    """Read the temperatures of the given sensors like ``sweep()`` and yield readings.
+
+    See ``BusMaster.sweep_readings()`` for full reference.
+    """
+    for _, reading in _sweep(sensors, unit, on_error):
+        yield reading
+
+
+def _sweep(
+    sensors: Optional[Iterable[W1ThermSensor]],
+    unit: Unit,
+    on_error: Optional[ErrorCallback],
+) -> Iterator[Tuple[W1ThermSensor, Reading]]:
+    if sensors is None:
+        sensors = W1ThermSensor.get_available_sensors()
+
+    registry = W1ThermSensor.get_sensor_registry()
+    by_bus_master: Dict[Optional[str], List[W1ThermSensor]] = {}
+    for sensor in sensors:
+        discovered = registry.get(sensor.id)
+        bus_master = discovered.bus_master if discovered else None
+        by_bus_master.setdefault(bus_master, []).append(sensor)
+
+    for bus_master_name, bus_sensors in by_bus_master.items():
+        if bus_master_name is None:
+            for sensor in bus_sensors:
+                yield from _read_temperature(sensor, unit, on_error)
+        else:
+            yield from _get_bus_master(bus_master_name)._sweep(bus_sensors, unit, on_error)
+
+
+#: Holds the bus masters used for sweeps to share their cached power modes
+_BUS_MASTERS: Dict[Tuple[str, str], BusMaster] = {}
+
+
+def _get_bus_master(name: str) -> BusMaster:
+    key = (str(W1ThermSensor.BASE_DIRECTORY), name)
+    if key not in _BUS_MASTERS:
+        _BUS_MASTERS[key] = BusMaster(name)
+    return _BUS_MASTERS[key]
+
+
+def _read_temperature(
+    sensor: W1ThermSensor,
+    unit: Unit,
+    on_error: Optional[ErrorCallback],
+    converted: Optional[float] = None,
+) -> Iterator[Tuple[W1ThermSensor, Reading]]:
+    if converted is None:
+        converted = time.time()
+    try:
+        temperature = sensor.get_temperature(unit)
+    except W1ThermSensorError as exc:
+        if on_error is None:
+            raise
+        on_error(sensor, exc)
+    else:
+        yield sensor, Reading(sensor.id, converted, temperature, unit)
@@ -8,7 +8,21 @@ A Python package and CLI tool to work with w1 temperature sensors.
 :license: MIT, see LICENSE for more details.
 """
 
+import json
+from bisect import bisect_right
 from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from w1thermsensor.errors import InvalidCalibrationDataError
 
@@ -110,3 +124,284 @@ class CalibrationData:
         scaling_factor = reference_range / measured_range
         return ((raw_temperature - self.measured_low_point) * scaling_factor
                 + self.reference_low_point)
+
+    def to_dict(self) -> Dict:
+        """
+        Returns a JSON serializable representation of this calibration data.
+        Use ``calibration_data_from_dict()`` to load it back.
+        """
+        return {
+            "kind": "two-point",
+            "measured_high_point": self.measured_high_point,
+            "measured_low_point": self.measured_low_point,
+            "reference_high_point": self.reference_high_point,
+            "reference_low_point": self.reference_low_point,
+        }
+
+
+@dataclass(frozen=True)
+class PiecewiseCalibrationData:
+    """
+    This Class represents calibration data consisting of multiple points which map a
+    measured temperature to a reference temperature.
+
+    Raw readings between two points are corrected by linear interpolation between them.
+    Raw readings outside of the covered range are extrapolated using the first or last
+    segment respectively.
+
+    The points are tuples of ``(measured, reference)`` in Celsius and must be sorted
+    by the measured temperature.  Usually these are not created by hand, but fitted
+    from logged readings using ``fit_calibration_data()``.
+    """
+
+    points: Tuple[Tuple[float, float], ...]
+
+    def __post_init__(self):
+        """
+        Validates that at least two points are given and that they are strictly increasing
+        in both the measured and the reference temperature.
+        """
+        # normalize points to a tuple of tuples to keep the instance hashable
+        object.__setattr__(
+            self, "points", tuple((float(m), float(r)) for m, r in self.points)
+        )
+
+        if len(self.points) < 2:
+            raise InvalidCalibrationDataError(
+                "At least two calibration points must be provided", self.__str__()
+            )
+
+        for (measured_a, reference_a), (measured_b, reference_b) in zip(
+            self.points, self.points[1:]
+        ):
+            if measured_a >= measured_b or reference_a >= reference_b:
+                raise InvalidCalibrationDataError(
+                    "Calibration points must be strictly increasing", self.__str__()
+                )
+
+    def correct_temperature_for_calibration_data(self, raw_temperature):
+        """
+        Correct the temperature based on the calibration points by interpolating linearly
+        within the segment the raw temperature falls into.
+        """
+        measured_points = [m for m, _ in self.points]
+        index = bisect_right(measured_points, raw_temperature)
+        # clamp to the first and last segment for extrapolation
+        index = min(max(index, 1), len(self.points) - 1)
+        measured_low, reference_low = self.points[index - 1]
+        measured_high, reference_high = self.points[index]
+        scaling_factor = (reference_high - reference_low) / (measured_high - measured_low)
+        return (raw_temperature - measured_low) * scaling_factor + reference_low
+
+    def to_dict(self) -> Dict:
+        """
+        Returns a JSON serializable representation of this calibration data.
+        Use ``calibration_data_from_dict()`` to load it back.
+        """
+        return {"kind": "piecewise", "points": [list(p) for p in self.points]}
+
+
+#: Holds the types of calibration data a sensor can be constructed with
+AnyCalibrationData = Union[CalibrationData, PiecewiseCalibrationData]
+
+
+def calibration_data_from_dict(data: Mapping) -> AnyCalibrationData:
+    """
+    Create calibration data from its ``to_dict()`` representation.
+
+    :raises InvalidCalibrationDataError: if the representation is invalid
+    """
+    try:
+        kind = data.get("kind")
+        if kind == "two-point":
+            return CalibrationData(
+                measured_high_point=data["measured_high_point"],
+                measured_low_point=data["measured_low_point"],
+                reference_high_point=data["reference_high_point"],
+                reference_low_point=data["reference_low_point"],
+            )
+        if kind == "piecewise":
+            return PiecewiseCalibrationData(tuple(tuple(p) for p in data["points"]))
+    except KeyError as exc:
+        raise InvalidCalibrationDataError(
+            "Key {0} must be provided.".format(exc), data
+        )
+    except (AttributeError, TypeError, ValueError) as exc:
+        raise InvalidCalibrationDataError(
+            "Values must be numbers and points pairs of numbers: {0}".format(exc), data
+        )
+
+    raise InvalidCalibrationDataError("Unknown calibration kind {!r}".format(kind), data)
+
+
+def save_calibration_data(
+    path: Union[str, Path], calibration_data: Mapping[str, AnyCalibrationData]
+) -> None:
+    """
+    Save the calibration data of multiple sensors keyed by their sensor id as JSON file.
+    """
+    with Path(path).open("w", encoding="utf-8") as f:
+        json.dump(
+            {sensor_id: c.to_dict() for sensor_id, c in calibration_data.items()},
+            f,
+            indent=4,
+            sort_keys=True,
+        )
+
+
+def load_calibration_data(path: Union[str, Path]) -> Dict[str, AnyCalibrationData]:
+    """
+    Load the calibration data of multiple sensors saved with ``save_calibration_data()``.
+
+    The result is keyed by the sensor id and can be passed to the sensors on construction:
+
+    >>> calibrations = load_calibration_data("calibrations.json")
+    >>> sensor = W1ThermSensor(sensor_id=sensor_id, calibration_data=calibrations[sensor_id])
+    """
+    with Path(path).open(encoding="utf-8") as f:
+        data = json.load(f)
+
+    if not isinstance(data, dict):
+        raise InvalidCalibrationDataError(
+            "Calibration data must be keyed by sensor id.", data
+        )
+
+    return {
+        sensor_id: calibration_data_from_dict(c) for sensor_id, c in data.items()
+    }
+
+
+class _FitAccumulator:
+    """Accumulates the sums required for a least-squares line fit"""
+
+    __slots__ = ("n", "sum_x", "sum_y", "sum_xx", "sum_xy", "min_x", "max_x")
+
+    def __init__(self):
+        self.n = 0
+        self.sum_x = self.sum_y = self.sum_xx = self.sum_xy = 0.0
+        self.min_x = float("inf")
+        self.max_x = float("-inf")
+
+    def add(self, x: float, y: float) -> None:
+        self.n += 1
+        self.sum_x += x
+        self.sum_y += y
+        self.sum_xx += x * x
+        self.sum_xy += x * y
+        if x < self.min_x:
+            self.min_x = x
+        if x > self.max_x:
+            self.max_x = x
+
+    def line(self) -> Optional[Tuple[float, float]]:
+        """Returns the ``(slope, intercept)`` of the fitted line or ``None`` if degenerated"""
+        denominator = self.n * self.sum_xx - self.sum_x * self.sum_x
+        if self.n < 2 or denominator <= 0:
+            return None
+        slope = (self.n * self.sum_xy - self.sum_x * self.sum_y) / denominator
+        intercept = (self.sum_y - slope * self.sum_x) / self.n
+        return slope, intercept
+
+
+def fit_calibration_data(
+    readings: Mapping[str, Sequence[Optional[float]]],
+    reference_readings: Sequence[Optional[float]],
+    breakpoints: Optional[Iterable[float]] = None,
+    on_error: Optional[Callable[[str, InvalidCalibrationDataError], None]] = None,
+) -> Dict[str, AnyCalibrationData]:
+    """
+    Fit calibration data for multiple sensors from readings logged next to a reference sensor.
+
+    The readings of every sensor must be aligned with the reference readings, thus the
+    n-th reading of each sensor was taken at the same time as the n-th reference reading.
+    Missing readings may be given as ``None`` and are skipped.
+    All readings must be in Celsius.
+
+    If no ``breakpoints`` are given a straight line is fitted with least-squares
+    for every sensor and returned as two-point ``CalibrationData``.
+
+    If ``breakpoints`` are given the measured temperature range is split at these
+    temperatures into bins.  The mean measured and mean reference temperature of every
+    bin become the points of a ``PiecewiseCalibrationData``.
+
+    All sensors are fitted in a single pass over the data. A sensor which cannot be
+    fitted, e.g. because its readings are constant, doesn't prevent fitting the others.
+
+    :param dict readings: the readings of the sensors keyed by their sensor id.
+    :param list reference_readings: the readings of the reference sensor.
+    :param list breakpoints: the measured temperatures to split the bins at.
+    :param callable on_error: called with the sensor id and the error for every sensor
+                              which cannot be fitted. Those sensors are left out of the
+                              result. If not given, an error naming all of them is raised.
+
+    :returns: the fitted calibration data keyed by the sensor id.
+    :rtype: dict
+
+    :raises InvalidCalibrationDataError: if the readings of a sensor are fewer than the
+                                         reference readings or if the readings of a sensor
+                                         cannot be fitted and no ``on_error`` is given.
+    """
+    short = [s for s, values in readings.items() if len(values) < len(reference_readings)]
+    if short:
+        raise InvalidCalibrationDataError(
+            "Readings of sensors {} are fewer than the {} reference readings".format(
+                ", ".join(short), len(reference_readings)
+            ),
+            None,
+        )
+
+    edges: List[float] = sorted(breakpoints) if breakpoints is not None else []
+    accumulators = {
+        sensor_id: [_FitAccumulator() for _ in range(len(edges) + 1)]
+        for sensor_id in readings
+    }
+
+    sensor_readings = [(readings[s], accumulators[s]) for s in readings]
+    for index, reference in enumerate(reference_readings):
+        if reference is None:
+            continue
+        for values, bins in sensor_readings:
+            measured = values[index]
+            if measured is None:
+                continue
+            bins[bisect_right(edges, measured) if edges else 0].add(measured, reference)
+
+    results: Dict[str, AnyCalibrationData] = {}
+    failed: List[str] = []
+    for sensor_id, bins in accumulators.items():
+        try:
+            if breakpoints is None:
+                results[sensor_id] = _two_point_from_fit(sensor_id, bins[0])
+            else:
+                points = tuple(
+                    (b.sum_x / b.n, b.sum_y / b.n) for b in bins if b.n > 0
+                )
+                results[sensor_id] = PiecewiseCalibrationData(points)
+        except InvalidCalibrationDataError as exc:
+            if on_error is None:
+                failed.append(sensor_id)
+            else:
+                on_error(sensor_id, exc)
+
+    if failed:
+        raise InvalidCalibrationDataError(
+            "Readings of sensors {} cannot be fitted".format(", ".join(failed)), None
+        )
+
+    return results
+
+
+def _two_point_from_fit(sensor_id: str, accumulator: _FitAccumulator) -> CalibrationData:
+    line = accumulator.line()
+    if line is None or line[0] <= 0:
+        raise InvalidCalibrationDataError(
+            "Readings of sensor {} cannot be fitted".format(sensor_id), None
+        )
+
+    slope, intercept = line
+    return CalibrationData(
+        measured_high_point=accumulator.max_x,
+        measured_low_point=accumulator.min_x,
+        reference_high_point=slope * accumulator.max_x + intercept,
+        reference_low_point=slope * accumulator.min_x + intercept,
+    )
@@ -8,12 +8,28 @@ A Python package and CLI tool to work with w1 temperature sensors.
 :license: MIT, see LICENSE for more details.
 """
 
+import csv
+import io
 import json
-from itertools import count
+import os
+import tempfile
+import time
+from typing import NamedTuple, Optional
 
 import click
 
+from w1thermsensor.bus import sweep_readings
 from w1thermsensor.core import Sensor, Unit, W1ThermSensor
+from w1thermsensor.discovery import DISCOVERY_CACHE
+from w1thermsensor.errors import DaemonError
+from w1thermsensor.openmetrics import (
+    DEFAULT_PORT,
+    MetricFamily,
+    Sample,
+    format_metrics,
+    get_sensor_labels,
+)
+from w1thermsensor.readings import Reading
 
 #: major click version to compensate API changes
 CLICK_MAJOR_VERSION = int(click.__version__.split(".")[0])
@@ -30,6 +46,303 @@ def resolve_type_name(ctx, param, value):  # pylint: disable=unused-argument
         return Sensor[value]
 
 
+def get_sensor_by_number(number):
+    """Get the sensor with the given number as listed by the ls command
+
+    Only the requested sensor is instantiated from the discovered sensors.
+    """
+    try:
+        discovered = DISCOVERY_CACHE.get_sensors(W1ThermSensor.BASE_DIRECTORY)[number - 1]
+    except IndexError:
+        error_msg = (
+            "No sensor with id {0} available. ".format(number)
+            + "Use the ls command to show all available sensors."
+        )
+        if CLICK_MAJOR_VERSION >= 7:  # pragma: no cover
+            raise click.BadOptionUsage("--id", error_msg)
+        else:  # pragma: no cover
+            raise click.BadOptionUsage(error_msg)
+
+    return W1ThermSensor.from_known(discovered.type, discovered.id)
+
+
+def get_daemon_states(types=None):
+    """Get the sensors sampled by the w1thermsensor daemon
+
+    Returns ``None`` if the daemon is not running.
+    """
+    from w1thermsensor.daemon import DaemonClient
+
+    try:
+        states = DaemonClient().get_sensors()
+    except DaemonError:
+        return None
+
+    if types:
+        states = [s for s in states if s.type in types]
+    return states
+
+
+def get_daemon_state(number, hwid, type_):
+    """Get the sensor sampled by the w1thermsensor daemon like the get command selects it
+
+    Returns ``None`` if the daemon is not running or hasn't sampled the sensor.
+    """
+    states = get_daemon_states()
+    if not states:
+        return None
+
+    if number:
+        return states[number - 1] if number <= len(states) else None
+
+    for state in states:
+        if (not hwid or state.id == hwid) and (not type_ or state.type == type_):
+            return state
+    return None
+
+
+def is_fresh(states, max_age):
+    """Check if the latest readings of the given daemon sensors are at most max_age seconds old"""
+    for state in states:
+        age = state.get_age()
+        if age is None or age > max_age:
+            return False
+    return True
+
+
+class SensorResult(NamedTuple):
+    """Represents the result of reading a sensor"""
+
+    #: Holds the number of the sensor as listed by the ls command
+    number: int
+    sensor: W1ThermSensor
+    #: Holds the reading or ``None`` if the read failed
+    reading: Optional[Reading]
+    #: Holds the seconds the read took
+    duration: Optional[float]
+    error: Optional[Exception] = None
+
+
+def read_temperatures(types, unit, resolution, max_age, ignore_errors=False):
+    """Read the temperatures of all available sensors
+
+    The temperatures of the w1thermsensor daemon are used if they are fresh.
+    Otherwise the sensors are read with the fastest safe strategy per bus.
+
+    Yields a ``SensorResult`` for every sensor as soon as it's read.
+    If ``ignore_errors`` is not set, a failed read raises its error.
+    """
+    states = None if resolution else get_daemon_states(types)
+    if states is not None and is_fresh(states, max_age):
+        convert = Unit.get_conversion_function(Unit.DEGREES_C, unit)
+        for i, state in enumerate(states, 1):
+            sensor = W1ThermSensor.from_known(state.type, state.id)
+            reading = Reading(
+                state.id, state.reading.timestamp, convert(state.reading.temperature), Unit(unit)
+            )
+            yield SensorResult(i, sensor, reading, state.duration)
+        return
+
+    sensors = W1ThermSensor.get_available_sensors(types)
+    by_id = {sensor.id: (i, sensor) for i, sensor in enumerate(sensors, 1)}
+    if resolution:
+        for sensor in sensors:
+            sensor.set_resolution(resolution, persist=False)
+
+    failed = []
+    started = time.monotonic()
+
+    def pop_failed():
+        nonlocal started
+        while failed:
+            sensor, error, at = failed.pop(0)
+            yield SensorResult(by_id[sensor.id][0], sensor, None, at - started, error)
+            started = at
+
+    def on_error(sensor, error):
+        failed.append((sensor, error, time.monotonic()))
+
+    for reading in sweep_readings(sensors, Unit(unit), on_error if ignore_errors else None):
+        now = time.monotonic()
+        yield from pop_failed()
+        number, sensor = by_id[reading.sensor_id]
+        yield SensorResult(number, sensor, reading, now - started)
+        started = now
+    yield from pop_failed()
+
+
+def format_openmetrics(results, unit):
+    """Format the given ``SensorResult``s in the OpenMetrics text format"""
+    temperatures = []
+    durations = []
+    errors = []
+    for result in results:
+        labels = get_sensor_labels(result.sensor.id, result.sensor.name)
+        if result.reading is not None:
+            temperatures.append(Sample("", labels, result.reading.temperature))
+        if result.duration is not None:
+            durations.append(Sample("", labels, result.duration))
+        errors.append(Sample("", labels, 1 if result.reading is None else 0))
+
+    return format_metrics(
+        [
+            MetricFamily(
+                "w1thermsensor_temperature_{0}".format(unit),
+                "gauge",
+                "Temperature of the sensor",
+                temperatures,
+                unit,
+            ),
+            MetricFamily(
+                "w1thermsensor_last_read_duration_seconds",
+                "gauge",
+                "Duration of the last read of the sensor",
+                durations,
+                "seconds",
+            ),
+            MetricFamily(
+                "w1thermsensor_last_read_error",
+                "gauge",
+                "1 if the last read of the sensor failed, 0 otherwise",
+                errors,
+            ),
+        ]
+    )
+
+
+def format_text(results, unit):
+    """Format the given ``SensorResult``s for humans"""
+    lines = [
+        "Got temperatures of {0} sensors:".format(click.style(str(len(results)), bold=True))
+    ]
+    for result in results:
+        lines.append(
+            "  Sensor {0} ({1}) measured temperature: {2} {3}".format(
+                click.style(str(result.number), bold=True),
+                click.style(result.sensor.id, bold=True),
+                click.style(str(round(result.reading.temperature, 2)), bold=True),
+                click.style(unit, bold=True),
+            )
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_json(results, unit):
+    """Format the given ``SensorResult``s as JSON document"""
+    data = [
+        {
+            "id": r.number,
+            "hwid": r.sensor.id,
+            "type": r.sensor.name,
+            "temperature": r.reading.temperature,
+            "unit": unit,
+        }
+        for r in results
+    ]
+    return json.dumps(data, indent=4, sort_keys=True) + "\n"
+
+
+#: Holds the columns of the CSV output
+CSV_COLUMNS = ["id", "hwid", "type", "timestamp", "temperature", "unit"]
+
+
+def format_record(result, unit, format_):
+    """Format the given ``SensorResult`` as a single ndjson, csv or influx record"""
+    reading = result.reading
+    if format_ == "ndjson":
+        return json.dumps(
+            {
+                "id": result.number,
+                "hwid": result.sensor.id,
+                "type": result.sensor.name,
+                "timestamp": reading.timestamp,
+                "temperature": reading.temperature,
+                "unit": unit,
+            },
+            sort_keys=True,
+        ) + "\n"
+
+    if format_ == "csv":
+        line = io.StringIO()
+        csv.writer(line, lineterminator="\n").writerow(
+            [
+                result.number,
+                result.sensor.id,
+                result.sensor.name,
+                reading.timestamp,
+                reading.temperature,
+                unit,
+            ]
+        )
+        return line.getvalue()
+
+    # the InfluxDB line protocol with nanosecond timestamps
+    return "w1thermsensor,hwid={0},type={1},unit={2} temperature={3} {4}\n".format(
+        result.sensor.id,
+        result.sensor.name,
+        unit,
+        reading.temperature,
+        int(round(reading.timestamp * 1e9)),
+    )
+
+
+def write_atomically(path, text):
+    """Write the given text to a temporary file and rename it to the given path
+
+    Thus readers of the file, e.g. the textfile collector of the Prometheus
+    node exporter, never see a partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=".{0}.".format(os.path.basename(path)), suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            temp_file.write(text)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+#: Holds the output formats written once all sensors are read
+BATCH_FORMATS = ["text", "json", "openmetrics"]
+#: Holds the output formats written as soon as a sensor is read
+STREAM_FORMATS = ["ndjson", "csv", "influx"]
+
+
+def max_age_option(func):
+    """Add the --max-age option to the given command"""
+    return click.option(
+        "-m",
+        "--max-age",
+        default=60.0,
+        type=click.FloatRange(min=0),
+        help="Use temperatures of the w1thermsensor daemon up to this age in seconds. "
+        "Defaults to 60. Use 0 to always read the sensors.",
+    )(func)
+
+
+def validate_interval(ctx, param, value):  # pylint: disable=unused-argument
+    """Validate that the interval of a CLI option is positive"""
+    if value is not None and value <= 0:
+        raise click.BadParameter("must be greater than 0")
+    return value
+
+
+def interval_option(func):
+    """Add the --interval option to read the sensors periodically to the given command"""
+    return click.option(
+        "-i",
+        "--interval",
+        default=10.0,
+        type=click.FLOAT,
+        callback=validate_interval,
+        help="The interval to read the sensors in seconds. Defaults to 10",
+    )(func)
+
+
 @click.group()
 @click.version_option()
 def cli():
@@ -68,7 +381,11 @@ def cli():
 )
 def ls(types, as_json, resolution):  # pylint: disable=invalid-name
     """List all available sensors"""
-    sensors = W1ThermSensor.get_available_sensors(types)
+    states = get_daemon_states(types)
+    if states is None:
+        sensors = W1ThermSensor.get_available_sensors(types)
+    else:
+        sensors = [W1ThermSensor.from_known(s.type, s.id) for s in states]
 
     if as_json:
         if resolution:
@@ -137,37 +454,104 @@ def ls(types, as_json, resolution):  # pylint: disable=invalid-name
 @click.option(
     "-j", "--json", "as_json", flag_value=True, help="Output result in JSON format"
 )
-def all(types, unit, resolution, as_json):  # pylint: disable=redefined-builtin
+@click.option(
+    "-f",
+    "--format",
+    "format_",
+    default="text",
+    type=click.Choice(BATCH_FORMATS + STREAM_FORMATS),
+    help="The output format. Defaults to text. "
+    "The ndjson, csv and influx formats write every temperature as soon as it's read",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the output atomically to this file instead of stdout. "
+    "Not supported for the ndjson, csv and influx formats",
+)
+@click.option(
+    "-w",
+    "--watch",
+    type=click.FLOAT,
+    callback=validate_interval,
+    help="Read the sensors every given seconds until interrupted",
+)
+@max_age_option
+def all(  # pylint: disable=redefined-builtin
+    types, unit, resolution, as_json, format_, output, watch, max_age
+):
     """Get temperatures of all available sensors"""
-    sensors = W1ThermSensor.get_available_sensors(types)
-    temperatures = []
-    for sensor in sensors:
-        if resolution:
-            sensor.set_resolution(resolution, persist=False)
-
-        temperatures.append(sensor.get_temperature(unit))
-
     if as_json:
-        data = [
-            {"id": i, "hwid": s.id, "type": s.name, "temperature": t, "unit": unit}
-            for i, s, t in zip(count(start=1), sensors, temperatures)
-        ]
-        click.echo(json.dumps(data, indent=4, sort_keys=True))
-    else:
-        click.echo(
-            "Got temperatures of {0} sensors:".format(
-                click.style(str(len(sensors)), bold=True)
-            )
+        format_ = "json"
+
+    if output and format_ in STREAM_FORMATS:
+        raise click.BadOptionUsage(
+            "--output", "The {0} format is written to stdout only".format(format_)
         )
-        for i, sensor, temperature in zip(count(start=1), sensors, temperatures):
-            click.echo(
-                "  Sensor {0} ({1}) measured temperature: {2} {3}".format(
-                    click.style(str(i), bold=True),
-                    click.style(sensor.id, bold=True),
-                    click.style(str(round(temperature, 2)), bold=True),
-                    click.style(unit, bold=True),
-                )
+
+    if format_ == "csv":
+        click.echo(",".join(CSV_COLUMNS))
+
+    next_read = time.monotonic()
+    try:
+        while True:
+            # failed reads are reported instead of aborting to keep watching,
+            # the openmetrics format always exports them
+            results = read_temperatures(
+                types,
+                unit,
+                resolution,
+                max_age,
+                ignore_errors=watch is not None or format_ == "openmetrics",
             )
+            if format_ in STREAM_FORMATS:
+                for result in results:
+                    if result.reading is None:
+                        report_error(result)
+                    else:
+                        click.echo(format_record(result, unit, format_), nl=False)
+            else:
+                write_results(sorted(results, key=lambda r: r.number), unit, format_, output)
+
+            if watch is None:
+                break
+
+            # keep the phase and skip the reads which were missed
+            next_read += watch
+            now = time.monotonic()
+            if next_read < now:
+                next_read = now
+            time.sleep(next_read - now)
+    except KeyboardInterrupt:
+        pass
+
+
+def report_error(result):
+    """Report the failed read of the given ``SensorResult`` on stderr"""
+    click.echo(
+        "Failed to read sensor {0} ({1}): {2}".format(
+            result.number, result.sensor.id, str(result.error).strip()
+        ),
+        err=True,
+    )
+
+
+def write_results(results, unit, format_, output):
+    """Write the given ``SensorResult``s in the given batch format"""
+    if format_ == "openmetrics":
+        text = format_openmetrics(results, unit)
+    else:
+        for result in results:
+            if result.reading is None:
+                report_error(result)
+        results = [r for r in results if r.reading is not None]
+        text = format_json(results, unit) if format_ == "json" else format_text(results, unit)
+
+    if output:
+        write_atomically(output, text)
+    else:
+        click.echo(text, nl=False)
 
 
 @cli.command()
@@ -204,35 +588,32 @@ def all(types, unit, resolution, as_json):  # pylint: disable=redefined-builtin
     type=click.FLOAT,
     help="Offset the temperature reading by the given offset temperature.",
 )
-def get(id_, hwid, type_, unit, resolution, as_json, offset):
+@max_age_option
+def get(id_, hwid, type_, unit, resolution, as_json, offset, max_age):
     """Get temperature of a specific sensor"""
     if id_ and (hwid or type_):
         raise click.BadArgumentUsage(
             "If --id is given --hwid and --type are not allowed."
         )
 
-    if id_:
-        try:
-            sensor = W1ThermSensor.get_available_sensors()[id_ - 1]
-        except IndexError:
-            error_msg = (
-                "No sensor with id {0} available. ".format(id_)
-                + "Use the ls command to show all available sensors."
-            )
-            if CLICK_MAJOR_VERSION >= 7:  # pragma: no cover
-                raise click.BadOptionUsage("--id", error_msg)
-            else:  # pragma: no cover
-                raise click.BadOptionUsage(error_msg)
+    state = None if resolution else get_daemon_state(id_, hwid, type_)
+    if state is not None and is_fresh([state], max_age):
+        sensor = W1ThermSensor.from_known(state.type, state.id)
+        convert = Unit.get_conversion_function(Unit.DEGREES_C, unit)
+        temperature = convert(state.reading.temperature) + offset
     else:
-        sensor = W1ThermSensor(type_, hwid)
+        if id_:
+            sensor = get_sensor_by_number(id_)
+        else:
+            sensor = W1ThermSensor(type_, hwid)
 
-    if resolution:
-        sensor.set_resolution(resolution, persist=False)
+        if resolution:
+            sensor.set_resolution(resolution, persist=False)
 
-    if offset:
-        sensor.set_offset(offset, unit)
+        if offset:
+            sensor.set_offset(offset, unit)
 
-    temperature = sensor.get_temperature(unit)
+        temperature = sensor.get_temperature(unit)
 
     if as_json:
         data = {
@@ -273,18 +654,65 @@ def resolution(resolution, id_, hwid, type_):
         )
 
     if id_:
-        try:
-            sensor = W1ThermSensor.get_available_sensors()[id_ - 1]
-        except IndexError:
-            error_msg = (
-                "No sensor with id {0} available. ".format(id_)
-                + "Use the ls command to show all available sensors."
-            )
-            if CLICK_MAJOR_VERSION >= 7:  # pragma: no cover
-                raise click.BadOptionUsage("--id", error_msg)
-            else:  # pragma: no cover
-                raise click.BadOptionUsage(error_msg)
+        sensor = get_sensor_by_number(id_)
     else:
         sensor = W1ThermSensor(type_, hwid)
 
     sensor.set_resolution(resolution, persist=True)
+
+
+@cli.command()
+@interval_option
+@click.option(
+    "-s",
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="The path of the socket. Defaults to $W1THERMSENSOR_SOCKET, "
+    "$XDG_RUNTIME_DIR/w1thermsensor.sock or /run/w1thermsensor/w1thermsensor.sock for root",
+)
+def serve(interval, socket_path):
+    """Read all sensors periodically and serve their temperatures to the other commands"""
+    # imported here to keep the startup of the other commands fast
+    from w1thermsensor.daemon import Daemon
+
+    daemon = Daemon(socket_path, interval)
+    click.echo("Serving the temperatures on {0}".format(daemon.socket_path))
+    try:
+        daemon.serve_forever()
+    except DaemonError as exc:
+        raise click.ClickException(str(exc))
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+
+
+@cli.command()
+@interval_option
+@click.option(
+    "-a",
+    "--address",
+    default="",
+    help="The address to listen on. Defaults to all addresses",
+)
+@click.option(
+    "-p",
+    "--port",
+    default=DEFAULT_PORT,
+    type=click.IntRange(0, 65535),
+    help="The port to listen on. Defaults to {0}".format(DEFAULT_PORT),
+)
+def exporter(interval, address, port):
+    """Read all sensors periodically and export their temperatures as OpenMetrics over HTTP"""
+    # imported here to keep the startup of the other commands fast
+    from w1thermsensor.exporter import Exporter
+
+    metrics_exporter = Exporter(address, port, interval)
+    click.echo(
+        "Exporting the temperatures on http://{0}:{1}/metrics".format(address or "0.0.0.0", port)
+    )
+    try:
+        metrics_exporter.serve_forever()
+    except OSError as exc:
+        raise click.ClickException(str(exc))
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
@@ -12,9 +12,10 @@ import subprocess
 import time
 from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List, Optional, Union
+from typing import Iterable, List, Optional, Tuple, Union
 
-from w1thermsensor.calibration_data import CalibrationData
+from w1thermsensor.calibration_data import AnyCalibrationData
+from w1thermsensor.discovery import DISCOVERY_CACHE, SensorRegistry
 from w1thermsensor.errors import (
     InvalidCalibrationDataError,
     NoSensorFoundError,
@@ -23,7 +24,7 @@ from w1thermsensor.errors import (
     UnsupportedSensorError,
     W1ThermSensorError
 )
-from w1thermsensor.sensors import Sensor
+from w1thermsensor.sensors import PowerMode, Sensor
 from w1thermsensor.units import Unit
 
 
@@ -72,6 +73,12 @@ class W1ThermSensor:
     #  sensor devices on the system provided by the kernel modules
     BASE_DIRECTORY = Path("/sys/bus/w1/devices")
     SLAVE_FILE = "w1_slave"
+    EXT_POWER_FILE = "ext_power"
+    ALARMS_FILE = "alarms"
+    EEPROM_FILE = "eeprom_cmd"
+
+    #: Holds the range of the alarm thresholds in Degrees Celsius
+    ALARM_RANGE = (-55, 125)
 
     #: Holds the sensor reset value in Degrees Celsius
     SENSOR_RESET_VALUE = 85.0
@@ -89,6 +96,9 @@ class W1ThermSensor:
     ) -> List["W1ThermSensor"]:
         """Return all available sensors.
 
+        The sensors found on the w1 buses are cached within the process
+        until a sensor joins or leaves one of the buses.
+
         :param list types: the type of the sensor to look for.
                            If types is None it will search for all available types.
 
@@ -105,22 +115,32 @@ class W1ThermSensor:
                 raise UnsupportedSensorError(
                     str(exc), (s.name for s in Sensor))
 
-        def is_sensor(dir_name):
-            return any(dir_name.startswith(hex(x.value)[2:]) for x in types)
-
+        wanted_types = set(types)
         return [
-            cls(Sensor.from_id_string(s.name[:2]), s.name[3:])
-            for s in cls.BASE_DIRECTORY.iterdir()
-            if is_sensor(s.name)
+            cls.from_known(s.type, s.id)
+            for s in DISCOVERY_CACHE.get_sensors(cls.BASE_DIRECTORY)
+            if s.type in wanted_types
         ]
 
+    @classmethod
+    def get_sensor_registry(cls) -> SensorRegistry:
+        """Return the registry of all available sensors.
+
+        The registry allows to lookup the available sensors by their id,
+        bus master or type in constant time.
+
+        :returns: the registry of the available sensors.
+        :rtype: SensorRegistry
+        """
+        return DISCOVERY_CACHE.get_registry(cls.BASE_DIRECTORY)
+
     def __init__(
         self,
         sensor_type: Optional[Sensor] = None,
         sensor_id: Optional[str] = None,
         offset: float = 0.0,
         offset_unit: Unit = Unit.DEGREES_C,
-        calibration_data: Optional[CalibrationData] = None,
+        calibration_data: Optional[AnyCalibrationData] = None,
     ) -> None:
         """Initializes a W1ThermSensor.
 
@@ -135,6 +155,8 @@ class W1ThermSensor:
         :param float offset: a calibration offset for the temperature sensor readings
                              in the unit of ``offset_unit``.
         :param offset_unit: the unit in which the offset is provided.
+        :param calibration_data: the calibration data used to correct the temperature
+                                 readings with ``get_corrected_temperature()``.
 
         :raises KernelModuleLoadError: if the w1 therm kernel modules could not
                                        be loaded correctly
@@ -150,6 +172,50 @@ class W1ThermSensor:
         else:
             self._init_with_type_and_id(sensor_type, sensor_id)  # type: ignore
 
+        self._init_sensor(offset, offset_unit, calibration_data, validate=True)
+
+    @classmethod
+    def from_known(
+        cls,
+        sensor_type: Sensor,
+        sensor_id: str,
+        validate: bool = False,
+        offset: float = 0.0,
+        offset_unit: Unit = Unit.DEGREES_C,
+        calibration_data: Optional[AnyCalibrationData] = None,
+    ) -> "W1ThermSensor":
+        """Create a sensor of a known type and id without looking it up.
+
+        This is meant for sensors which were just discovered, e.g. from the
+        devices directory listing. Unless ``validate`` is set, no file system
+        access happens at all and a missing sensor is only detected when reading it.
+
+        :param int sensor_type: the type of the sensor.
+        :param string sensor_id: the id of the sensor.
+        :param bool validate: if the existence of the sensor should be checked.
+        :param float offset: a calibration offset for the temperature sensor readings
+                             in the unit of ``offset_unit``.
+        :param offset_unit: the unit in which the offset is provided.
+        :param calibration_data: the calibration data used to correct the temperature
+                                 readings with ``get_corrected_temperature()``.
+
+        :returns: the sensor instance.
+
+        :raises NoSensorFoundError: if ``validate`` is set and the sensor
+                                    does not exist or is not connected
+        """
+        sensor = cls.__new__(cls)
+        sensor._init_with_type_and_id(sensor_type, sensor_id)
+        sensor._init_sensor(offset, offset_unit, calibration_data, validate=validate)
+        return sensor
+
+    def _init_sensor(
+        self,
+        offset: float,
+        offset_unit: Unit,
+        calibration_data: Optional[AnyCalibrationData],
+        validate: bool,
+    ) -> None:
         # store path to sensor
         self.sensorpath = (
             self.BASE_DIRECTORY / (self.slave_prefix +
@@ -158,7 +224,7 @@ class W1ThermSensor:
 
         self.calibration_data = calibration_data
 
-        if not self.exists():
+        if validate and not self.exists():
             raise NoSensorFoundError(
                 "Could not find sensor of type {} with id {}".format(
                     self.name, self.id)
@@ -168,7 +234,7 @@ class W1ThermSensor:
 
     def _init_with_first_sensor(self):
         for _ in range(self.RETRY_ATTEMPTS):
-            s = self.get_available_sensors()
+            s = list(self.get_sensor_registry())
             if s:
                 self._init_with_type_and_id(s[0].type, s[0].id)
                 break
@@ -177,7 +243,7 @@ class W1ThermSensor:
             raise NoSensorFoundError("Could not find any sensor")
 
     def _init_with_first_sensor_by_type(self, sensor_type: Sensor) -> None:
-        s = self.get_available_sensors([sensor_type])
+        s = self.get_sensor_registry().get_by_type(sensor_type)
         if not s:
             raise NoSensorFoundError(
                 "Could not find any sensor of type {}".format(sensor_type.name)
@@ -186,9 +252,7 @@ class W1ThermSensor:
         self._init_with_type_and_id(sensor_type, s[0].id)
 
     def _init_with_first_sensor_by_id(self, sensor_id: str) -> None:
-        sensor = next(  # pragma: no cover
-            (s for s in self.get_available_sensors() if s.id == sensor_id), None
-        )
+        sensor = self.get_sensor_registry().get(sensor_id)
         if not sensor:
             raise NoSensorFoundError(
                 "Could not find sensor with id {}".format(sensor_id)
@@ -412,6 +476,119 @@ class W1ThermSensor:
 
         return True
 
+    def get_power_mode(self) -> PowerMode:
+        """Get the power mode of the sensor.
+
+        Parasitically powered sensors draw their power from the data line
+        and thus require a strong pull-up during temperature conversions.
+
+        Note: This function is supported since kernel 5.10.
+
+        :returns: if the sensor is externally or parasitically powered
+        :rtype: PowerMode
+
+        :raises NoSensorFoundError: if the sensor could not be found
+        :raises W1ThermSensorError: if the power mode could not be read
+        """
+        try:
+            with (self.sensorpath.parent / self.EXT_POWER_FILE).open("r") as f:
+                ext_power = int(f.read().strip())
+        except IOError:
+            if not self.exists():
+                raise NoSensorFoundError(
+                    "Could not find sensor of type {} with id {}".format(
+                        self.name, self.id)
+                )
+            ext_power = -1
+        except ValueError:
+            ext_power = -1
+
+        if ext_power < 0:
+            raise W1ThermSensorError(
+                "Failed to read power mode of sensor {}. "
+                "Reading the power mode requires kernel 5.10 or newer".format(self.id)
+            )
+
+        return PowerMode.EXTERNAL if ext_power else PowerMode.PARASITE
+
+    def get_alarms(self) -> Tuple[int, int]:
+        """Get the alarm thresholds stored in the sensor.
+
+        Note: This function is supported since kernel 5.10.
+
+        :returns: the low (TL) and high (TH) alarm thresholds in Degrees Celsius
+        :rtype: tuple
+
+        :raises NoSensorFoundError: if the sensor could not be found
+        :raises W1ThermSensorError: if the alarm thresholds could not be read
+        """
+        try:
+            with (self.sensorpath.parent / self.ALARMS_FILE).open("r") as f:
+                low, high = (int(v) for v in f.read().split())
+        except IOError:
+            if not self.exists():
+                raise NoSensorFoundError(
+                    "Could not find sensor of type {} with id {}".format(
+                        self.name, self.id)
+                )
+            raise W1ThermSensorError(
+                "Failed to read alarms of sensor {}. "
+                "Reading the alarms requires kernel 5.10 or newer".format(self.id)
+            )
+        except ValueError:
+            raise W1ThermSensorError(
+                "Failed to read alarms of sensor {}".format(self.id)
+            )
+
+        return low, high
+
+    def set_alarms(self, low: int, high: int, persist: bool = False) -> None:
+        """Set the alarm thresholds of the sensor.
+
+        The sensor flags an alarm if the integer part of a converted temperature
+        is lower or equal than ``low`` or higher or equal than ``high``.
+
+        If the ``persist`` argument is set to ``True`` the thresholds are stored
+        into the EEPROM. Since the EEPROM has a limited amount of writes (>50k),
+        this should be used wisely.
+
+        Note: root permissions are required to change the sensors alarms.
+
+        Note: This function is supported since kernel 5.10.
+
+        :param int low: the low (TL) alarm threshold in Degrees Celsius.
+        :param int high: the high (TH) alarm threshold in Degrees Celsius.
+        :param bool persist: if the alarm thresholds should be written
+                             to the EEPROM.
+
+        :raises W1ThermSensorError: if the alarm thresholds could not be set
+        """
+        min_value, max_value = self.ALARM_RANGE
+        if not min_value <= low <= high <= max_value:
+            raise ValueError(
+                "The given alarm thresholds '{0}' and '{1}' are invalid. They must be "
+                "in the range ({2}-{3}) and the low threshold must not exceed the "
+                "high threshold".format(low, high, min_value, max_value)
+            )
+
+        try:
+            with (self.sensorpath.parent / self.ALARMS_FILE).open("w") as f:
+                f.write("{0} {1}\n".format(int(low), int(high)))
+        except IOError:
+            raise W1ThermSensorError(
+                "Failed to change alarms of sensor {0}. "
+                "You might have to be root to change the alarms".format(self.id)
+            )
+
+        if persist:
+            try:
+                with (self.sensorpath.parent / self.EEPROM_FILE).open("w") as f:
+                    f.write("save\n")
+            except IOError:
+                raise W1ThermSensorError(
+                    "Failed to write alarms to sensor EEPROM"
+                )
+
     def set_offset(self, offset: float, unit: Unit = Unit.DEGREES_C) -> None:
         """Set an offset to be applied to each temperature reading.
 
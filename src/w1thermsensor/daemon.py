@@ -0,0 +1,428 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+
+The daemon answers requests on a Unix domain socket. A request is a line of JSON::
+
+    {"command": "sensors"}
+
+which is answered with a line of JSON holding the sensors in the order they were
+discovered and their latest reading in Degrees Celsius::
+
+    {"sensors": [{"hwid": "00000588806a", "type": "DS18B20", "timestamp": 1600000000.0,
+                  "temperature": 20.5, "duration": 0.75, "errors": 0}]}
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from w1thermsensor.bus import sweep_readings
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import DaemonError
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import Sensor
+
+#: Holds the environment variable to configure the path of the daemon's socket
+SOCKET_ENV = "W1THERMSENSOR_SOCKET"
+
+#: Holds the path of the socket of a daemon run by root
+SYSTEM_SOCKET_PATH = Path("/run/w1thermsensor/w1thermsensor.sock")
+
+# the pid, uid and gid of the peer of a Unix domain socket
+_PEER_CREDENTIALS = struct.Struct("3i")
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def get_socket_path() -> Path:
+    """Return the path of the daemon's socket.
+
+    The path is configured with the ``W1THERMSENSOR_SOCKET`` environment variable.
+    It defaults to ``$XDG_RUNTIME_DIR/w1thermsensor.sock`` for users and to
+    ``SYSTEM_SOCKET_PATH`` for root or if there is no runtime directory.
+    Both directories can only be written by their owner, unlike ``/tmp``,
+    where any user could bind the socket first.
+    """
+    value = os.environ.get(SOCKET_ENV)
+    if value:
+        return Path(value)
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.geteuid() != 0:
+        return Path(runtime_dir) / "w1thermsensor.sock"
+    return SYSTEM_SOCKET_PATH
+
+
+def _get_peer_uid(client: socket.socket) -> int:
+    credentials = client.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, _PEER_CREDENTIALS.size
+    )
+    _, uid, _ = _PEER_CREDENTIALS.unpack(credentials)
+    return uid
+
+
+def _is_listening(path: Path) -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(path))
+    except OSError:
+        return False
+    return True
+
+
+class SensorState(NamedTuple):
+    """Represents a sampled sensor"""
+
+    id: str
+    type: Sensor
+    #: Holds the latest reading in Degrees Celsius or ``None`` if it wasn't read yet
+    reading: Optional[Reading] = None
+    #: Holds the seconds the latest read took
+    duration: Optional[float] = None
+    #: Holds the number of failed reads
+    errors: int = 0
+
+    def get_age(self, now: Optional[float] = None) -> Optional[float]:
+        """Returns the seconds since the latest reading or ``None`` if there is none"""
+        if self.reading is None:
+            return None
+        return (time.time() if now is None else now) - self.reading.timestamp
+
+
+class Sampler:
+    """
+    Reads all available sensors periodically and keeps their latest readings.
+
+    Every sample reads all sensors with ``w1thermsensor.bus.sweep_readings()``,
+    thus with a bulk conversion per bus where it is safe. Sensors joining or leaving
+    the buses are picked up with the next sample. A sample which fails as a whole,
+    e.g. because the kernel module is not loaded yet or a callback raised, is counted
+    in ``errors`` and passed to the ``on_error`` callback or logged if there is none.
+
+    Examples:
+        Sample all sensors every 10 seconds
+
+        >>> sampler = Sampler(interval=10)
+        >>> sampler.start()
+        >>> sampler.states
+    """
+
+    def __init__(
+        self,
+        interval: float = 10.0,
+        on_reading: Optional[Callable[[Reading], None]] = None,
+        on_update: Optional[Callable[[SensorState], None]] = None,
+        on_error: Optional[Callable[[Exception], object]] = None,
+    ) -> None:
+        """Initializes a Sampler.
+
+        :param float interval: the interval to sample the sensors in seconds.
+        :param callable on_reading: called from the sampler thread with every reading.
+        :param callable on_update: called from the sampler thread with the state of every
+                                   sensor after it was read, successfully or not.
+        :param callable on_error: called from the sampler thread with the error of every
+                                  failed sample. Defaults to logging it.
+        """
+        self.interval = interval
+        self.on_reading = on_reading
+        self.on_update = on_update
+        self.on_error = on_error
+        #: Holds the number of failed samples
+        self.errors = 0
+        self._states: Dict[str, SensorState] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def states(self) -> List[SensorState]:
+        """Returns the sampled sensors in the order they were discovered"""
+        with self._lock:
+            return list(self._states.values())
+
+    def sample(self) -> None:
+        """Read all available sensors once"""
+        sensors = W1ThermSensor.get_available_sensors()
+        with self._lock:
+            self._states = {
+                s.id: self._states.get(s.id, SensorState(s.id, s.type)) for s in sensors
+            }
+
+        # the reads of a sweep are sequential, thus each takes until the next one is done
+        started = time.monotonic()
+
+        def update(sensor_id: str, reading: Optional[Reading]) -> None:
+            nonlocal started
+            now = time.monotonic()
+            with self._lock:
+                state = self._states[sensor_id]
+                if reading is None:
+                    state = state._replace(duration=now - started, errors=state.errors + 1)
+                else:
+                    state = state._replace(reading=reading, duration=now - started)
+                self._states[sensor_id] = state
+            started = now
+            if self.on_update:
+                self.on_update(state)
+
+        def on_error(sensor: W1ThermSensor, _: Exception) -> None:
+            update(sensor.id, None)
+
+        for reading in sweep_readings(sensors, on_error=on_error):
+            update(reading.sensor_id, reading)
+            if self.on_reading:
+                self.on_reading(reading)
+
+    def start(self) -> None:
+        """Start sampling the sensors in a background thread"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="w1-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the background thread to finish"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        next_sample = time.monotonic()
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as exc:  # pylint: disable=broad-except
+                # e.g. the kernel module is not loaded yet or a callback failed,
+                # retry with the next sample
+                self.errors += 1
+                if self.on_error is None:
+                    _LOGGER.error("Failed to sample the sensors", exc_info=exc)
+                else:
+                    self.on_error(exc)
+            # keep the phase and skip the samples which were missed
+            now = time.monotonic()
+            next_sample += self.interval
+            if next_sample < now:
+                next_sample = now
+            self._stop_event.wait(next_sample - now)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "_UnixServer"
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+            command = request["command"]
+        except (ValueError, KeyError, TypeError):
+            response: Dict[str, Any] = {"error": "invalid request"}
+        else:
+            if command == "sensors":
+                response = {"sensors": [_encode_state(s) for s in self.server.sampler.states]}
+            else:
+                response = {"error": "unknown command {0}".format(command)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, sampler: Sampler) -> None:
+        super().__init__(path, _RequestHandler)
+        self.sampler = sampler
+
+
+def _encode_state(state: SensorState) -> Dict[str, Any]:
+    reading = state.reading
+    return {
+        "hwid": state.id,
+        "type": state.type.name,
+        "timestamp": reading.timestamp if reading else None,
+        "temperature": reading.temperature if reading else None,
+        "duration": state.duration,
+        "errors": state.errors,
+    }
+
+
+def _decode_state(data: Dict[str, Any]) -> SensorState:
+    reading = None
+    if data["timestamp"] is not None:
+        reading = Reading(data["hwid"], data["timestamp"], data["temperature"])
+    return SensorState(
+        data["hwid"], Sensor[data["type"]], reading, data["duration"], data["errors"]
+    )
+
+
+class Daemon:
+    """
+    Samples the sensors in the background and answers requests on a Unix domain socket.
+
+    A single daemon reads the bus for any number of clients, which get the latest
+    readings with a ``DaemonClient`` instantly. The ``w1thermsensor`` CLI uses the daemon
+    when it's running.
+
+    Examples:
+        Run the daemon until interrupted
+
+        >>> Daemon(interval=10).serve_forever()
+    """
+
+    def __init__(
+        self, socket_path: Optional[Union[str, Path]] = None, interval: float = 10.0
+    ) -> None:
+        """Initializes a Daemon.
+
+        :param str socket_path: the path of the socket. Defaults to ``get_socket_path()``.
+        :param float interval: the interval to sample the sensors in seconds.
+        """
+        self.socket_path = Path(socket_path) if socket_path is not None else get_socket_path()
+        self.sampler = Sampler(interval)
+        self._server: Optional[_UnixServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _bind(self) -> _UnixServer:
+        if self.socket_path.exists():
+            if _is_listening(self.socket_path):
+                raise DaemonError(
+                    "A daemon is already running on {0}".format(self.socket_path)
+                )
+            # the socket was left behind by a daemon which didn't shut down cleanly
+            self.socket_path.unlink()
+
+        self.socket_path.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+        server = _UnixServer(str(self.socket_path), self.sampler)
+        # the readings are not sensitive, thus every user may request them.
+        # The clients verify that the daemon is run by root or themselves.
+        os.chmod(str(self.socket_path), 0o666)
+        return server
+
+    def serve_forever(self) -> None:
+        """Sample the sensors and answer requests until interrupted
+
+        :raises DaemonError: if a daemon is already running on the socket.
+        """
+        self._server = self._bind()
+        self.sampler.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+    def start(self) -> None:
+        """Sample the sensors and answer requests in background threads
+
+        :raises DaemonError: if a daemon is already running on the socket.
+        """
+        self._server = self._bind()
+        self.sampler.start()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="w1-daemon", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background threads started with ``start()``"""
+        if self._server is not None:
+            self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close()
+
+    def _close(self) -> None:
+        self.sampler.stop()
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:  # pragma: no cover
+                pass
+
+
+class DaemonClient:
+    """
+    Gets the latest readings from a running ``Daemon``.
+
+    Examples:
+        Get the latest readings of all sensors
+
+        >>> for state in DaemonClient().get_sensors():
+        ...     print(state.id, state.reading)
+    """
+
+    def __init__(
+        self, socket_path: Optional[Union[str, Path]] = None, timeout: float = 2.0
+    ) -> None:
+        """Initializes a DaemonClient.
+
+        Only a daemon run by root or the current user is trusted.
+
+        :param str socket_path: the path of the socket. Defaults to ``get_socket_path()``
+                                or to ``SYSTEM_SOCKET_PATH`` if no daemon of the current
+                                user is running and the socket is not configured.
+        :param float timeout: the seconds to wait for the daemon to answer.
+        """
+        if socket_path is None:
+            socket_path = get_socket_path()
+            if (
+                not os.environ.get(SOCKET_ENV)
+                and not socket_path.exists()
+                and SYSTEM_SOCKET_PATH.exists()
+            ):
+                socket_path = SYSTEM_SOCKET_PATH
+        self.socket_path = Path(socket_path)
+        self.timeout = timeout
+
+    def get_sensors(self) -> List[SensorState]:
+        """Returns the sensors sampled by the daemon in the order they were discovered.
+
+        :raises DaemonError: if the daemon is not running, is run by another user
+                             or answers invalidly.
+        """
+        response = self._request({"command": "sensors"})
+        try:
+            return [_decode_state(s) for s in response["sensors"]]
+        except (KeyError, TypeError):
+            raise DaemonError("The daemon answered invalidly")
+
+    def _request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(self.timeout)
+                client.connect(str(self.socket_path))
+                uid = _get_peer_uid(client)
+                if uid not in (0, os.geteuid()):
+                    raise DaemonError(
+                        "The daemon on {0} is run by another user (uid {1})".format(
+                            self.socket_path, uid
+                        )
+                    )
+                client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+                with client.makefile("rb") as response_file:
+                    line = response_file.readline()
+        except OSError as exc:
+            raise DaemonError(
+                "The daemon is not running on {0}: {1}".format(self.socket_path, exc)
+            )
+
+        try:
+            response = json.loads(line.decode("utf-8"))
+        except ValueError:
+            raise DaemonError("The daemon answered invalidly")
+        if "error" in response:
+            raise DaemonError("The daemon failed: {0}".format(response["error"]))
+        return response
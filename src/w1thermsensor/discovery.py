@@ -0,0 +1,345 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from w1thermsensor.sensors import Sensor
+
+#: Holds the glob pattern matching the bus master directories in the w1 devices directory
+BUS_MASTER_GLOB = "w1_bus_master*"
+#: Holds the name of the bus master file listing the connected slaves
+MASTER_SLAVES_FILE = "w1_master_slaves"
+
+#: Holds the environment variable to enable the persisted sensor index
+INDEX_CACHE_ENV = "W1THERMSENSOR_INDEX_CACHE"
+#: Holds the version of the persisted sensor index format
+INDEX_CACHE_VERSION = 1
+
+#: Holds the membership of all bus masters as ``(bus master name, slaves file content)`` pairs
+BusMembership = Tuple[Tuple[str, str], ...]
+
+
+class DiscoveredSensor(NamedTuple):
+    """Represents a sensor found on one of the w1 buses"""
+
+    type: Sensor
+    id: str
+    bus_master: Optional[str] = None
+
+
+def parse_slave_name(slave_name: str) -> Optional[Tuple[Sensor, str]]:
+    """Parse a w1 slave name like ``28-00000588806a`` into the sensor type and id
+
+    :returns: the sensor type and id or ``None`` if it's not a supported sensor.
+    """
+    family_code, separator, sensor_id = slave_name.partition("-")
+    if not separator:
+        return None
+
+    sensor_type = Sensor.from_family_code(family_code)
+    if sensor_type is None:
+        return None
+
+    return sensor_type, sensor_id
+
+
+def read_bus_membership(
+    base_directory: Path, bus_masters: Optional[Iterable[str]] = None
+) -> Optional[BusMembership]:
+    """Read the slave lists of all bus masters in the given w1 devices directory
+
+    :param Path base_directory: the w1 devices directory.
+    :param list bus_masters: the names of the known bus masters. If given, only their slave
+                             lists are read, without listing the devices directory.
+
+    :returns: the membership of all bus masters or ``None`` if no bus master was found.
+
+    :raises IOError: if the slave list of one of the given bus masters could not be read.
+    """
+    if bus_masters is not None:
+        return tuple(
+            (name, (base_directory / name / MASTER_SLAVES_FILE).read_text())
+            for name in bus_masters
+        ) or None
+
+    membership = []
+    for bus_master in sorted(base_directory.glob(BUS_MASTER_GLOB)):
+        try:
+            membership.append((bus_master.name, (bus_master / MASTER_SLAVES_FILE).read_text()))
+        except IOError:  # not a bus master or it vanished meanwhile
+            continue
+
+    return tuple(membership) or None
+
+
+def scan_sensors(
+    base_directory: Path, membership: Optional[BusMembership] = None
+) -> List[DiscoveredSensor]:
+    """Scan the given w1 devices directory for supported sensors
+
+    :param Path base_directory: the w1 devices directory to scan.
+    :param membership: the bus membership used to assign the sensors to their bus master.
+
+    :returns: the found sensors in directory order.
+    :rtype: list
+    """
+    bus_masters: Dict[str, str] = {}
+    for bus_master, slaves in membership or ():
+        for slave_name in slaves.split():
+            bus_masters[slave_name] = bus_master
+
+    sensors = []
+    for path in base_directory.iterdir():
+        parsed = parse_slave_name(path.name)
+        if parsed is not None:
+            sensors.append(DiscoveredSensor(parsed[0], parsed[1], bus_masters.get(path.name)))
+
+    return sensors
+
+
+class SensorRegistry:
+    """
+    Holds the discovered sensors indexed by their id, bus master and type.
+
+    The registries are provided and kept current by the ``DiscoveryCache``.
+    """
+
+    def __init__(self, sensors: Iterable[DiscoveredSensor] = ()) -> None:
+        self._sensors = list(sensors)
+        self._by_id: Dict[str, DiscoveredSensor] = {}
+        self._by_bus_master: Dict[Optional[str], List[DiscoveredSensor]] = {}
+        self._by_type: Dict[Sensor, List[DiscoveredSensor]] = {}
+        for sensor in self._sensors:
+            self._by_id.setdefault(sensor.id, sensor)
+            self._by_bus_master.setdefault(sensor.bus_master, []).append(sensor)
+            self._by_type.setdefault(sensor.type, []).append(sensor)
+
+    def __len__(self) -> int:
+        return len(self._sensors)
+
+    def __iter__(self) -> Iterator[DiscoveredSensor]:
+        return iter(self._sensors)
+
+    def __contains__(self, sensor_id: object) -> bool:
+        return sensor_id in self._by_id
+
+    def get(self, sensor_id: str) -> Optional[DiscoveredSensor]:
+        """Returns the sensor with the given id or ``None`` if it's not discovered"""
+        return self._by_id.get(sensor_id)
+
+    def get_by_bus_master(self, bus_master: Optional[str]) -> List[DiscoveredSensor]:
+        """Returns the sensors connected to the bus master with the given name"""
+        return list(self._by_bus_master.get(bus_master, ()))
+
+    def get_by_type(self, sensor_type: Sensor) -> List[DiscoveredSensor]:
+        """Returns the sensors of the given type"""
+        return list(self._by_type.get(sensor_type, ()))
+
+    @property
+    def bus_masters(self) -> List[Optional[str]]:
+        """Returns the names of the bus masters with at least one sensor"""
+        return list(self._by_bus_master)
+
+
+def get_index_cache_path() -> Optional[Path]:
+    """Return the path of the persisted sensor index configured in the environment
+
+    The persisted sensor index is enabled by setting the ``W1THERMSENSOR_INDEX_CACHE``
+    environment variable either to ``1`` to use ``$XDG_RUNTIME_DIR/w1thermsensor/sensors.json``
+    or to the path of the index file to use.
+
+    :returns: the path of the index file or ``None`` if it's not enabled.
+    """
+    value = os.environ.get(INDEX_CACHE_ENV, "")
+    if value in ("", "0"):
+        return None
+
+    if value != "1":
+        return Path(value)
+
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if not runtime_directory:
+        return None
+
+    return Path(runtime_directory) / "w1thermsensor" / "sensors.json"
+
+
+class SensorIndex:
+    """
+    Persists the discovered sensors in a file to share them between processes.
+
+    This way short-living processes, like the CLI run from cron,
+    do not have to rescan the w1 devices directory on every invocation.
+    The index is only used if the bus membership it was created for still matches.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def load(
+        self, base_directory: Path, membership: BusMembership
+    ) -> Optional[List[DiscoveredSensor]]:
+        """Load the sensors from the index if it's valid for the given bus membership
+
+        :returns: the indexed sensors or ``None`` if the index is missing or outdated.
+        """
+        try:
+            with self.path.open(encoding="utf-8") as f:
+                index = json.load(f)
+
+            if (
+                index["version"] != INDEX_CACHE_VERSION
+                or index["base_directory"] != str(base_directory)
+                or [tuple(m) for m in index["membership"]] != list(membership)
+            ):
+                return None
+
+            return [
+                DiscoveredSensor(Sensor[s["type"]], s["id"], s["bus_master"])
+                for s in sorted(index["sensors"], key=lambda s: s["number"])
+            ]
+        except (IOError, ValueError, KeyError, TypeError):
+            return None
+
+    def store(
+        self, base_directory: Path, membership: BusMembership, sensors: List[DiscoveredSensor]
+    ) -> None:
+        """Store the given sensors in the index
+
+        The index file is replaced atomically, thus concurrent processes never read
+        a partially written index. Failures to write the index are ignored.
+        """
+        index = {
+            "version": INDEX_CACHE_VERSION,
+            "base_directory": str(base_directory),
+            "membership": [list(m) for m in membership],
+            "sensors": [
+                {
+                    "number": number,
+                    "type": s.type.name,
+                    "id": s.id,
+                    "bus_master": s.bus_master,
+                }
+                for number, s in enumerate(sensors, 1)
+            ],
+        }
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=str(self.path.parent), prefix=self.path.name, suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, str(self.path))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError):
+            pass
+
+
+class DiscoveryCache:
+    """
+    Caches the sensors found on the w1 buses of a w1 devices directory.
+
+    The cache is validated on every access against the ``w1_master_slaves`` files
+    of all bus masters, which the kernel updates whenever a sensor joins or leaves a bus.
+    Reading these files is a lot cheaper than listing the devices directory.
+    The names of the bus masters are cached, too, thus the devices directory is only
+    listed again once one of them vanished. A bus master added while others are
+    present is picked up after ``invalidate()``.
+    Their content is compared instead of their modification time, because sysfs
+    does not maintain the modification time of attributes.
+
+    If no bus master is found, e.g. in a fake devices directory,
+    nothing is cached and every access rescans the devices directory.
+
+    If an ``index_path`` is given, the sensors are additionally persisted
+    in a ``SensorIndex`` shared with other processes.
+    """
+
+    def __init__(self, index_path: Optional[Path] = None) -> None:
+        self.index = SensorIndex(index_path) if index_path else None
+        self._lock = threading.Lock()
+        self._base_directory: Optional[Path] = None
+        self._membership: Optional[BusMembership] = None
+        self._registry = SensorRegistry()
+
+    def get_sensors(self, base_directory: Path) -> List[DiscoveredSensor]:
+        """Return the sensors in the given w1 devices directory
+
+        :returns: the found sensors.
+        :rtype: list
+        """
+        return list(self.get_registry(base_directory))
+
+    def get_registry(self, base_directory: Path) -> SensorRegistry:
+        """Return the registry of the sensors in the given w1 devices directory
+
+        :returns: the registry of the found sensors.
+        :rtype: SensorRegistry
+        """
+        membership = self._read_bus_membership(base_directory)
+
+        with self._lock:
+            if (
+                membership is not None
+                and membership == self._membership
+                and base_directory == self._base_directory
+            ):
+                return self._registry
+
+        sensors = None
+        if self.index is not None and membership is not None:
+            sensors = self.index.load(base_directory, membership)
+            if sensors is None:
+                sensors = scan_sensors(base_directory, membership)
+                self.index.store(base_directory, membership, sensors)
+        else:
+            sensors = scan_sensors(base_directory, membership)
+
+        registry = SensorRegistry(sensors)
+        with self._lock:
+            self._base_directory = base_directory
+            self._membership = membership
+            self._registry = registry
+
+        return registry
+
+    def _read_bus_membership(self, base_directory: Path) -> Optional[BusMembership]:
+        with self._lock:
+            known = self._membership if base_directory == self._base_directory else None
+
+        if known is not None:
+            try:
+                return read_bus_membership(base_directory, [name for name, _ in known])
+            except IOError:
+                # a bus master vanished, look for the current ones
+                pass
+
+        return read_bus_membership(base_directory)
+
+    def invalidate(self) -> None:
+        """Invalidate the cache so that the next access rescans the devices directory"""
+        with self._lock:
+            self._base_directory = None
+            self._membership = None
+            self._registry = SensorRegistry()
+
+
+#: Holds the discovery cache shared within this process
+DISCOVERY_CACHE = DiscoveryCache(get_index_cache_path())
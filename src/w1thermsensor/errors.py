@@ -83,3 +83,29 @@ class InvalidCalibrationDataError(W1ThermSensorError):
         super().__init__(
             "Calibration data {} is invalid: {}.".format(message, calibration_data)
         )
+
+
+class BusOverloadError(W1ThermSensorError):
+    """Exception when the sensors scheduled on a bus need more time than available"""
+
+    def __init__(self, bus_master, utilization):
+        super().__init__(
+            "The sensors on bus {} need {:.0%} of the bus time. "
+            "Increase their intervals or lower their resolution.".format(
+                bus_master or "default", utilization
+            )
+        )
+        self.bus_master = bus_master
+        self.utilization = utilization
+
+
+class BinlogError(W1ThermSensorError):
+    """Exception when a binary log is invalid or a reading cannot be logged"""
+
+    pass
+
+
+class DaemonError(W1ThermSensorError):
+    """Exception when the w1thermsensor daemon is not running or cannot be used"""
+
+    pass
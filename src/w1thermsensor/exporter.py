@@ -0,0 +1,204 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from w1thermsensor.daemon import Sampler, SensorState
+from w1thermsensor.openmetrics import (
+    CONTENT_TYPE,
+    DEFAULT_BUCKETS,
+    DEFAULT_PORT,
+    Histogram,
+    MetricFamily,
+    Sample,
+    format_metrics,
+    get_sensor_labels,
+)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server: "_HTTPServer"
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.exporter.get_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        # don't log every scrape
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], exporter: "Exporter") -> None:
+        super().__init__(address, _RequestHandler)
+        self.exporter = exporter
+
+
+class Exporter:
+    """
+    Exports the temperatures of all sensors as OpenMetrics over HTTP.
+
+    The sensors are read periodically by a ``Sampler`` in the background,
+    thus a scrape of ``/metrics`` is answered instantly from the latest readings,
+    no matter how many sensors are connected. Alongside the temperatures, the age of
+    the readings, a histogram of the read durations and the number of failed reads are
+    exported per sensor. The number of samples which failed as a whole, e.g. because
+    the kernel module was not loaded, is exported, too.
+
+    Examples:
+        Export the temperatures on port 9393 until interrupted
+
+        >>> Exporter(port=9393).serve_forever()
+    """
+
+    def __init__(
+        self,
+        address: str = "",
+        port: int = DEFAULT_PORT,
+        interval: float = 10.0,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Initializes an Exporter.
+
+        :param str address: the address to listen on. Defaults to all addresses.
+        :param int port: the port to listen on.
+        :param float interval: the interval to sample the sensors in seconds.
+        :param list buckets: the upper bounds of the read duration buckets in seconds.
+        :param callable clock: the clock used to compute the age of the readings.
+        """
+        self.address = (address, port)
+        self.buckets = buckets
+        self.clock = clock
+        self.sampler = Sampler(interval, on_update=self._observe)
+        self._durations: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[_HTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Returns the port the exporter listens on, e.g. if it was started on port 0"""
+        if self._server is None:
+            return self.address[1]
+        return self._server.server_port
+
+    def _observe(self, state: SensorState) -> None:
+        if state.duration is None:  # pragma: no cover
+            return
+        with self._lock:
+            histogram = self._durations.get(state.id)
+            if histogram is None:
+                histogram = self._durations[state.id] = Histogram(self.buckets)
+            histogram.observe(state.duration)
+
+    def get_metrics(self) -> str:
+        """Returns the metrics of the sampled sensors in the OpenMetrics text format"""
+        now = self.clock()
+        states = self.sampler.states
+        temperatures: List[Sample] = []
+        ages: List[Sample] = []
+        durations: List[Sample] = []
+        errors: List[Sample] = []
+
+        with self._lock:
+            for state in states:
+                labels = get_sensor_labels(state.id, state.type.name)
+                if state.reading is not None:
+                    temperatures.append(Sample("", labels, state.reading.temperature))
+                    ages.append(Sample("", labels, max(0.0, now - state.reading.timestamp)))
+                histogram = self._durations.get(state.id)
+                if histogram is not None:
+                    durations.extend(histogram.get_samples(labels))
+                errors.append(Sample("_total", labels, state.errors))
+
+        return format_metrics(
+            [
+                MetricFamily(
+                    "w1thermsensor_temperature_celsius",
+                    "gauge",
+                    "Latest temperature of the sensor",
+                    temperatures,
+                    "celsius",
+                ),
+                MetricFamily(
+                    "w1thermsensor_reading_age_seconds",
+                    "gauge",
+                    "Seconds since the latest reading of the sensor",
+                    ages,
+                    "seconds",
+                ),
+                MetricFamily(
+                    "w1thermsensor_read_duration_seconds",
+                    "histogram",
+                    "Duration of the reads of the sensor",
+                    durations,
+                    "seconds",
+                ),
+                MetricFamily(
+                    "w1thermsensor_read_errors",
+                    "counter",
+                    "Number of failed reads of the sensor",
+                    errors,
+                ),
+                MetricFamily(
+                    "w1thermsensor_sample_errors",
+                    "counter",
+                    "Number of samples which failed to read any sensor",
+                    [Sample("_total", {}, self.sampler.errors)],
+                ),
+            ]
+        )
+
+    def serve_forever(self) -> None:
+        """Sample the sensors and serve the metrics until interrupted"""
+        self._server = _HTTPServer(self.address, self)
+        self.sampler.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+    def start(self) -> None:
+        """Sample the sensors and serve the metrics in background threads"""
+        self._server = _HTTPServer(self.address, self)
+        self.sampler.start()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="w1-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background threads started with ``start()``"""
+        if self._server is not None:
+            self._server.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close()
+
+    def _close(self) -> None:
+        self.sampler.stop()
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
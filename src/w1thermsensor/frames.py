@@ -0,0 +1,172 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+from enum import Enum
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from w1thermsensor.errors import W1ThermSensorError
+from w1thermsensor.history import NS_PER_SECOND, HistoryStore
+from w1thermsensor.readings import Reading
+
+
+class Resampling(Enum):
+    """Supported ways to resample the readings of a sensor onto a time grid"""
+
+    #: interpolate linearly between the readings around a point of the grid
+    LINEAR = "linear"
+    #: hold the last reading before a point of the grid
+    HOLD = "hold"
+
+
+class Frame(NamedTuple):
+    """Represents the temperatures of multiple sensors on a common time grid"""
+
+    #: Holds the ids of the sensors in the order of the rows
+    sensor_ids: List[str]
+    #: Holds the time grid in seconds since the epoch as 1-D NumPy array
+    timestamps: Any
+    #: Holds the temperatures as 2-D NumPy array of sensors x time,
+    #: NaN where a sensor has no reading to resample from
+    values: Any
+
+
+def build_frame(
+    readings: Union[HistoryStore, Iterable[Reading]],
+    interval: Optional[float] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resampling: Resampling = Resampling.LINEAR,
+    sensor_ids: Optional[Sequence[str]] = None,
+) -> Frame:
+    """Resample the readings of multiple sensors onto a common time grid.
+
+    Readings of different sensors read one after the other are staggered in time.
+    The frame aligns them on a grid of the given ``interval``, which starts at a multiple
+    of the interval since the epoch.
+
+    Without an interval the grid consists of the timestamps of the readings. This is
+    exact for readings of bulk conversions, see ``w1thermsensor.bus.sweep_readings()``,
+    because all readings of a conversion share the same timestamp.
+
+    This requires NumPy: pip install w1thermsensor[numpy]
+
+    Examples:
+        Align the last hour of all sensors on a one minute grid
+
+        >>> frame = build_frame(history, interval=60, start=time.time() - 3600)
+        >>> frame.values.mean(axis=1)
+
+    :param readings: a ``HistoryStore`` or the readings to resample.
+    :param float interval: the interval of the grid in seconds.
+    :param float start: the start of the grid in seconds since the epoch.
+                        Defaults to the first reading.
+    :param float end: the end of the grid in seconds since the epoch, inclusive.
+                      Defaults to the last reading.
+    :param Resampling resampling: how to resample the readings onto the grid.
+    :param list sensor_ids: the sensors to include in the given order.
+                            Defaults to all sensors with readings.
+
+    :returns: the frame of the resampled readings.
+    :rtype: Frame
+    """
+    numpy = _import_numpy()
+
+    if interval is not None and interval <= 0:
+        raise ValueError("The given interval '{0}' must be positive".format(interval))
+
+    series = _get_series(numpy, readings)
+    if sensor_ids is None:
+        sensor_ids = list(series)
+
+    empty = (numpy.empty(0), numpy.empty(0))
+    columns = [series.get(sensor_id, empty) for sensor_id in sensor_ids]
+    grid = _get_grid(numpy, [t for t, _ in columns], interval, start, end)
+
+    values = numpy.full((len(columns), len(grid)), numpy.nan)
+    for row, (timestamps, temperatures) in enumerate(columns):
+        if not len(timestamps):
+            continue
+
+        if resampling is Resampling.LINEAR:
+            values[row] = numpy.interp(
+                grid, timestamps, temperatures, left=numpy.nan, right=numpy.nan
+            )
+        else:
+            indices = numpy.searchsorted(timestamps, grid, side="right") - 1
+            held = indices >= 0
+            values[row, held] = temperatures[indices[held]]
+
+    return Frame(list(sensor_ids), grid, values)
+
+
+def _get_series(numpy: Any, readings: Union[HistoryStore, Iterable[Reading]]) -> Dict[str, Tuple]:
+    """Returns the sorted timestamps in seconds and the temperatures by sensor"""
+    if isinstance(readings, HistoryStore):
+        return {
+            sensor_id: (
+                numpy.frombuffer(readings[sensor_id].timestamps, dtype=numpy.int64)
+                / NS_PER_SECOND,
+                numpy.frombuffer(readings[sensor_id].values, dtype=numpy.float64),
+            )
+            for sensor_id in readings
+        }
+
+    collected: Dict[str, Tuple[List[float], List[float]]] = {}
+    for reading in readings:
+        timestamps, temperatures = collected.setdefault(reading.sensor_id, ([], []))
+        timestamps.append(reading.timestamp)
+        temperatures.append(reading.temperature)
+
+    series = {}
+    for sensor_id, (timestamps, temperatures) in collected.items():
+        order = numpy.argsort(timestamps, kind="stable")
+        series[sensor_id] = (
+            numpy.asarray(timestamps, dtype=numpy.float64)[order],
+            numpy.asarray(temperatures, dtype=numpy.float64)[order],
+        )
+    return series
+
+
+def _get_grid(
+    numpy: Any,
+    timestamps: List[Any],
+    interval: Optional[float],
+    start: Optional[float],
+    end: Optional[float],
+) -> Any:
+    timestamps = [t for t in timestamps if len(t)]
+    if start is None:
+        if not timestamps:
+            return numpy.empty(0)
+        start = min(t[0] for t in timestamps)
+    if end is None:
+        if not timestamps:
+            return numpy.empty(0)
+        end = max(t[-1] for t in timestamps)
+
+    if interval is None:
+        grid = numpy.unique(numpy.concatenate(timestamps)) if timestamps else numpy.empty(0)
+        return grid[(grid >= start) & (grid <= end)]
+
+    first = math.ceil(start / interval)
+    last = math.floor(end / interval)
+    return numpy.arange(first, last + 1, dtype=numpy.float64) * interval
+
+
+def _import_numpy() -> Any:  # pragma: no cover
+    try:
+        import numpy
+    except ImportError:
+        raise W1ThermSensorError(
+            "Install the numpy extras to add support for frames: "
+            "pip install w1thermsensor[numpy]"
+        )
+    return numpy
@@ -0,0 +1,225 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from w1thermsensor.readings import Reading
+from w1thermsensor.streams import Stage
+
+#: Holds the number of nanoseconds per second
+NS_PER_SECOND = 1000000000
+
+
+class SensorHistory:
+    """
+    Holds the last ``capacity`` readings of a sensor.
+
+    The timestamps in nanoseconds since the epoch and the temperatures are stored in
+    preallocated ``array('q')`` and ``array('d')`` ring buffers. Every reading is written
+    twice, to its slot and to its mirror slot one capacity further, thus the history is
+    always a contiguous slice of the buffers, which is exported without copying through
+    ``memoryview``s, e.g. to be wrapped by ``numpy.frombuffer()``.
+
+    The exported views reference the ring buffers, thus they are overwritten by
+    readings appended later on. Copy them if they need to outlive further appends.
+
+    The readings must be appended in chronological order, so the timestamps are sorted
+    and time range queries use binary search.
+    """
+
+    __slots__ = ("capacity", "_timestamps", "_values", "_next", "_count")
+
+    def __init__(self, capacity: int) -> None:
+        """Initializes a SensorHistory.
+
+        :param int capacity: the number of readings to keep.
+        """
+        if capacity < 1:
+            raise ValueError("The given capacity '{0}' must be positive".format(capacity))
+
+        self.capacity = capacity
+        self._timestamps = array("q", bytes(8 * 2 * capacity))
+        self._values = array("d", bytes(8 * 2 * capacity))
+        #: Holds the slot the next reading is written to
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, temperature: float) -> None:
+        """Append a reading.
+
+        :param float timestamp: the time of the reading in seconds since the epoch.
+        :param float temperature: the temperature read.
+
+        :raises ValueError: if the reading is older than the newest one.
+        """
+        timestamp_ns = round(timestamp * NS_PER_SECOND)
+        if self._count and timestamp_ns < self._timestamps[self._end - 1]:
+            raise ValueError(
+                "The given timestamp '{0}' is older than the newest reading".format(timestamp)
+            )
+
+        slot = self._next
+        self._timestamps[slot] = self._timestamps[slot + self.capacity] = timestamp_ns
+        self._values[slot] = self._values[slot + self.capacity] = temperature
+        self._next = (slot + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    @property
+    def _end(self) -> int:
+        # the newest reading is in the mirror half right before the next slot
+        return self._next + self.capacity
+
+    @property
+    def timestamps(self) -> memoryview:
+        """Returns the timestamps in nanoseconds since the epoch, oldest first"""
+        return memoryview(self._timestamps)[self._end - self._count:self._end]
+
+    @property
+    def values(self) -> memoryview:
+        """Returns the temperatures, oldest first"""
+        return memoryview(self._values)[self._end - self._count:self._end]
+
+    def between(self, start: float, end: float) -> Tuple[memoryview, memoryview]:
+        """Returns the readings taken between the given times, both inclusive.
+
+        :param float start: the start time in seconds since the epoch.
+        :param float end: the end time in seconds since the epoch.
+
+        :returns: the timestamps in nanoseconds and the temperatures as views.
+        :rtype: tuple
+        """
+        timestamps = self.timestamps
+        first = bisect_left(timestamps, round(start * NS_PER_SECOND))
+        last = bisect_right(timestamps, round(end * NS_PER_SECOND))
+        return timestamps[first:last], self.values[first:last]
+
+    def last(self, duration: float) -> Tuple[memoryview, memoryview]:
+        """Returns the readings taken in the given duration before the newest one.
+
+        :param float duration: the duration in seconds.
+
+        :returns: the timestamps in nanoseconds and the temperatures as views.
+        :rtype: tuple
+        """
+        if not self._count:
+            return self.timestamps, self.values
+
+        newest = self._timestamps[self._end - 1] / NS_PER_SECOND
+        return self.between(newest - duration, newest)
+
+    def at(self, timestamp: float, interpolate: bool = False) -> Optional[float]:
+        """Returns the temperature at the given time.
+
+        :param float timestamp: the time in seconds since the epoch.
+        :param bool interpolate: interpolate linearly between the readings around the time
+                                 instead of returning the reading nearest to it.
+
+        :returns: the temperature or ``None`` if there are no readings or the time is
+                  outside of the history when interpolating.
+        :rtype: float
+        """
+        timestamps = self.timestamps
+        values = self.values
+        timestamp_ns = round(timestamp * NS_PER_SECOND)
+        index = bisect_left(timestamps, timestamp_ns)
+
+        if index < len(timestamps) and timestamps[index] == timestamp_ns:
+            return values[index]
+
+        if interpolate:
+            if index == 0 or index == len(timestamps):
+                return None
+            before, after = timestamps[index - 1], timestamps[index]
+            fraction = (timestamp_ns - before) / (after - before)
+            return values[index - 1] + fraction * (values[index] - values[index - 1])
+
+        if not timestamps:
+            return None
+        if index == len(timestamps) or (
+            index > 0 and timestamp_ns - timestamps[index - 1] <= timestamps[index] - timestamp_ns
+        ):
+            index -= 1
+        return values[index]
+
+
+class HistoryStore(Stage):
+    """
+    Keeps the history of the last readings of every sensor.
+
+    The store is a ``Stage`` which records every reading passing through it, so it can
+    be put into a pipeline of readings, see ``w1thermsensor.streams.pipe()``.
+
+    Readings older than the newest one of their sensor, e.g. after the system clock was
+    stepped back, are not recorded but counted in ``skipped``. They are still passed on.
+
+    Examples:
+        Keep the last hour of readings taken every second
+
+        >>> history = HistoryStore(capacity=3600)
+        >>> for reading in pipe(stream(sensor, 1), history):
+        ...     values = numpy.frombuffer(history[sensor.id].values)
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Initializes a HistoryStore.
+
+        :param int capacity: the number of readings to keep per sensor.
+        """
+        # validate the capacity early
+        SensorHistory(capacity)
+        self.capacity = capacity
+        #: Holds the number of readings skipped because they were out of order
+        self.skipped = 0
+        self._histories: Dict[str, SensorHistory] = {}
+
+    def __getitem__(self, sensor_id: str) -> SensorHistory:
+        return self._histories[sensor_id]
+
+    def __contains__(self, sensor_id: object) -> bool:
+        return sensor_id in self._histories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._histories))
+
+    def __len__(self) -> int:
+        return len(self._histories)
+
+    def get(self, sensor_id: str) -> Optional[SensorHistory]:
+        """Returns the history of the given sensor or ``None`` if it has no readings"""
+        return self._histories.get(sensor_id)
+
+    def add(self, reading: Reading) -> bool:
+        """Record the given reading.
+
+        :param Reading reading: the reading to record.
+
+        :returns: if the reading was recorded, ``False`` if it was skipped because it is
+                  older than the newest reading of its sensor.
+        :rtype: bool
+        """
+        history = self._histories.get(reading.sensor_id)
+        if history is None:
+            history = self._histories[reading.sensor_id] = SensorHistory(self.capacity)
+
+        try:
+            history.append(reading.timestamp, reading.temperature)
+        except ValueError:
+            self.skipped += 1
+            return False
+        return True
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        self.add(item)
+        return (item,)
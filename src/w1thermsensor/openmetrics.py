@@ -0,0 +1,128 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+from bisect import bisect_left
+from typing import Dict, Iterable, List, NamedTuple, Sequence
+
+#: Holds the default port of the exporter
+DEFAULT_PORT = 9393
+
+#: Holds the HTTP content type of the OpenMetrics text format
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+#: Holds the upper bounds of the read duration buckets in seconds.
+#: A conversion takes up to 94 ms at 9 bit and 750 ms at 12 bit resolution.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.2, 0.4, 0.8, 1.0, 2.0)
+
+Labels = Dict[str, str]
+
+
+class Sample(NamedTuple):
+    """Represents a sample of a metric"""
+
+    #: Holds the suffix of the sample's name, e.g. ``_total`` or ``_bucket``
+    suffix: str
+    labels: Labels
+    value: float
+
+
+class MetricFamily(NamedTuple):
+    """Represents a metric and its samples"""
+
+    name: str
+    #: Holds the OpenMetrics type, e.g. ``gauge``, ``counter`` or ``histogram``
+    type: str
+    help: str
+    samples: List[Sample]
+    unit: str = ""
+
+
+class Histogram:
+    """
+    Counts observations in cumulative buckets like an OpenMetrics histogram.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        """Initializes a Histogram.
+
+        :param list buckets: the sorted upper bounds of the buckets.
+                             A bucket for ``+Inf`` is added.
+        """
+        self.bounds = list(buckets) + [math.inf]
+        self.counts = [0] * len(self.bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Count the given value"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_samples(self, labels: Labels) -> List[Sample]:
+        """Returns the samples of this histogram with the given labels"""
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            bucket = "+Inf" if math.isinf(bound) else repr(float(bound))
+            samples.append(Sample("_bucket", dict(labels, le=bucket), cumulative))
+        samples.append(Sample("_count", labels, self.count))
+        samples.append(Sample("_sum", labels, self.sum))
+        return samples
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{{{0}}}".format(
+        ",".join('{0}="{1}"'.format(k, _escape(v)) for k, v in labels.items())
+    )
+
+
+def format_metrics(families: Iterable[MetricFamily]) -> str:
+    """Returns the given metrics in the OpenMetrics text format"""
+    lines = []
+    for family in families:
+        lines.append("# TYPE {0} {1}".format(family.name, family.type))
+        if family.unit:
+            lines.append("# UNIT {0} {1}".format(family.name, family.unit))
+        lines.append("# HELP {0} {1}".format(family.name, _escape(family.help)))
+        for sample in family.samples:
+            lines.append(
+                "{0}{1}{2} {3}".format(
+                    family.name,
+                    sample.suffix,
+                    _format_labels(sample.labels),
+                    _format_value(sample.value),
+                )
+            )
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def get_sensor_labels(sensor_id: str, sensor_type: str) -> Labels:
+    """Returns the labels identifying a sensor"""
+    return {"sensor_id": sensor_id, "type": sensor_type}
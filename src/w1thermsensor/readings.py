@@ -0,0 +1,26 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+from typing import NamedTuple
+
+from w1thermsensor.units import Unit
+
+
+class Reading(NamedTuple):
+    """Represents a temperature read from a sensor at a point in time"""
+
+    #: Holds the id of the sensor the temperature was read from
+    sensor_id: str
+    #: Holds the time of the reading in seconds since the epoch
+    timestamp: float
+    #: Holds the temperature in the unit of ``unit``
+    temperature: float
+    #: Holds the unit of the temperature
+    unit: Unit = Unit.DEGREES_C
@@ -0,0 +1,615 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from w1thermsensor.bus import ErrorCallback
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import BusOverloadError, W1ThermSensorError
+from w1thermsensor.readings import Reading
+from w1thermsensor.units import Unit
+
+#: Holds the maximum conversion time in seconds of a sensor by its resolution
+CONVERSION_TIMES = {9: 0.09375, 10: 0.1875, 11: 0.375, 12: 0.75}
+
+#: Holds the weight of a new measurement in the moving average of the conversion times
+CONVERSION_TIME_SMOOTHING = 0.2
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OverloadPolicy(Enum):
+    """Supported ways to handle a bus whose sensors need more time than available"""
+
+    #: reject sensors which would overload the bus
+    REFUSE = "refuse"
+    #: stretch the intervals of the sensors with the lowest priorities
+    STRETCH = "stretch"
+    #: lower the resolution of the sensors with the lowest priorities before stretching
+    REDUCE_RESOLUTION = "reduce-resolution"
+
+
+class BusUtilization(NamedTuple):
+    """Represents the fraction of the time a bus is busy reading its sensors"""
+
+    #: Holds the utilization the requested intervals need
+    demand: float
+    #: Holds the utilization of the effective, possibly stretched, intervals
+    utilization: float
+
+
+def get_conversion_time(resolution: int) -> float:
+    """Returns the maximum conversion time in seconds for the given resolution
+
+    :raises ValueError: if the resolution is out of range
+    """
+    try:
+        return CONVERSION_TIMES[resolution]
+    except KeyError:
+        raise ValueError(
+            "The given sensor resolution '{0}' is out of range (9-12)".format(resolution)
+        )
+
+
+@dataclass(frozen=True)
+class AdaptiveSampling:
+    """
+    Slows down reading a sensor while its temperature stays flat.
+
+    Every time a reading stays within the ``deadband`` around the last reading which moved,
+    the interval is multiplied by ``backoff`` up to the ``max_interval``. As soon as a reading
+    leaves the deadband, the sensor is read in its configured interval again, so transients
+    are caught at the full rate. Comparing against the last reading which moved instead of
+    the previous reading also catches slow drifts.
+
+    The ``deadband`` is given in the unit of the scheduler.
+    """
+
+    deadband: float
+    max_interval: float
+    backoff: float = 2.0
+
+    def __post_init__(self):
+        if self.deadband < 0:
+            raise ValueError("The given deadband '{0}' must not be negative".format(self.deadband))
+
+        if self.backoff <= 1:
+            raise ValueError("The given backoff '{0}' must be greater than 1".format(self.backoff))
+
+
+class ScheduledSensor:
+    """Represents a sensor read periodically by the ``Scheduler``"""
+
+    def __init__(
+        self,
+        sensor: W1ThermSensor,
+        interval: float,
+        priority: int,
+        conversion_time: float,
+        bus_master: Optional[str],
+        release: float,
+        adaptive: Optional[AdaptiveSampling] = None,
+    ) -> None:
+        self.sensor = sensor
+        #: Holds the interval configured for the sensor
+        self.base_interval = interval
+        #: Holds the interval requested for the sensor, which grows with adaptive sampling
+        self.requested_interval = interval
+        #: Holds the effective interval, which is stretched if the bus is overloaded
+        self.interval = interval
+        self.priority = priority
+        #: Holds the moving average of the measured read times
+        self.conversion_time = conversion_time
+        #: Holds the resolution of the sensor once it's known to the scheduler
+        self.resolution: Optional[int] = None
+        self.can_reduce_resolution = True
+        self.adaptive = adaptive
+        #: Holds the last temperature which left the deadband of the adaptive sampling
+        self.anchor: Optional[float] = None
+        self.bus_master = bus_master
+        #: Holds the time when the sensor is due to be read next
+        self.release = release
+
+    @property
+    def deadline(self) -> float:
+        """Returns the time until when the sensor must be read to keep its interval"""
+        return self.release + self.interval
+
+    @property
+    def utilization(self) -> float:
+        """Returns the fraction of the bus time reading the sensor takes"""
+        return self.conversion_time / self.interval
+
+    def adapt(self, temperature: float) -> None:
+        """Adapt the requested interval to the given temperature read from the sensor"""
+        if self.adaptive is None:
+            return
+
+        if self.anchor is not None and abs(temperature - self.anchor) <= self.adaptive.deadband:
+            self.requested_interval = min(
+                self.requested_interval * self.adaptive.backoff, self.adaptive.max_interval
+            )
+        else:
+            self.anchor = temperature
+            self.requested_interval = self.base_interval
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return "{}(sensor_id='{}', interval={}, priority={})".format(
+            self.__class__.__name__, self.sensor.id, self.interval, self.priority
+        )
+
+
+def _get_demand(sensors: List[ScheduledSensor]) -> float:
+    return sum(s.conversion_time / s.requested_interval for s in sensors)
+
+
+def _stretch_intervals(sensors: List[ScheduledSensor], max_utilization: float) -> None:
+    """Stretch the intervals of the lowest priorities until the sensors fit into the bus time.
+
+    All sensors up to the lowest priority whose higher priorities still fit are stretched
+    by the same factor, the sensors with higher priorities keep their requested intervals.
+    """
+    for scheduled in sensors:
+        scheduled.interval = scheduled.requested_interval
+
+    if _get_demand(sensors) <= max_utilization:
+        return
+
+    for priority in sorted({s.priority for s in sensors}):
+        reserved = _get_demand([s for s in sensors if s.priority > priority])
+        if reserved < max_utilization:
+            stretched = [s for s in sensors if s.priority <= priority]
+            factor = _get_demand(stretched) / (max_utilization - reserved)
+            for scheduled in stretched:
+                scheduled.interval = scheduled.requested_interval * factor
+            return
+
+
+class _BusSchedule:
+    """Holds the scheduled sensors of a single bus"""
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.sensors: Dict[str, ScheduledSensor] = {}
+        #: Holds if the bus thread must rebalance the sensors, which may access the bus
+        self.needs_balance = False
+        self._counter = itertools.count()
+        self._pending: List[Tuple[float, int, ScheduledSensor]] = []
+
+    def push(self, scheduled: ScheduledSensor) -> None:
+        heapq.heappush(self._pending, (scheduled.release, next(self._counter), scheduled))
+
+    def next(self, now: float) -> Tuple[Optional[ScheduledSensor], Optional[float]]:
+        """Select the sensor to read next with earliest deadline first ordering.
+
+        Reads are not preemptible, thus a sensor is only read if no sensor with a
+        higher priority gets due during its conversion. The read is only deferred
+        as long as the sensor can still be read after the higher priority one
+        within its own deadline, so low priorities are not starved.
+
+        :returns: the sensor to read now or ``None`` and the time to wait for the next one.
+        """
+        # drop sensors which were removed or rescheduled meanwhile
+        self._pending = [e for e in self._pending if self.sensors.get(e[2].sensor.id) is e[2]]
+        heapq.heapify(self._pending)
+
+        if not self._pending:
+            return None, None
+
+        ready = [e for e in self._pending if e[0] <= now]
+        if not ready:
+            return None, self._pending[0][0] - now
+
+        entry = min(ready, key=lambda e: (e[2].deadline, -e[2].priority, e[1]))
+        candidate = entry[2]
+        horizon = now + candidate.conversion_time
+        blocking = [
+            e[0]
+            for e in self._pending
+            if now < e[0] < horizon
+            and e[2].priority > candidate.priority
+            and e[0] + e[2].conversion_time + candidate.conversion_time <= candidate.deadline
+        ]
+        if blocking:
+            return None, min(blocking) - now
+
+        self._pending.remove(entry)
+        heapq.heapify(self._pending)
+        return candidate, None
+
+    def get_utilization(self) -> BusUtilization:
+        sensors = list(self.sensors.values())
+        return BusUtilization(_get_demand(sensors), sum(s.utilization for s in sensors))
+
+    def complete(self, scheduled: ScheduledSensor, now: float) -> None:
+        """Reschedule the given sensor after it was read"""
+        scheduled.release += scheduled.interval
+        if scheduled.release <= now:
+            # skip the missed reads instead of catching up with a burst of reads
+            missed = math.floor((now - scheduled.release) / scheduled.interval) + 1
+            scheduled.release += missed * scheduled.interval
+        if self.sensors.get(scheduled.sensor.id) is scheduled:
+            self.push(scheduled)
+
+
+class Scheduler:
+    """
+    Reads sensors periodically, each one with its own interval and priority.
+
+    The reads on each bus are serialized in a dedicated thread, because a bus can only
+    talk to one sensor at a time, while the buses are read in parallel.
+    The sensors due on a bus are read with earliest deadline first ordering.
+    A read is not started if a sensor with a higher priority gets due during its
+    conversion time, so high priority sensors don't wait behind low priority ones,
+    unless deferring the read any longer would make it miss its own interval.
+
+    The readings are dispatched to the ``callback`` and put into the ``queue``.
+
+    The time each read takes is measured and averaged per sensor. If the sensors on a bus
+    need more time than ``max_utilization`` of the bus time, the bus is overloaded and the
+    readings would lag further and further behind. Depending on the ``overload_policy``
+    sensors which would overload the bus are refused or the bus is degraded by lowering
+    the resolution and stretching the intervals of the sensors with the lowest priorities.
+    An overload detected by the measured read times is always resolved by degrading.
+
+    Examples:
+        Read the freezer every 5 seconds and the ambient sensor every minute
+
+        >>> readings = queue.Queue()
+        >>> scheduler = Scheduler(queue=readings)
+        >>> scheduler.add(freezer_sensor, interval=5, priority=10)
+        >>> scheduler.add(ambient_sensor, interval=60)
+        >>> scheduler.start()
+        >>> reading = readings.get()
+    """
+
+    def __init__(
+        self,
+        callback: Optional[Callable[[Reading], object]] = None,
+        queue: Optional["queue.Queue[Reading]"] = None,
+        unit: Unit = Unit.DEGREES_C,
+        on_error: Optional[ErrorCallback] = None,
+        clock: Callable[[], float] = time.monotonic,
+        overload_policy: OverloadPolicy = OverloadPolicy.STRETCH,
+        max_utilization: float = 1.0,
+        min_resolution: int = 9,
+    ) -> None:
+        """Initializes a Scheduler.
+
+        :param callable callback: called with every ``Reading``.
+        :param queue.Queue queue: a queue every ``Reading`` is put into.
+        :param unit: the unit of the temperatures.
+        :param callable on_error: called with the sensor and the error if reading a sensor
+                                  or dispatching its reading fails. If not given the
+                                  failed read is skipped and unexpected errors are logged.
+        :param callable clock: the monotonic clock used for scheduling.
+        :param OverloadPolicy overload_policy: how to handle an overloaded bus.
+        :param float max_utilization: the fraction of the bus time the reads may take.
+        :param int min_resolution: the resolution sensors are lowered to at most with
+                                   ``OverloadPolicy.REDUCE_RESOLUTION``.
+        """
+        if not 0 < max_utilization <= 1:
+            raise ValueError(
+                "The given max utilization '{0}' is out of range (0-1]".format(max_utilization)
+            )
+        get_conversion_time(min_resolution)
+
+        self.callback = callback
+        self.queue = queue
+        self.unit = unit
+        self.on_error = on_error
+        self.clock = clock
+        self.overload_policy = overload_policy
+        self.max_utilization = max_utilization
+        self.min_resolution = min_resolution
+        self._buses: Dict[Optional[str], _BusSchedule] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads: Dict[Optional[str], threading.Thread] = {}
+
+    @property
+    def sensors(self) -> List[ScheduledSensor]:
+        """Returns all scheduled sensors"""
+        with self._lock:
+            buses = list(self._buses.values())
+        return [s for b in buses for s in list(b.sensors.values())]
+
+    @property
+    def utilization(self) -> Dict[Optional[str], BusUtilization]:
+        """Returns the utilization of every bus by its bus master"""
+        with self._lock:
+            buses = list(self._buses.items())
+
+        utilization = {}
+        for bus_master, bus in buses:
+            with bus.condition:
+                utilization[bus_master] = bus.get_utilization()
+        return utilization
+
+    def add(
+        self,
+        sensor: W1ThermSensor,
+        interval: float,
+        priority: int = 0,
+        conversion_time: Optional[float] = None,
+        bus_master: Optional[str] = None,
+        adaptive: Optional[AdaptiveSampling] = None,
+    ) -> ScheduledSensor:
+        """Schedule the given sensor to be read periodically.
+
+        If the sensor is already scheduled, it's rescheduled with the new settings.
+
+        :param W1ThermSensor sensor: the sensor to read.
+        :param float interval: the interval to read the sensor in seconds.
+        :param int priority: the priority of the sensor. Higher values win.
+        :param float conversion_time: the time a read of the sensor takes in seconds.
+                                      Defaults to the conversion time at 12 bit resolution.
+        :param str bus_master: the bus master the sensor is connected to.
+                               Defaults to the discovered bus master.
+        :param AdaptiveSampling adaptive: slow down reading the sensor while its
+                                          temperature stays flat.
+
+        :returns: the scheduled sensor.
+        :rtype: ScheduledSensor
+
+        :raises BusOverloadError: if the sensor would overload the bus and the overload
+                                  policy is ``OverloadPolicy.REFUSE``.
+        """
+        if interval <= 0:
+            raise ValueError("The given interval '{0}' must be positive".format(interval))
+
+        if adaptive is not None and adaptive.max_interval < interval:
+            raise ValueError(
+                "The given max interval '{0}' must not be less than the interval '{1}'".format(
+                    adaptive.max_interval, interval
+                )
+            )
+
+        if conversion_time is None:
+            conversion_time = get_conversion_time(12)
+
+        if bus_master is None:
+            discovered = W1ThermSensor.get_sensor_registry().get(sensor.id)
+            bus_master = discovered.bus_master if discovered else None
+
+        with self._lock:
+            bus = self._buses.setdefault(bus_master, _BusSchedule())
+            start_thread = bool(self._threads) and bus_master not in self._threads
+
+        if self.overload_policy is OverloadPolicy.REFUSE:
+            with bus.condition:
+                others = [s for s in bus.sensors.values() if s.sensor.id != sensor.id]
+            demand = _get_demand(others) + conversion_time / interval
+            if demand > self.max_utilization:
+                raise BusOverloadError(bus_master, demand)
+
+        self.remove(sensor)
+        scheduled = ScheduledSensor(
+            sensor, interval, priority, conversion_time, bus_master, self.clock(), adaptive
+        )
+
+        with bus.condition:
+            bus.sensors[sensor.id] = scheduled
+            bus.push(scheduled)
+        self._request_balance(bus)
+
+        if start_thread:
+            self._start_bus(bus_master)
+
+        return scheduled
+
+    def remove(self, sensor: W1ThermSensor) -> None:
+        """Stop reading the given sensor"""
+        with self._lock:
+            buses = list(self._buses.values())
+
+        for bus in buses:
+            with bus.condition:
+                removed = bus.sensors.pop(sensor.id, None)
+            if removed is not None:
+                self._request_balance(bus)
+
+    def run_pending(self) -> List[Reading]:
+        """Read all sensors which are due now in the calling thread.
+
+        This is an alternative to ``start()`` for applications which run their own loop.
+
+        :returns: the readings of the sensors read.
+        :rtype: list
+        """
+        with self._lock:
+            buses = list(self._buses.values())
+
+        readings = []
+        for bus in buses:
+            self._balance_if_needed(bus)
+            while True:
+                with bus.condition:
+                    scheduled, _ = bus.next(self.clock())
+                if scheduled is None:
+                    break
+                reading = self._read(bus, scheduled)
+                if reading is not None:
+                    readings.append(reading)
+        return readings
+
+    def start(self) -> None:
+        """Start reading the sensors in one background thread per bus"""
+        self._stop_event.clear()
+        with self._lock:
+            bus_masters = list(self._buses)
+        for bus_master in bus_masters:
+            self._start_bus(bus_master)
+
+    def stop(self) -> None:
+        """Stop reading the sensors and wait for the background threads to finish"""
+        self._stop_event.set()
+        with self._lock:
+            buses = list(self._buses.values())
+            threads = list(self._threads.values())
+            self._threads = {}
+
+        for bus in buses:
+            with bus.condition:
+                bus.condition.notify_all()
+        for thread in threads:
+            thread.join()
+
+    def _start_bus(self, bus_master: Optional[str]) -> None:
+        thread = threading.Thread(
+            target=self._run_bus,
+            args=(self._buses[bus_master],),
+            name="w1-scheduler-{}".format(bus_master or "default"),
+            daemon=True,
+        )
+        with self._lock:
+            self._threads[bus_master] = thread
+        thread.start()
+
+    def _run_bus(self, bus: _BusSchedule) -> None:
+        while not self._stop_event.is_set():
+            self._balance_if_needed(bus)
+            with bus.condition:
+                if bus.needs_balance:
+                    continue
+                scheduled, wait = bus.next(self.clock())
+                if scheduled is None:
+                    bus.condition.wait(wait)
+                    continue
+            try:
+                self._read(bus, scheduled)
+            except Exception:  # pylint: disable=broad-except
+                # e.g. the error callback raised, keep reading the other sensors
+                _LOGGER.exception("Failed to read sensor %s", scheduled.sensor.id)
+
+    def _read(self, bus: _BusSchedule, scheduled: ScheduledSensor) -> Optional[Reading]:
+        reading = None
+        error: Optional[Exception] = None
+        started = self.clock()
+        try:
+            temperature = scheduled.sensor.get_temperature(self.unit)
+        except Exception as exc:  # pylint: disable=broad-except
+            error = exc
+        else:
+            reading = Reading(scheduled.sensor.id, time.time(), temperature, self.unit)
+        finished = self.clock()
+
+        if reading is not None:
+            with bus.condition:
+                scheduled.conversion_time += CONVERSION_TIME_SMOOTHING * (
+                    finished - started - scheduled.conversion_time
+                )
+                scheduled.adapt(reading.temperature)
+
+        self._balance(bus)
+        with bus.condition:
+            bus.complete(scheduled, finished)
+
+        if reading is not None:
+            try:
+                self._dispatch(reading)
+            except Exception as exc:  # pylint: disable=broad-except
+                error = exc
+        if error is not None:
+            self._report(scheduled.sensor, error)
+        return reading
+
+    def _report(self, sensor: W1ThermSensor, exc: Exception) -> None:
+        if self.on_error is not None:
+            self.on_error(sensor, exc)
+        elif not isinstance(exc, W1ThermSensorError):
+            _LOGGER.error("Failed to read sensor %s", sensor.id, exc_info=exc)
+
+    def _request_balance(self, bus: _BusSchedule) -> None:
+        """Stretch the intervals and let the bus thread reduce the resolutions if needed
+
+        Changing the resolutions accesses the bus, thus it's deferred to the thread
+        reading the bus to keep the bus accesses serialized.
+        """
+        with bus.condition:
+            _stretch_intervals(list(bus.sensors.values()), self.max_utilization)
+            if self.overload_policy is OverloadPolicy.REDUCE_RESOLUTION:
+                bus.needs_balance = True
+            bus.condition.notify()
+
+    def _balance_if_needed(self, bus: _BusSchedule) -> None:
+        with bus.condition:
+            needs_balance = bus.needs_balance
+        if needs_balance:
+            self._balance(bus)
+
+    def _balance(self, bus: _BusSchedule) -> None:
+        """Degrade the sensors on the given bus until they fit into its time
+
+        Must only be called by the thread reading the bus.
+        """
+        with bus.condition:
+            bus.needs_balance = False
+            sensors = list(bus.sensors.values())
+
+        if (
+            self.overload_policy is OverloadPolicy.REDUCE_RESOLUTION
+            and _get_demand(sensors) > self.max_utilization
+        ):
+            self._reduce_resolutions(bus, sensors)
+
+        with bus.condition:
+            _stretch_intervals(list(bus.sensors.values()), self.max_utilization)
+
+    def _reduce_resolutions(self, bus: _BusSchedule, sensors: List[ScheduledSensor]) -> None:
+        """Lower the resolutions bit by bit starting with the lowest priority"""
+        for priority in sorted({s.priority for s in sensors}):
+            group = [s for s in sensors if s.priority == priority]
+            for resolution in range(11, self.min_resolution - 1, -1):
+                for scheduled in group:
+                    with bus.condition:
+                        demand = _get_demand(sensors)
+                    if demand <= self.max_utilization:
+                        return
+                    self._reduce_resolution(bus, scheduled, resolution)
+
+    def _reduce_resolution(
+        self, bus: _BusSchedule, scheduled: ScheduledSensor, resolution: int
+    ) -> None:
+        if not scheduled.can_reduce_resolution:
+            return
+
+        try:
+            if scheduled.resolution is None:
+                scheduled.resolution = scheduled.sensor.get_resolution()
+            if scheduled.resolution <= resolution:
+                return
+            scheduled.sensor.set_resolution(resolution)
+        except W1ThermSensorError as exc:
+            # do not try again on every read
+            scheduled.can_reduce_resolution = False
+            self._report(scheduled.sensor, exc)
+            return
+
+        with bus.condition:
+            scheduled.conversion_time *= (
+                CONVERSION_TIMES[resolution] / CONVERSION_TIMES[scheduled.resolution]
+            )
+            scheduled.resolution = resolution
+
+    def _dispatch(self, reading: Reading) -> None:
+        if self.callback is not None:
+            self.callback(reading)
+        if self.queue is not None:
+            self.queue.put(reading)
@@ -9,6 +9,7 @@ A Python package and CLI tool to work with w1 temperature sensors.
 """
 
 from enum import Enum
+from typing import Optional
 
 
 class Sensor(int, Enum):
@@ -31,3 +32,24 @@ class Sensor(int, Enum):
     @classmethod
     def from_id_string(cls, id_string: str) -> "Sensor":
         return Sensor(int(id_string, 16))
+
+    @classmethod
+    def from_family_code(cls, family_code: str) -> Optional["Sensor"]:
+        """Returns the sensor for the given family code or ``None`` if it's not supported
+
+        The family code is the hex prefix of a w1 slave name, e.g. ``28`` for ``28-00000588806a``.
+        """
+        return _FAMILY_CODES.get(family_code.lower())
+
+
+class PowerMode(Enum):
+    """Supported ways a w1therm sensor can be powered"""
+
+    #: powered parasitically by the data line
+    PARASITE = 0
+    #: powered by an external supply
+    EXTERNAL = 1
+
+
+#: Holds the supported sensors by their family code to lookup w1 slave names
+_FAMILY_CODES = {"{:x}".format(s.value): s for s in Sensor}
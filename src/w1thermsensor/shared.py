@@ -0,0 +1,391 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+
+The shared readings table is a file which is memory mapped by one writer and many
+readers. It consists of a header::
+
+    magic       4s  b"W1TS"
+    version     B
+    capacity    I   number of slots
+    count       I   number of used slots
+
+followed by ``capacity`` slots, all little endian::
+
+    sequence    I   even while the slot is consistent, odd while it's written
+    id          16s id of the sensor
+    timestamp   d   time of the reading in seconds since the epoch
+    temperature d   temperature in Degrees Celsius
+
+The magic is cleared once the table was replaced by a table of another capacity,
+which tells the readers to map the new table.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from w1thermsensor.errors import W1ThermSensorError
+from w1thermsensor.readings import Reading
+from w1thermsensor.streams import Stage
+from w1thermsensor.units import Unit
+
+MAGIC = b"W1TS"
+VERSION = 1
+
+#: Holds the environment variable to configure the path of the shared readings table
+SHARED_READINGS_ENV = "W1THERMSENSOR_SHARED_READINGS"
+
+#: Holds the path of the shared readings table published by root
+SYSTEM_SHARED_READINGS_PATH = Path("/run/w1thermsensor/w1thermsensor-latest")
+
+_HEADER = struct.Struct("<4sB3xII")
+_COUNT = struct.Struct("<I")
+_COUNT_OFFSET = 12
+_SEQUENCE = struct.Struct("<I")
+_SLOT = struct.Struct("<I16sdd4x")
+_PAYLOAD = struct.Struct("<16sdd")
+
+#: Holds how often a read is retried while the slot is written
+MAX_READ_RETRIES = 10000
+
+
+def get_shared_readings_path() -> Path:
+    """Return the path of the shared readings table.
+
+    The path is configured with the ``W1THERMSENSOR_SHARED_READINGS`` environment variable.
+    It defaults to ``$XDG_RUNTIME_DIR/w1thermsensor-latest`` for users and to
+    ``SYSTEM_SHARED_READINGS_PATH`` for root or if there is no runtime directory.
+    Both are backed by memory and can only be written by their owner, unlike ``/dev/shm``,
+    where any user could create a spoofed table first.
+    """
+    value = os.environ.get(SHARED_READINGS_ENV)
+    if value:
+        return Path(value)
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.geteuid() != 0:
+        return Path(runtime_dir) / "w1thermsensor-latest"
+    return SYSTEM_SHARED_READINGS_PATH
+
+
+def _check_owner(path: Path, uid: int) -> None:
+    """Refuse tables which are not owned by root or the current user"""
+    if uid not in (0, os.geteuid()):
+        raise W1ThermSensorError(
+            "The shared readings table {0} is owned by another user (uid {1})".format(path, uid)
+        )
+
+
+def _get_slot_offset(slot: int) -> int:
+    return _HEADER.size + slot * _SLOT.size
+
+
+def _decode_header(data: Any) -> Tuple[int, int]:
+    """Returns the capacity and the count of the given table"""
+    if len(data) < _HEADER.size:
+        raise W1ThermSensorError("The shared readings table is truncated")
+
+    magic, version, capacity, count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or len(data) < _get_slot_offset(capacity):
+        raise W1ThermSensorError("The file is not a valid shared readings table")
+    return capacity, count
+
+
+class SharedReadingsWriter(Stage):
+    """
+    Publishes the latest reading of every sensor into a shared readings table.
+
+    A single collector process reads the sensors and publishes their readings, which any
+    number of processes get with a ``SharedReadingsReader`` without accessing the bus.
+    Every slot is protected by a sequence lock, thus readers never see partially written
+    readings and never block the writer.
+
+    The writer is a ``Stage``, so it can be put into a pipeline of readings, and its
+    ``write()`` method can be used as callback of the ``Scheduler``.
+
+    Examples:
+        Publish the readings of the scheduler
+
+        >>> table = SharedReadingsWriter()
+        >>> scheduler = Scheduler(callback=table.write)
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, capacity: int = 64) -> None:
+        """Initializes a SharedReadingsWriter.
+
+        An existing table of the same capacity is reused, so readers keep working when the
+        collector restarts. Slots the previous writer left in the middle of a write are
+        reset to have no reading. Otherwise the table is replaced by a new file and marked
+        as replaced, so readers switch over to the new file.
+
+        :param str path: the path of the table. Defaults to ``get_shared_readings_path()``.
+        :param int capacity: the maximum number of sensors.
+
+        :raises W1ThermSensorError: if the table exists but is owned by another user.
+        """
+        self.path = Path(path) if path is not None else get_shared_readings_path()
+        self.capacity = capacity
+        self._slots: Dict[str, int] = {}
+
+        try:
+            _check_owner(self.path, self.path.lstat().st_uid)
+        except FileNotFoundError:
+            pass
+
+        try:
+            self._mmap = self._open_existing()
+        except (OSError, W1ThermSensorError):
+            self._mmap = self._create()
+
+        _, count = _decode_header(self._mmap)
+        for slot in range(count):
+            offset = _get_slot_offset(slot)
+            sequence = _SEQUENCE.unpack_from(self._mmap, offset)[0]
+            sensor_id, _, _ = _PAYLOAD.unpack_from(self._mmap, offset + _SEQUENCE.size)
+            if sequence & 1:
+                # the previous writer crashed in the middle of a write, drop the torn reading
+                _PAYLOAD.pack_into(self._mmap, offset + _SEQUENCE.size, sensor_id, 0.0, 0.0)
+                _SEQUENCE.pack_into(self._mmap, offset, (sequence + 1) & 0xFFFFFFFF)
+            self._slots[sensor_id.rstrip(b"\0").decode("utf-8")] = slot
+
+    def _open_existing(self) -> mmap.mmap:
+        with self.path.open("r+b") as table_file:
+            table = mmap.mmap(table_file.fileno(), 0)
+        try:
+            capacity, _ = _decode_header(table)
+        except W1ThermSensorError:
+            table.close()
+            raise
+
+        if capacity != self.capacity:
+            table.close()
+            raise W1ThermSensorError("The shared readings table has another capacity")
+        return table
+
+    def _create(self) -> mmap.mmap:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # create the table aside and rename it, so readers never see it uninitialized
+        fd, temp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=".w1thermsensor")
+        try:
+            os.fchmod(fd, 0o644)
+            os.write(fd, _HEADER.pack(MAGIC, VERSION, self.capacity, 0))
+            os.ftruncate(fd, _get_slot_offset(self.capacity))
+            replaced = self._open_replaced()
+            os.replace(temp_path, str(self.path))
+            if replaced is not None:
+                # readers still map the old file, tell them to map the new one
+                replaced[: len(MAGIC)] = b"\0" * len(MAGIC)
+                replaced.close()
+            return mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+    def _open_replaced(self) -> Optional[mmap.mmap]:
+        try:
+            with self.path.open("r+b") as table_file:
+                table = mmap.mmap(table_file.fileno(), 0)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            _decode_header(table)
+        except W1ThermSensorError:
+            table.close()
+            return None
+        return table
+
+    def __enter__(self) -> "SharedReadingsWriter":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def write(self, reading: Reading) -> None:
+        """Publish the given reading as latest reading of its sensor.
+
+        :raises W1ThermSensorError: if the table is full.
+        """
+        slot = self._slots.get(reading.sensor_id)
+        if slot is None:
+            slot = self._add_slot(reading.sensor_id)
+
+        celsius = Unit.get_conversion_function(reading.unit, Unit.DEGREES_C)(reading.temperature)
+        offset = _get_slot_offset(slot)
+        sequence = _SEQUENCE.unpack_from(self._mmap, offset)[0]
+        _SEQUENCE.pack_into(self._mmap, offset, (sequence + 1) & 0xFFFFFFFF)
+        _PAYLOAD.pack_into(
+            self._mmap,
+            offset + _SEQUENCE.size,
+            reading.sensor_id.encode("utf-8"),
+            reading.timestamp,
+            celsius,
+        )
+        _SEQUENCE.pack_into(self._mmap, offset, (sequence + 2) & 0xFFFFFFFF)
+
+    def _add_slot(self, sensor_id: str) -> int:
+        slot = len(self._slots)
+        if slot >= self.capacity:
+            raise W1ThermSensorError(
+                "The shared readings table is full with {0} sensors".format(self.capacity)
+            )
+
+        if len(sensor_id.encode("utf-8")) > 16:
+            raise W1ThermSensorError("The sensor id {0} is too long".format(sensor_id))
+
+        # the slot is published by incrementing the count once it holds the sensor id
+        offset = _get_slot_offset(slot)
+        _SEQUENCE.pack_into(self._mmap, offset, 1)
+        _PAYLOAD.pack_into(
+            self._mmap, offset + _SEQUENCE.size, sensor_id.encode("utf-8"), 0.0, 0.0
+        )
+        _SEQUENCE.pack_into(self._mmap, offset, 0)
+        _COUNT.pack_into(self._mmap, _COUNT_OFFSET, slot + 1)
+        self._slots[sensor_id] = slot
+        return slot
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        self.write(item)
+        return (item,)
+
+
+class SharedReadingsReader:
+    """
+    Gets the latest readings published by a ``SharedReadingsWriter``.
+
+    Getting a reading only reads from shared memory, it doesn't access the bus.
+    Sensors which were added but not read yet have no reading. If the writer replaced
+    the table with one of another capacity, the reader maps the new table.
+
+    Examples:
+        Get the latest reading of a sensor published by the collector
+
+        >>> with SharedReadingsReader() as table:
+        ...     reading = table.get("00000588806a")
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Initializes a SharedReadingsReader.
+
+        Only a table owned by root or the current user is trusted.
+
+        :param str path: the path of the table. Defaults to ``get_shared_readings_path()``
+                         or to ``SYSTEM_SHARED_READINGS_PATH`` if the current user
+                         publishes no table.
+
+        :raises W1ThermSensorError: if the table does not exist, is invalid or is owned
+                                    by another user.
+        """
+        if path is None:
+            path = get_shared_readings_path()
+            if (
+                not os.environ.get(SHARED_READINGS_ENV)
+                and not path.exists()
+                and SYSTEM_SHARED_READINGS_PATH.exists()
+            ):
+                path = SYSTEM_SHARED_READINGS_PATH
+        self.path = Path(path)
+        self._mmap = self._open()
+        self._slots: Dict[str, int] = {}
+
+    def _open(self) -> mmap.mmap:
+        try:
+            with self.path.open("rb") as table_file:
+                _check_owner(self.path, os.fstat(table_file.fileno()).st_uid)
+                table = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            raise W1ThermSensorError(
+                "No shared readings table at {0}. Is the collector running?".format(self.path)
+            )
+
+        try:
+            _decode_header(table)
+        except W1ThermSensorError:
+            table.close()
+            raise
+        return table
+
+    def _reopen_if_replaced(self) -> None:
+        if self._mmap[: len(MAGIC)] == MAGIC:
+            return
+
+        table = self._open()
+        self._mmap.close()
+        self._mmap = table
+        self._slots = {}
+
+    def __enter__(self) -> "SharedReadingsReader":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    @property
+    def sensor_ids(self) -> List[str]:
+        """Returns the ids of the sensors in the table"""
+        self._reopen_if_replaced()
+        self._update_slots()
+        return list(self._slots)
+
+    def get(self, sensor_id: str, unit: Unit = Unit.DEGREES_C) -> Optional[Reading]:
+        """Returns the latest reading of the given sensor or ``None`` if there is none.
+
+        :raises W1ThermSensorError: if the slot of the sensor could not be read consistently.
+        """
+        self._reopen_if_replaced()
+        slot = self._slots.get(sensor_id)
+        if slot is None:
+            self._update_slots()
+            slot = self._slots.get(sensor_id)
+            if slot is None:
+                return None
+        return self._read_slot(slot, unit)
+
+    def get_all(self, unit: Unit = Unit.DEGREES_C) -> List[Reading]:
+        """Returns the latest readings of all sensors"""
+        self._reopen_if_replaced()
+        self._update_slots()
+        readings = [self._read_slot(slot, unit) for slot in self._slots.values()]
+        return [r for r in readings if r is not None]
+
+    def _update_slots(self) -> None:
+        count = _COUNT.unpack_from(self._mmap, _COUNT_OFFSET)[0]
+        for slot in range(len(self._slots), count):
+            sensor_id, _, _ = _PAYLOAD.unpack_from(
+                self._mmap, _get_slot_offset(slot) + _SEQUENCE.size
+            )
+            self._slots[sensor_id.rstrip(b"\0").decode("utf-8")] = slot
+
+    def _read_slot(self, slot: int, unit: Unit) -> Optional[Reading]:
+        offset = _get_slot_offset(slot)
+        for _ in range(MAX_READ_RETRIES):
+            before = _SEQUENCE.unpack_from(self._mmap, offset)[0]
+            if before & 1:
+                continue
+            sensor_id, timestamp, celsius = _PAYLOAD.unpack_from(
+                self._mmap, offset + _SEQUENCE.size
+            )
+            if _SEQUENCE.unpack_from(self._mmap, offset)[0] == before:
+                break
+        else:
+            raise W1ThermSensorError("Failed to read the shared reading of slot {0}".format(slot))
+
+        if timestamp == 0:
+            return None
+
+        temperature = Unit.get_conversion_function(Unit.DEGREES_C, unit)(celsius)
+        return Reading(sensor_id.rstrip(b"\0").decode("utf-8"), timestamp, temperature, unit)
@@ -0,0 +1,315 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from w1thermsensor.readings import Reading
+from w1thermsensor.streams import Stage
+from w1thermsensor.units import Unit
+
+
+class RunningStats:
+    """
+    Holds the count, mean, variance, minimum and maximum of values seen so far.
+
+    The values are not stored, every update takes constant time and memory.
+    The variance is computed with Welford's algorithm to avoid cancellation.
+    """
+
+    __slots__ = ("count", "mean", "min", "max", "_m2")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningStats") -> None:
+        """Add the values summarized by the given stats"""
+        if other.count == 0:
+            return
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Returns the sample variance of the values"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stddev(self) -> float:
+        """Returns the sample standard deviation of the values"""
+        return math.sqrt(self.variance)
+
+
+class Ewma:
+    """Holds the exponentially weighted moving average of values seen so far"""
+
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, alpha: float) -> None:
+        """Initializes an Ewma.
+
+        :param float alpha: the weight of a new value between 0 and 1.
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError("The given alpha '{0}' is out of range (0-1]".format(alpha))
+
+        self.alpha = alpha
+        self.value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class QuantileSketch:
+    """
+    Estimates quantiles of values seen so far in bounded memory.
+
+    The values are counted in bins of the given ``resolution``, thus the memory is bounded
+    by the range of the values divided by the resolution, no matter how many values are
+    added. The estimated quantiles are off by at most half the resolution. The default
+    resolution is the quantum of a sensor at 12 bit, which makes the sketch exact for
+    uncorrected temperatures in Degrees Celsius. Sketches are mergeable.
+    """
+
+    __slots__ = ("resolution", "count", "_bins")
+
+    def __init__(self, resolution: float = 0.0625) -> None:
+        if resolution <= 0:
+            raise ValueError("The given resolution '{0}' must be positive".format(resolution))
+
+        self.resolution = resolution
+        self.count = 0
+        self._bins: Dict[int, int] = {}
+
+    def update(self, value: float) -> None:
+        key = round(value / self.resolution)
+        self._bins[key] = self._bins.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the values counted by the given sketch"""
+        for key, count in other._bins.items():
+            self._bins[key] = self._bins.get(key, 0) + count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Returns the estimated ``q`` quantile of the values.
+
+        :raises ValueError: if no values were added or ``q`` is out of range.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("The given quantile '{0}' is out of range (0-1)".format(q))
+
+        if self.count == 0:
+            raise ValueError("No values to compute the quantile from")
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self._bins):
+            seen += self._bins[key]
+            if seen > rank:
+                return key * self.resolution
+        raise AssertionError("unreachable")  # pragma: no cover
+
+
+class Rollup(NamedTuple):
+    """Represents the aggregated readings of a sensor in a time window"""
+
+    sensor_id: str
+    #: Holds the start of the window in seconds since the epoch
+    start: float
+    #: Holds the end of the window in seconds since the epoch, exclusive
+    end: float
+    #: Holds the number of readings in the window
+    samples: int
+    mean: float
+    stddev: float
+    min: float
+    max: float
+    #: Holds the exponentially weighted moving average at the end of the window
+    ewma: float
+    #: Holds the estimated quantiles by the requested probability
+    quantiles: Dict[float, float]
+    unit: Unit = Unit.DEGREES_C
+
+
+class _Pane:
+    """Holds the summary of the readings in one step of a window"""
+
+    __slots__ = ("index", "stats", "sketch")
+
+    def __init__(self, index: int, resolution: float) -> None:
+        self.index = index
+        self.stats = RunningStats()
+        self.sketch = QuantileSketch(resolution)
+
+    def update(self, value: float) -> None:
+        self.stats.update(value)
+        self.sketch.update(value)
+
+
+class _SensorWindows:
+    __slots__ = ("panes", "ewma", "unit")
+
+    def __init__(self, alpha: float) -> None:
+        self.panes: Deque[_Pane] = deque()
+        self.ewma = Ewma(alpha)
+        self.unit = Unit.DEGREES_C
+
+
+class SlidingWindow(Stage):
+    """
+    Aggregates the readings of each sensor into windows sliding in steps.
+
+    Every ``step`` seconds a ``Rollup`` of the readings in the last ``size`` seconds is
+    emitted. Windows are aligned to multiples of the step since the epoch and windows
+    without readings are not emitted.
+
+    The readings are not stored, but summarized in one pane per step, thus the memory is
+    bounded by the number of steps per window, no matter how many readings arrive.
+    """
+
+    def __init__(
+        self,
+        size: float,
+        step: float,
+        quantiles: Sequence[float] = (0.5,),
+        alpha: float = 0.1,
+        resolution: float = 0.0625,
+    ) -> None:
+        """Initializes a SlidingWindow.
+
+        :param float size: the size of the windows in seconds.
+        :param float step: the step the windows slide in seconds.
+                           The size must be a multiple of the step.
+        :param list quantiles: the quantiles to estimate, e.g. ``(0.5, 0.95)``.
+        :param float alpha: the weight of a new reading in the moving average.
+        :param float resolution: the resolution of the quantile estimation.
+        """
+        panes = size / step if step > 0 else 0
+        if panes < 1 or not math.isclose(panes, round(panes)):
+            raise ValueError(
+                "The window size '{0}' must be a positive multiple of the step '{1}'".format(
+                    size, step
+                )
+            )
+
+        self.size = size
+        self.step = step
+        self.quantiles = tuple(quantiles)
+        self.alpha = alpha
+        self.resolution = resolution
+        self._panes_per_window = round(panes)
+        self._sensors: Dict[str, _SensorWindows] = {}
+        # validate the parameters early
+        Ewma(alpha)
+        for q in self.quantiles:
+            if not 0 <= q <= 1:
+                raise ValueError("The given quantile '{0}' is out of range (0-1)".format(q))
+
+    def process(self, item: Reading) -> Iterable[Rollup]:
+        windows = self._sensors.get(item.sensor_id)
+        if windows is None:
+            windows = self._sensors[item.sensor_id] = _SensorWindows(self.alpha)
+
+        index = math.floor(item.timestamp / self.step)
+        rollups: List[Rollup] = []
+        panes = windows.panes
+        if panes and index > panes[-1].index:
+            last = panes[-1].index
+            # emit the windows ending with the closed panes which still hold readings
+            for end in range(last, min(index, last + self._panes_per_window)):
+                rollups.append(self._get_rollup(item.sensor_id, windows, end))
+            while panes and panes[0].index <= index - self._panes_per_window:
+                panes.popleft()
+
+        if not panes or index > panes[-1].index:
+            panes.append(_Pane(index, self.resolution))
+        # late readings are added to the current pane
+        panes[-1].update(item.temperature)
+        windows.ewma.update(item.temperature)
+        windows.unit = item.unit
+        return rollups
+
+    def flush(self) -> Iterable[Rollup]:
+        return [
+            self._get_rollup(sensor_id, windows, windows.panes[-1].index)
+            for sensor_id, windows in self._sensors.items()
+            if windows.panes
+        ]
+
+    def _get_rollup(self, sensor_id: str, windows: _SensorWindows, end: int) -> Rollup:
+        stats = RunningStats()
+        sketch = QuantileSketch(self.resolution)
+        for pane in windows.panes:
+            if end - self._panes_per_window < pane.index <= end:
+                stats.merge(pane.stats)
+                sketch.merge(pane.sketch)
+
+        return Rollup(
+            sensor_id,
+            (end + 1 - self._panes_per_window) * self.step,
+            (end + 1) * self.step,
+            stats.count,
+            stats.mean,
+            stats.stddev,
+            stats.min,
+            stats.max,
+            windows.ewma.value,  # type: ignore
+            {q: sketch.quantile(q) for q in self.quantiles},
+            windows.unit,
+        )
+
+
+class TumblingWindow(SlidingWindow):
+    """
+    Aggregates the readings of each sensor into consecutive windows of a fixed size.
+
+    Every ``size`` seconds a ``Rollup`` of the readings in the window is emitted.
+    See ``SlidingWindow`` for full reference.
+
+    Examples:
+        Log the per minute mean and 95th percentile of a sensor
+
+        >>> for rollup in pipe(stream(sensor, 1), TumblingWindow(60, quantiles=(0.95,))):
+        ...     print(rollup.start, rollup.mean, rollup.quantiles[0.95])
+    """
+
+    def __init__(
+        self,
+        size: float,
+        quantiles: Sequence[float] = (0.5,),
+        alpha: float = 0.1,
+        resolution: float = 0.0625,
+    ) -> None:
+        super().__init__(size, size, quantiles, alpha, resolution)
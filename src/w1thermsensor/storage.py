@@ -0,0 +1,292 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from w1thermsensor.readings import Reading
+from w1thermsensor.streams import Stage
+from w1thermsensor.units import Unit
+
+#: Holds the number of seconds per day
+DAY = 24 * 60 * 60
+#: Holds the minimum seconds between two prunings of old data
+PRUNE_INTERVAL = 60 * 60
+
+
+class RollupResolution(Enum):
+    """Supported resolutions of the rollup tables by their table name suffix"""
+
+    MINUTE = "1m"
+    HOUR = "1h"
+
+    @property
+    def seconds(self) -> int:
+        return 60 if self is RollupResolution.MINUTE else 60 * 60
+
+    @property
+    def table(self) -> str:
+        return "rollups_{}".format(self.value)
+
+
+class StoredRollup(NamedTuple):
+    """Represents the aggregated readings of a sensor in a rollup table"""
+
+    sensor_id: str
+    #: Holds the start of the rollup in seconds since the epoch
+    start: float
+    #: Holds the end of the rollup in seconds since the epoch, exclusive
+    end: float
+    #: Holds the number of readings in the rollup
+    samples: int
+    mean: float
+    min: float
+    max: float
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    sensor_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    temperature REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS readings_sensor_ts ON readings (sensor_id, ts);
+"""
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    sensor_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (sensor_id, ts)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteSink(Stage):
+    """
+    Stores readings in a SQLite database.
+
+    Readings are buffered and inserted in batches within a single transaction, once the
+    ``batch_size`` is reached or ``flush_interval`` seconds passed since the last commit.
+    Both are only checked when a reading is written, thus if the readings stop the buffer
+    is kept until ``commit()`` or ``close()`` is called.
+    The database runs in WAL mode with ``synchronous=NORMAL``, thus a commit doesn't sync
+    the disk, which spares SD cards. A power loss may lose the last commits, but never
+    corrupts the database.
+
+    The temperatures are stored in Degrees Celsius. Alongside the raw readings, rollups of
+    count, sum, min and max per sensor are maintained at 1 minute and 1 hour resolution.
+    Raw readings and minute rollups are pruned after their retention, hour rollups are
+    kept forever unless a retention is given for them as well.
+
+    The sink is a ``Stage``, so it can be put into a pipeline of readings, and its
+    ``write()`` method can be used as callback of the ``Scheduler``.
+
+    Examples:
+        Store the readings of the scheduler
+
+        >>> sink = SQLiteSink("readings.db")
+        >>> scheduler = Scheduler(callback=sink.write)
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_size: int = 100,
+        flush_interval: float = 60.0,
+        retention: Optional[float] = 7 * DAY,
+        minute_retention: Optional[float] = 90 * DAY,
+        hour_retention: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Initializes a SQLiteSink.
+
+        :param str path: the path of the database.
+        :param int batch_size: the number of readings to insert at once.
+        :param float flush_interval: the seconds after the last commit from which on a
+                                     written reading commits the buffer.
+        :param float retention: the seconds to keep raw readings for or ``None`` to keep them.
+        :param float minute_retention: the seconds to keep minute rollups for.
+        :param float hour_retention: the seconds to keep hour rollups for.
+        :param callable clock: the monotonic clock used for the flush interval.
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retentions = {
+            "readings": retention,
+            RollupResolution.MINUTE.table: minute_retention,
+            RollupResolution.HOUR.table: hour_retention,
+        }
+        self.clock = clock
+        self._buffer: List[Tuple[str, float, float]] = []
+        self._last_commit = clock()
+        self._last_prune: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # readings are written from the scheduler's bus threads in parallel, thus every
+        # access to the connection is guarded by the lock
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            _SCHEMA
+            + "".join(_ROLLUP_SCHEMA.format(table=r.table) for r in RollupResolution)
+        )
+
+    def __enter__(self) -> "SQLiteSink":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(self, reading: Reading) -> None:
+        """Buffer the given reading and commit the buffered readings if due"""
+        celsius = Unit.get_conversion_function(reading.unit, Unit.DEGREES_C)(reading.temperature)
+        with self._lock:
+            self._buffer.append((reading.sensor_id, reading.timestamp, celsius))
+            if (
+                len(self._buffer) >= self.batch_size
+                or self.clock() - self._last_commit >= self.flush_interval
+            ):
+                self._commit()
+
+    def commit(self) -> None:
+        """Commit the buffered readings"""
+        with self._lock:
+            self._commit()
+
+    def close(self) -> None:
+        """Commit the buffered readings and close the database"""
+        with self._lock:
+            self._commit()
+            self._connection.close()
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        self.write(item)
+        return (item,)
+
+    def flush(self) -> Iterable[Reading]:
+        self.commit()
+        return ()
+
+    def get_readings(self, sensor_id: str, start: float, end: float) -> List[Reading]:
+        """Returns the stored readings of the given sensor between the given times.
+
+        :param str sensor_id: the id of the sensor.
+        :param float start: the start time in seconds since the epoch, inclusive.
+        :param float end: the end time in seconds since the epoch, exclusive.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sensor_id, ts, temperature FROM readings "
+                "WHERE sensor_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                (sensor_id, start, end),
+            ).fetchall()
+        return [Reading(*row) for row in rows]
+
+    def get_rollups(
+        self,
+        sensor_id: str,
+        start: float,
+        end: float,
+        resolution: RollupResolution = RollupResolution.MINUTE,
+    ) -> List[StoredRollup]:
+        """Returns the rollups of the given sensor starting between the given times.
+
+        :param str sensor_id: the id of the sensor.
+        :param float start: the start time in seconds since the epoch, inclusive.
+        :param float end: the end time in seconds since the epoch, exclusive.
+        :param RollupResolution resolution: the resolution of the rollups.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT sensor_id, ts, count, sum, min, max FROM {} "
+                "WHERE sensor_id = ? AND ts >= ? AND ts < ? ORDER BY ts".format(resolution.table),
+                (sensor_id, start, end),
+            ).fetchall()
+        return [
+            StoredRollup(sid, ts, ts + resolution.seconds, count, total / count, low, high)
+            for sid, ts, count, total, low, high in rows
+        ]
+
+    def _commit(self) -> None:
+        self._last_commit = self.clock()
+        if not self._buffer:
+            return
+
+        buffer, self._buffer = self._buffer, []
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO readings (sensor_id, ts, temperature) VALUES (?, ?, ?)", buffer
+            )
+            for resolution in RollupResolution:
+                self._update_rollups(resolution, buffer)
+
+        if self._last_prune is None or self._last_commit - self._last_prune >= PRUNE_INTERVAL:
+            self._prune(max(ts for _, ts, _ in buffer))
+            self._last_prune = self._last_commit
+
+    def _update_rollups(
+        self, resolution: RollupResolution, buffer: List[Tuple[str, float, float]]
+    ) -> None:
+        # aggregate the batch first to touch every rollup only once
+        rollups: Dict[Tuple[str, int], List[float]] = {}
+        for sensor_id, ts, temperature in buffer:
+            key = (sensor_id, math.floor(ts / resolution.seconds) * resolution.seconds)
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = [1, temperature, temperature, temperature]
+            else:
+                rollup[0] += 1
+                rollup[1] += temperature
+                rollup[2] = min(rollup[2], temperature)
+                rollup[3] = max(rollup[3], temperature)
+
+        # insert or update separately instead of an upsert to support SQLite before 3.24
+        self._connection.executemany(
+            "INSERT OR IGNORE INTO {} (sensor_id, ts, count, sum, min, max) "
+            "VALUES (?, ?, 0, 0, ?, ?)".format(resolution.table),
+            [(sid, ts, low, high) for (sid, ts), (_, _, low, high) in rollups.items()],
+        )
+        self._connection.executemany(
+            "UPDATE {} SET count = count + ?, sum = sum + ?, min = MIN(min, ?), max = MAX(max, ?) "
+            "WHERE sensor_id = ? AND ts = ?".format(resolution.table),
+            [
+                (count, total, low, high, sid, ts)
+                for (sid, ts), (count, total, low, high) in rollups.items()
+            ],
+        )
+
+    def _prune(self, now: float) -> None:
+        """Delete the data older than its retention relative to the given time"""
+        with self._connection:
+            sensor_ids = [
+                row[0]
+                for row in self._connection.execute(
+                    "SELECT DISTINCT sensor_id FROM {}".format(RollupResolution.HOUR.table)
+                )
+            ]
+            for table, retention in self.retentions.items():
+                if retention is None:
+                    continue
+                # delete per sensor to use the (sensor_id, ts) index
+                self._connection.executemany(
+                    "DELETE FROM {} WHERE sensor_id = ? AND ts < ?".format(table),
+                    [(sensor_id, now - retention) for sensor_id in sensor_ids],
+                )
@@ -0,0 +1,302 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import asyncio
+import statistics
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional
+)
+
+from w1thermsensor.async_core import AsyncW1ThermSensor
+from w1thermsensor.bus import ErrorCallback
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import W1ThermSensorError
+from w1thermsensor.readings import Reading
+from w1thermsensor.units import Unit
+
+
+def stream(
+    sensor: W1ThermSensor,
+    interval: float,
+    unit: Unit = Unit.DEGREES_C,
+    on_error: Optional[ErrorCallback] = None,
+) -> Iterator[Reading]:
+    """Read the given sensor periodically and yield the readings.
+
+    The reads are aligned to the interval, thus the time spent in the consumer does not
+    shift them. Reads missed because the consumer was too slow are skipped.
+
+    :param W1ThermSensor sensor: the sensor to read.
+    :param float interval: the interval to read the sensor in seconds.
+    :param unit: the unit of the temperatures.
+    :param callable on_error: called with the sensor and the error if reading the sensor
+                              fails. If not given the error is raised.
+
+    :returns: an infinite iterator of readings.
+    :rtype: iterator
+    """
+    _check_interval(interval)
+    next_read = time.monotonic()
+    while True:
+        try:
+            temperature = sensor.get_temperature(unit)
+        except W1ThermSensorError as exc:
+            if on_error is None:
+                raise
+            on_error(sensor, exc)
+        else:
+            yield Reading(sensor.id, time.time(), temperature, unit)
+
+        next_read = _get_next_read(next_read, interval)
+        time.sleep(max(next_read - time.monotonic(), 0))
+
+
+async def astream(
+    sensor: AsyncW1ThermSensor,
+    interval: float,
+    unit: Unit = Unit.DEGREES_C,
+    on_error: Optional[ErrorCallback] = None,
+) -> AsyncIterator[Reading]:
+    """Read the given sensor periodically and yield the readings.
+
+    See ``stream()`` for full reference.
+    """
+    _check_interval(interval)
+    next_read = time.monotonic()
+    while True:
+        try:
+            temperature = await sensor.get_temperature(unit)  # type: ignore
+        except W1ThermSensorError as exc:
+            if on_error is None:
+                raise
+            on_error(sensor, exc)
+        else:
+            yield Reading(sensor.id, time.time(), temperature, unit)
+
+        next_read = _get_next_read(next_read, interval)
+        await asyncio.sleep(max(next_read - time.monotonic(), 0))
+
+
+def _check_interval(interval: float) -> None:
+    if interval <= 0:
+        raise ValueError("The given interval '{0}' must be positive".format(interval))
+
+
+def _get_next_read(last_read: float, interval: float) -> float:
+    next_read = last_read + interval
+    now = time.monotonic()
+    if next_read < now:
+        # skip the missed reads instead of catching up with a burst of reads
+        next_read += (now - next_read) // interval * interval + interval
+    return next_read
+
+
+class Stage(ABC):
+    """
+    Represents a processing step in a pipeline of readings.
+
+    A stage receives the items one by one and emits zero or more items for each of them.
+    Stages are chained with ``pipe()`` or ``apipe()``, the items emitted by one stage are
+    received by the next one. Subclasses must implement ``process()``.
+    """
+
+    @abstractmethod
+    def process(self, item: Any) -> Iterable[Any]:
+        """Process the given item.
+
+        :returns: the items to emit.
+        :rtype: iterable
+        """
+
+    def flush(self) -> Iterable[Any]:
+        """Called once the input is exhausted.
+
+        :returns: the items still pending in the stage.
+        :rtype: iterable
+        """
+        return ()
+
+
+def _process(stages: Iterable[Stage], item: Any) -> List[Any]:
+    items = [item]
+    for stage in stages:
+        items = [emitted for i in items for emitted in stage.process(i)]
+    return items
+
+
+def _flush(stages: Iterable[Stage]) -> List[Any]:
+    items: List[Any] = []
+    for stage in stages:
+        items = [emitted for i in items for emitted in stage.process(i)]
+        items.extend(stage.flush())
+    return items
+
+
+def pipe(items: Iterable[Any], *stages: Stage) -> Iterator[Any]:
+    """Pass the given items through the given stages.
+
+    Examples:
+        Print the temperature of a sensor only when it changes
+
+        >>> for reading in pipe(stream(sensor, 1), Deadband()):
+        ...     print(reading.temperature)
+
+    :param iterable items: the items to process, usually readings.
+    :param Stage stages: the stages to pass the items through in the given order.
+
+    :returns: an iterator of the items emitted by the last stage.
+    :rtype: iterator
+    """
+    for item in items:
+        yield from _process(stages, item)
+    yield from _flush(stages)
+
+
+async def apipe(items: AsyncIterable[Any], *stages: Stage) -> AsyncIterator[Any]:
+    """Pass the given items through the given stages.
+
+    See ``pipe()`` for full reference.
+    """
+    async for item in items:
+        for emitted in _process(stages, item):
+            yield emitted
+    for emitted in _flush(stages):
+        yield emitted
+
+
+class Deadband(Stage):
+    """
+    Emits only readings which moved beyond a deadband around the last emitted reading.
+
+    The deadband is the larger of the ``absolute`` deadband and the ``relative`` deadband
+    times the last emitted temperature. With the default deadband of zero a reading is
+    emitted whenever the temperature changes.
+
+    If a ``heartbeat`` is given, a reading is emitted at least once per heartbeat interval
+    even if it didn't move, so consumers can tell a flat sensor from a dead one.
+
+    The readings of multiple sensors are tracked independently.
+    """
+
+    def __init__(
+        self,
+        absolute: float = 0.0,
+        relative: float = 0.0,
+        heartbeat: Optional[float] = None,
+    ) -> None:
+        """Initializes a Deadband.
+
+        :param float absolute: the absolute deadband in the unit of the readings.
+        :param float relative: the deadband relative to the last emitted temperature,
+                               e.g. ``0.01`` for 1%.
+        :param float heartbeat: the interval in seconds to emit a reading at least.
+        """
+        if absolute < 0 or relative < 0:
+            raise ValueError("The deadband must not be negative")
+
+        self.absolute = absolute
+        self.relative = relative
+        self.heartbeat = heartbeat
+        self._emitted: Dict[str, Reading] = {}
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        last = self._emitted.get(item.sensor_id)
+        if last is not None:
+            deadband = max(self.absolute, self.relative * abs(last.temperature))
+            is_heartbeat = (
+                self.heartbeat is not None and item.timestamp - last.timestamp >= self.heartbeat
+            )
+            if abs(item.temperature - last.temperature) <= deadband and not is_heartbeat:
+                return ()
+
+        self._emitted[item.sensor_id] = item
+        return (item,)
+
+
+class Hampel(Stage):
+    """
+    Suppresses glitches by comparing each reading with the median of the previous ones.
+
+    A reading is rejected if it deviates from the median of the last ``window`` readings
+    of its sensor by more than ``threshold`` times their scaled median absolute deviation.
+    Flat sensors have no deviation at all, thus a reading is never rejected if it's within
+    ``min_deviation`` of the median.
+
+    Rejected readings still enter the window, so a real step in the temperature passes
+    the filter once it's seen in more than half of the window.
+
+    Rejected readings are passed to ``on_reject`` together with the median and are
+    either dropped or, with ``replace``, emitted with the median as temperature.
+    """
+
+    #: Holds the factor to scale the median absolute deviation to the standard deviation
+    MAD_SCALE = 1.4826
+
+    def __init__(
+        self,
+        window: int = 5,
+        threshold: float = 3.0,
+        min_deviation: float = 0.5,
+        replace: bool = False,
+        on_reject: Optional[Callable[[Reading, float], object]] = None,
+    ) -> None:
+        """Initializes a Hampel filter.
+
+        :param int window: the number of previous readings to compare with.
+        :param float threshold: the number of scaled deviations a reading may deviate.
+        :param float min_deviation: the deviation in the unit of the readings which is
+                                    always accepted.
+        :param bool replace: emit rejected readings with the median as temperature.
+        :param callable on_reject: called with every rejected reading and the median.
+        """
+        if window < 2:
+            raise ValueError("The given window '{0}' must be at least 2".format(window))
+
+        self.window = window
+        self.threshold = threshold
+        self.min_deviation = min_deviation
+        self.replace = replace
+        self.on_reject = on_reject
+        #: Holds the number of rejected readings
+        self.rejected = 0
+        self._history: Dict[str, Deque[float]] = {}
+
+    def process(self, item: Reading) -> Iterable[Reading]:
+        history = self._history.get(item.sensor_id)
+        if history is None:
+            history = self._history[item.sensor_id] = deque(maxlen=self.window)
+
+        is_glitch = False
+        if len(history) == self.window:
+            median = statistics.median(history)
+            deviation = self.MAD_SCALE * statistics.median(abs(t - median) for t in history)
+            limit = max(self.threshold * deviation, self.min_deviation)
+            is_glitch = abs(item.temperature - median) > limit
+
+        history.append(item.temperature)
+        if not is_glitch:
+            return (item,)
+
+        self.rejected += 1
+        if self.on_reject is not None:
+            self.on_reject(item, median)
+        return (item._replace(temperature=median),) if self.replace else ()
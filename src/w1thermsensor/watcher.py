@@ -0,0 +1,257 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from w1thermsensor.async_core import AsyncW1ThermSensor
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.discovery import DISCOVERY_CACHE, SensorRegistry
+
+#: Holds the type of the callbacks called with an added or removed sensor
+SensorCallback = Callable[[W1ThermSensor], object]
+
+#: Holds the type of the callbacks called with the error of a failed poll or callback
+ErrorCallback = Callable[[Exception], object]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _BaseBusWatcher:
+    def __init__(
+        self,
+        on_added: Optional[SensorCallback],
+        on_removed: Optional[SensorCallback],
+        interval: float,
+        sensor_class: Type[W1ThermSensor],
+        on_error: Optional[ErrorCallback],
+    ) -> None:
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.interval = interval
+        self.sensor_class = sensor_class
+        self.on_error = on_error
+        #: Holds the number of failed polls and callbacks
+        self.errors = 0
+        self._registry: Optional[SensorRegistry] = None
+        self._sensors: Dict[str, W1ThermSensor] = {}
+
+    @property
+    def sensors(self) -> List[W1ThermSensor]:
+        """Returns the sensors currently connected to the buses"""
+        return list(self._sensors.values())
+
+    def _detect_changes(self) -> Tuple[List[W1ThermSensor], List[W1ThermSensor]]:
+        registry = DISCOVERY_CACHE.get_registry(self.sensor_class.BASE_DIRECTORY)
+        if registry is self._registry:
+            # the discovery cache validated that no bus membership changed
+            return [], []
+
+        self._registry = registry
+        removed = [s for i, s in self._sensors.items() if i not in registry]
+        for sensor in removed:
+            del self._sensors[sensor.id]
+
+        added = []
+        for discovered in registry:
+            if discovered.id not in self._sensors:
+                sensor = self.sensor_class.from_known(discovered.type, discovered.id)
+                self._sensors[sensor.id] = sensor
+                added.append(sensor)
+
+        return added, removed
+
+    def _count_error(self, exc: Exception) -> bool:
+        """Count the given error and log it if there is no error callback
+
+        :returns: if the error callback must be called.
+        """
+        self.errors += 1
+        if self.on_error is None:
+            _LOGGER.error("Failed to watch the buses", exc_info=exc)
+            return False
+        return True
+
+
+class BusWatcher(_BaseBusWatcher):
+    """
+    Watches the w1 buses for sensors joining and leaving them.
+
+    The watcher polls the ``w1_master_slaves`` file of every bus master,
+    which is cheap compared to listing the devices directory.
+    The kernel does not notify about changes of these sysfs attributes,
+    thus inotify cannot be used to watch them.
+
+    The ``on_added`` and ``on_removed`` callbacks are called from the
+    watcher thread with the sensor instances which joined or left a bus.
+    All sensors connected when the watcher starts are reported as added.
+
+    A failed poll, e.g. because the bus master vanished, doesn't stop the watcher.
+    Neither does a raising callback, the other sensors are still reported.
+    Every failure is counted and passed to the ``on_error`` callback or logged
+    if there is none, and the buses are polled again after the interval.
+
+    Examples:
+        Print sensors joining and leaving the buses
+
+        >>> watcher = BusWatcher(on_added=print, on_removed=print)
+        >>> watcher.start()
+        >>> watcher.stop()
+    """
+
+    def __init__(
+        self,
+        on_added: Optional[SensorCallback] = None,
+        on_removed: Optional[SensorCallback] = None,
+        interval: float = 1.0,
+        sensor_class: Type[W1ThermSensor] = W1ThermSensor,
+        on_error: Optional[ErrorCallback] = None,
+    ) -> None:
+        """Initializes a BusWatcher.
+
+        :param callable on_added: called with every sensor joining a bus.
+        :param callable on_removed: called with every sensor leaving a bus.
+        :param float interval: the interval to poll the buses in seconds.
+        :param sensor_class: the class to instantiate the sensors with.
+        :param callable on_error: called from the watcher thread with the error of every
+                                  failed poll or callback. If not given the error is logged.
+        """
+        super().__init__(on_added, on_removed, interval, sensor_class, on_error)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> Tuple[List[W1ThermSensor], List[W1ThermSensor]]:
+        """Check the buses once for added or removed sensors and call the callbacks
+
+        :returns: the added and the removed sensors.
+        :rtype: tuple
+        """
+        added, removed = self._detect_changes()
+        for sensor in removed:
+            self._notify(self.on_removed, sensor)
+        for sensor in added:
+            self._notify(self.on_added, sensor)
+        return added, removed
+
+    def _notify(self, callback: Optional[SensorCallback], sensor: W1ThermSensor) -> None:
+        if callback is None:
+            return
+
+        try:
+            callback(sensor)
+        except Exception as exc:  # pylint: disable=broad-except
+            self._report(exc)
+
+    def _report(self, exc: Exception) -> None:
+        if self._count_error(exc) and self.on_error is not None:
+            self.on_error(exc)
+
+    def start(self) -> None:
+        """Start watching the buses in a background thread"""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="w1-bus-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching the buses and wait for the background thread to finish"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as exc:  # pylint: disable=broad-except
+                self._report(exc)
+            self._stop_event.wait(self.interval)
+
+
+class AsyncBusWatcher(_BaseBusWatcher):
+    """
+    Watches the w1 buses for sensors joining and leaving them using ``asyncio``.
+
+    The callbacks may be coroutine functions, which are awaited.
+    The sensors are instances of ``AsyncW1ThermSensor`` by default.
+
+    See ``BusWatcher`` for full reference.
+    """
+
+    def __init__(
+        self,
+        on_added: Optional[SensorCallback] = None,
+        on_removed: Optional[SensorCallback] = None,
+        interval: float = 1.0,
+        sensor_class: Type[W1ThermSensor] = AsyncW1ThermSensor,
+        on_error: Optional[ErrorCallback] = None,
+    ) -> None:
+        super().__init__(on_added, on_removed, interval, sensor_class, on_error)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def poll(self) -> Tuple[List[W1ThermSensor], List[W1ThermSensor]]:
+        """Check the buses once for added or removed sensors and call the callbacks
+
+        :returns: the added and the removed sensors.
+        :rtype: tuple
+        """
+        loop = asyncio.get_event_loop()
+        added, removed = await loop.run_in_executor(None, self._detect_changes)
+        for sensor in removed:
+            await self._notify(self.on_removed, sensor)
+        for sensor in added:
+            await self._notify(self.on_added, sensor)
+        return added, removed
+
+    async def _notify(self, callback: Optional[SensorCallback], sensor: W1ThermSensor) -> None:
+        try:
+            await _call(callback, sensor)
+        except Exception as exc:  # pylint: disable=broad-except
+            await self._report(exc)
+
+    async def _report(self, exc: Exception) -> None:
+        if self._count_error(exc):
+            await _call(self.on_error, exc)
+
+    async def run(self) -> None:
+        """Watch the buses until cancelled"""
+        while True:
+            try:
+                await self.poll()
+            except Exception as exc:  # pylint: disable=broad-except
+                await self._report(exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> "asyncio.Task[None]":
+        """Start watching the buses in a task of the running event loop"""
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Stop watching the buses"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def _call(callback: Optional[Callable[[Any], object]], argument: Any) -> None:
+    if callback is None:
+        return
+
+    result = callback(argument)
+    if inspect.isawaitable(result):
+        await result
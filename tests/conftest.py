@@ -8,12 +8,15 @@ A Python package and CLI tool to work with w1 temperature sensors.
 :license: MIT, see LICENSE for more details.
 """
 
+import os
 import random
+import tempfile
 from pathlib import Path
 
 import pytest
 
 from w1thermsensor import Sensor, W1ThermSensor
+from w1thermsensor.discovery import DISCOVERY_CACHE
 
 #: Holds sample contents for a ready and not ready sensor
 W1_FILE = """{lsb:x} {msb:x} 4b 46 {config:x} ff 02 10 56 : crc=56 {ready}
@@ -43,9 +46,11 @@ def kernel_module_dir(tmpdir):
     # create temporary base dir
     devices_path = tmpdir.mkdir("devices")
     W1ThermSensor.BASE_DIRECTORY = Path(str(devices_path))
+    DISCOVERY_CACHE.invalidate()
     yield devices_path
     # restore original base dir
     W1ThermSensor.BASE_DIRECTORY = original_base_dir
+    DISCOVERY_CACHE.invalidate()
 
 
 @pytest.fixture(scope="function")
@@ -85,6 +90,12 @@ def sensors(request, kernel_module_dir):  # pylint: disable=redefined-outer-name
             )
             sensor_file.write(sensor_file_content)
 
+            sensor_ext_power = sensor_conf.get("ext_power")
+            if sensor_ext_power is not None:
+                sensor_dir.join(W1ThermSensor.EXT_POWER_FILE).write(
+                    "{0}\n".format(sensor_ext_power)
+                )
+
             sensors_.append(
                 {
                     "type": sensor_type,
@@ -94,3 +105,29 @@ def sensors(request, kernel_module_dir):  # pylint: disable=redefined-outer-name
             )
 
     return sensors_
+
+
+@pytest.fixture(scope="function")
+def bus_master_dir(kernel_module_dir, sensors):  # pylint: disable=redefined-outer-name
+    """
+    Fixture to mock a w1 bus master
+    with all sensors from the ``sensors`` fixture connected
+    """
+    bus_master_dir = kernel_module_dir.mkdir("w1_bus_master1")
+    slaves = "".join(
+        "{0}-{1}\n".format(hex(s["type"])[2:], s["id"]) for s in sensors
+    )
+    bus_master_dir.join("w1_master_slaves").write(slaves or "not found.\n")
+    return bus_master_dir
+
+
+@pytest.fixture(scope="function")
+def socket_path(monkeypatch):
+    """
+    Fixture to configure the socket of the w1thermsensor daemon
+    in a short temporary directory, since socket paths are limited to 108 bytes
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "w1thermsensor.sock")
+        monkeypatch.setenv("W1THERMSENSOR_SOCKET", path)
+        yield path
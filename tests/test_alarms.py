@@ -0,0 +1,133 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import pytest
+
+from w1thermsensor.alarms import AlarmMonitor, set_alarms
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import NoSensorFoundError
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.units import Unit
+
+
+def get_sensor_dir(kernel_module_dir, sensor):
+    """Return the sysfs directory of the given sensor"""
+    return kernel_module_dir.join("{0}-{1}".format(hex(sensor["type"])[2:], sensor["id"]))
+
+
+def write_temperature(kernel_module_dir, sensor, temperature):
+    """Write a new temperature into the w1_slave file of the given sensor"""
+    counts = int(temperature * 16.0)
+    line = "{0:x} {1:x} 4b 46 7f ff 02 10 56".format(counts & 0xFF, (counts >> 8) & 0xFF)
+    get_sensor_dir(kernel_module_dir, sensor).join("w1_slave").write(
+        "{0} : crc=56 YES\n{0} t={1}\n".format(line, int(temperature * 1000))
+    )
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_set_alarms_of_multiple_sensors(sensors, kernel_module_dir):
+    # when
+    set_alarms(W1ThermSensor.get_available_sensors(), 2, 8)
+
+    # then
+    for sensor in sensors:
+        assert get_sensor_dir(kernel_module_dir, sensor).join("alarms").read() == "2 8\n"
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"type": Sensor.DS18B20, "temperature": 5},
+            {"type": Sensor.DS18B20, "temperature": 5},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_alarm_monitor_reports_alarm_transitions(sensors, kernel_module_dir):
+    # given
+    for sensor in sensors:
+        get_sensor_dir(kernel_module_dir, sensor).join("alarms").write("2 8\n")
+    alarmed, cleared = [], []
+    monitor = AlarmMonitor(
+        on_alarm=alarmed.append, on_clear=cleared.append, unit=Unit.DEGREES_F
+    )
+
+    # when all sensors are within their thresholds
+    assert monitor.check() == []
+
+    # when a sensor exceeds its high threshold
+    write_temperature(kernel_module_dir, sensors[0], 8.5)
+    alarms = monitor.check()
+
+    # then
+    assert [(a.sensor.id, a.low, a.high) for a in alarms] == [(sensors[0]["id"], 2, 8)]
+    assert alarms[0].temperature == pytest.approx(47.3)
+    assert alarmed == alarms
+
+    # when the sensor stays in alarm state
+    monitor.check()
+
+    # then it is only reported once
+    assert len(alarmed) == 1
+
+    # when the sensor returns within its thresholds
+    write_temperature(kernel_module_dir, sensors[0], 7.9375)
+    assert monitor.check() == []
+
+    # then
+    assert [s.id for s in cleared] == [sensors[0]["id"]]
+
+
+@pytest.mark.parametrize(
+    "sensors, temperature, offset, expected_alarm",
+    [
+        (({"type": Sensor.DS18B20, "temperature": 5},), 2.0, 0.0, True),
+        (({"type": Sensor.DS18B20, "temperature": 5},), 2.0625, 0.0, True),
+        (({"type": Sensor.DS18B20, "temperature": 5},), 3.0, 0.0, False),
+        (({"type": Sensor.DS18B20, "temperature": 5},), 7.9375, 0.0, False),
+        (({"type": Sensor.DS18B20, "temperature": 5},), 8.0, 0.0, True),
+        # the sensor compares the raw temperature without the offset
+        (({"type": Sensor.DS18B20, "temperature": 5},), 8.0, -1.0, True),
+        (({"type": Sensor.DS18B20, "temperature": 5},), 7.0, 1.0, False),
+    ],
+    indirect=["sensors"],
+)
+def test_alarm_monitor_evaluates_thresholds_like_the_sensor(
+    sensors, kernel_module_dir, temperature, offset, expected_alarm
+):
+    # given
+    get_sensor_dir(kernel_module_dir, sensors[0]).join("alarms").write("2 8\n")
+    write_temperature(kernel_module_dir, sensors[0], temperature)
+    sensor = W1ThermSensor(offset=offset)
+
+    # when
+    alarms = AlarmMonitor([sensor]).check()
+
+    # then
+    assert bool(alarms) == expected_alarm
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_alarm_monitor_reports_errors(sensors, kernel_module_dir):
+    # given
+    get_sensor_dir(kernel_module_dir, sensors[0]).join("alarms").write("2 8\n")
+    errors = []
+    monitor = AlarmMonitor(on_error=lambda s, e: errors.append(e))
+    get_sensor_dir(kernel_module_dir, sensors[0]).join("w1_slave").remove()
+
+    # when
+    alarms = monitor.check()
+
+    # then
+    assert alarms == []
+    assert isinstance(errors[0], NoSensorFoundError)
@@ -0,0 +1,160 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import pytest
+
+from w1thermsensor.binlog import (
+    BinlogReader,
+    BinlogSensor,
+    BinlogWriter,
+    get_binlog_sensors,
+)
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import BinlogError
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.streams import pipe
+from w1thermsensor.units import Unit
+
+SENSORS = [BinlogSensor("00000588806a"), BinlogSensor("00000588806b", Sensor.DS1822, 9, 0.5)]
+
+READINGS = [
+    Reading("00000588806a", 1600000000.0, 20.0625),
+    Reading("00000588806b", 1600000000.0, 25.5),
+    Reading("00000588806a", 1600000001.25, -10.125),
+    Reading("00000588806b", 1600000002.5, 26.0),
+]
+
+
+@pytest.fixture
+def binlog_path(tmpdir):
+    return tmpdir.join("readings.w1log")
+
+
+def write_binlog(path, readings, sensors=SENSORS, append=False):
+    with BinlogWriter(str(path), sensors, append=append) as log:
+        for reading in readings:
+            log.write(reading)
+
+
+def test_binlog_roundtrip(binlog_path):
+    # when
+    write_binlog(binlog_path, READINGS)
+
+    # then
+    assert binlog_path.size() == 15 + 2 * (1 + 12 + 10) + 4 * 8
+    with BinlogReader(str(binlog_path)) as log:
+        assert log.sensors == SENSORS
+        assert log.start == 1600000000000
+        assert len(log) == 4
+        assert list(log) == READINGS
+        assert log[2] == READINGS[2]
+        assert log[-1] == READINGS[3]
+        with pytest.raises(IndexError):
+            log[4]
+
+
+def test_binlog_writer_as_stage(binlog_path):
+    # given
+    log = BinlogWriter(str(binlog_path), SENSORS)
+
+    # when
+    passed = list(pipe(READINGS, log))
+    log.close()
+
+    # then
+    assert passed == READINGS
+    with BinlogReader(str(binlog_path)) as reader:
+        assert list(reader) == READINGS
+
+
+def test_binlog_stores_celsius(binlog_path):
+    # when
+    write_binlog(binlog_path, [Reading("00000588806a", 0, 68.0, Unit.DEGREES_F)])
+
+    # then
+    with BinlogReader(str(binlog_path)) as log:
+        assert log[0].temperature == 20.0
+        assert log[0].unit == Unit.DEGREES_C
+
+
+def test_binlog_to_arrays(binlog_path):
+    # given
+    pytest.importorskip("numpy")
+    write_binlog(binlog_path, READINGS)
+
+    # when
+    with BinlogReader(str(binlog_path)) as log:
+        timestamps, indexes, temperatures = log.to_arrays()
+
+    # then
+    assert timestamps.tolist() == [1600000000000, 1600000000000, 1600000001250, 1600000002500]
+    assert indexes.tolist() == [0, 1, 0, 1]
+    assert temperatures.tolist() == [r.temperature for r in READINGS]
+
+
+def test_binlog_append(binlog_path):
+    # given
+    write_binlog(binlog_path, READINGS[:2])
+    # a record partially written on power loss
+    with open(str(binlog_path), "ab") as log_file:
+        log_file.write(b"\x00\x00\x10")
+
+    # when
+    write_binlog(binlog_path, READINGS[2:], append=True)
+
+    # then
+    with BinlogReader(str(binlog_path)) as log:
+        assert list(log) == READINGS
+
+
+def test_binlog_append_of_other_sensors(binlog_path):
+    write_binlog(binlog_path, READINGS)
+    with pytest.raises(BinlogError, match="of other sensors"):
+        BinlogWriter(str(binlog_path), SENSORS[:1], append=True)
+
+
+@pytest.mark.parametrize(
+    "readings, expected_error",
+    [
+        ([Reading("1", 0, 20.0)], "The sensor 1 is not logged"),
+        ([Reading("00000588806a", 0, 5000.0)], "out of the range"),
+        ([Reading("00000588806a", 1, 20.0), Reading("00000588806a", 0, 20.0)], "older"),
+        ([Reading("00000588806a", 0, 20.0), Reading("00000588806a", 1e8, 20.0)], "apart"),
+    ],
+)
+def test_binlog_writer_rejects_readings(binlog_path, readings, expected_error):
+    with pytest.raises(BinlogError, match=expected_error):
+        write_binlog(binlog_path, readings)
+
+
+@pytest.mark.parametrize(
+    "content, expected_error",
+    [
+        (b"", "empty"),
+        (b"W1T", "truncated"),
+        (b"XXXX\x01" + bytes(10), "not a w1thermsensor binary log"),
+        (b"W1TL\x02" + bytes(10), "version 2 is not supported"),
+        (b"W1TL\x01" + bytes(8) + b"\x01\x00\x05abc", "header of the binary log is invalid"),
+    ],
+)
+def test_invalid_binlog(binlog_path, content, expected_error):
+    binlog_path.write_binary(content)
+    with pytest.raises(BinlogError, match=expected_error):
+        BinlogReader(str(binlog_path))
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"id": "1", "msb": 0x01, "lsb": 0x40, "temperature": 20.0},)],
+    indirect=["sensors"]
+)
+def test_get_binlog_sensors(sensors):
+    sensor = W1ThermSensor(sensor_id="1", offset=1.5)
+    assert get_binlog_sensors([sensor]) == [BinlogSensor("1", Sensor.DS18B20, 12, 1.5)]
@@ -0,0 +1,331 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import pytest
+
+from w1thermsensor.bus import BusMaster, ConversionStrategy, sweep, sweep_readings
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import NoSensorFoundError, W1ThermSensorError
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.units import Unit
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_get_available_bus_masters(sensors, kernel_module_dir, bus_master_dir):
+    # given
+    kernel_module_dir.mkdir("w1_bus_master2").join("w1_master_slaves").write("not found.\n")
+
+    # when
+    bus_masters = BusMaster.get_available_bus_masters()
+
+    # then
+    assert [b.name for b in bus_masters] == ["w1_bus_master1", "w1_bus_master2"]
+    assert len(bus_masters[0].get_slaves()) == 2
+    assert bus_masters[1].get_slaves() == []
+
+
+def test_bus_master_not_existent(kernel_module_dir):
+    with pytest.raises(W1ThermSensorError, match="Could not find bus master w1_bus_master1"):
+        BusMaster("w1_bus_master1")
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS18S20})], indirect=["sensors"]
+)
+def test_get_bus_master_sensors(sensors, bus_master_dir):
+    # given
+    bus_master_dir.join("w1_master_slaves").write(
+        bus_master_dir.join("w1_master_slaves").read() + "2d-00000588806a\n"
+    )
+    bus_master_dir.join("w1_master_slave_count").write("3\n")
+    bus_master = BusMaster("w1_bus_master1")
+
+    # when
+    bus_sensors = bus_master.get_sensors()
+
+    # then
+    assert bus_master.get_slave_count() == 3
+    assert [(s.type, s.id) for s in bus_sensors] == [
+        (s["type"], s["id"]) for s in sensors
+    ]
+
+
+@pytest.mark.parametrize(
+    "timeout, timeout_us, expected_interval",
+    [("10\n", None, 10.0), ("10\n", "500000\n", 10.5)],
+)
+def test_get_search_interval(bus_master_dir, timeout, timeout_us, expected_interval):
+    # given
+    bus_master_dir.join("w1_master_timeout").write(timeout)
+    if timeout_us is not None:
+        bus_master_dir.join("w1_master_timeout_us").write(timeout_us)
+
+    # when
+    interval = BusMaster("w1_bus_master1").get_search_interval()
+
+    # then
+    assert interval == pytest.approx(expected_interval)
+
+
+@pytest.mark.parametrize(
+    "method, args, expected_search_count",
+    [
+        ("set_search_count", (5,), "5"),
+        ("disable_search", (), "0"),
+        ("enable_search", (), "-1"),
+        ("search", (), "1"),
+        ("search", (3,), "3"),
+    ],
+)
+def test_change_search_count(bus_master_dir, method, args, expected_search_count):
+    # given
+    bus_master_dir.join("w1_master_search").write("-1\n")
+    bus_master = BusMaster("w1_bus_master1")
+
+    # when
+    getattr(bus_master, method)(*args)
+
+    # then
+    assert bus_master_dir.join("w1_master_search").read().strip() == expected_search_count
+    assert bus_master.get_search_count() == int(expected_search_count)
+
+
+@pytest.mark.parametrize(
+    "method, args", [("set_search_count", (-2,)), ("search", (0,))]
+)
+def test_invalid_search_count(bus_master_dir, method, args):
+    with pytest.raises(ValueError):
+        getattr(BusMaster("w1_bus_master1"), method)(*args)
+
+
+def test_change_search_count_failure(bus_master_dir):
+    # given
+    bus_master_dir.mkdir("w1_master_search")  # a directory cannot be written to
+
+    # when & then
+    with pytest.raises(W1ThermSensorError, match="You might have to be root"):
+        BusMaster("w1_bus_master1").disable_search()
+
+
+def test_read_missing_attribute_failure(bus_master_dir):
+    with pytest.raises(W1ThermSensorError, match="Failed to read w1_master_search"):
+        BusMaster("w1_bus_master1").get_search_count()
+
+
+@pytest.mark.parametrize(
+    "sensors, bulk_supported, expected_strategy",
+    [
+        (({"ext_power": 1}, {"ext_power": 1}), True, ConversionStrategy.BULK),
+        (({"ext_power": 1}, {"ext_power": 1}), False, ConversionStrategy.SERIAL),
+        (({"ext_power": 1}, {"ext_power": 0}), True, ConversionStrategy.SERIAL),
+        (({"ext_power": 0}, {"ext_power": 0}), True, ConversionStrategy.SERIAL),
+        (({"ext_power": 1}, {}), True, ConversionStrategy.SERIAL),  # unknown power mode
+    ],
+    indirect=["sensors"],
+)
+def test_select_conversion_strategy(sensors, bus_master_dir, bulk_supported, expected_strategy):
+    # given
+    if bulk_supported:
+        bus_master_dir.join("therm_bulk_read").write("0\n")
+
+    # when
+    strategy = BusMaster("w1_bus_master1").select_conversion_strategy()
+
+    # then
+    assert strategy == expected_strategy
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 1, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_with_bulk_conversion(sensors, bus_master_dir):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+
+    # when
+    readings = list(BusMaster("w1_bus_master1").sweep())
+
+    # then
+    assert bus_master_dir.join("therm_bulk_read").read() == "trigger\n"
+    assert {s.id: t for s, t in readings} == {s["id"]: s["temperature"] for s in sensors}
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 1, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_readings_of_bulk_conversion_share_timestamp(sensors, bus_master_dir):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+
+    # when
+    readings = list(BusMaster("w1_bus_master1").sweep_readings(unit=Unit.KELVIN))
+
+    # then
+    assert len({r.timestamp for r in readings}) == 1
+    assert {r.sensor_id: r.temperature for r in readings} == {
+        s["id"]: pytest.approx(s["temperature"] + 273.15) for s in sensors
+    }
+    assert {r.unit for r in readings} == {Unit.KELVIN}
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 0, "temperature": 20}, {"ext_power": 0, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_readings_serial(sensors, bus_master_dir):
+    # when
+    readings = list(sweep_readings())
+
+    # then
+    assert {r.sensor_id: r.temperature for r in readings} == {
+        s["id"]: s["temperature"] for s in sensors
+    }
+    assert readings[0].timestamp <= readings[1].timestamp
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 0, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_serial_enables_pullup_for_parasitic_sensors(sensors, bus_master_dir):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+    bus_master_dir.join("w1_master_pullup").write("0\n")
+    bus_master = BusMaster("w1_bus_master1")
+    pullup_during_sweep = []
+
+    # when
+    for sensor, temperature in bus_master.sweep():
+        pullup_during_sweep.append(bus_master.get_pullup())
+
+    # then
+    assert pullup_during_sweep == [True, True]
+    assert not bus_master.get_pullup()
+    assert bus_master_dir.join("therm_bulk_read").read() == "0\n"
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 0, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_subset_of_mixed_bus_is_serial(sensors, bus_master_dir):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+    bus_master = BusMaster("w1_bus_master1")
+    external_sensor = W1ThermSensor.from_known(Sensor.DS18B20, sensors[0]["id"])
+
+    # when
+    readings = list(bus_master.sweep([external_sensor]))
+
+    # then
+    assert [(s.id, t) for s, t in readings] == [(sensors[0]["id"], 20)]
+    assert bus_master_dir.join("therm_bulk_read").read() == "0\n"
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        ({"ext_power": 1, "temperature": 20}, {"ext_power": 1, "temperature": 25}),  # bulk
+        ({"ext_power": 0, "temperature": 20}, {"ext_power": 0, "temperature": 25}),  # pull-up
+    ],
+    indirect=["sensors"],
+)
+def test_sweep_falls_back_to_serial_if_bus_master_is_read_only(sensors, bus_master_dir, mocker):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+    bus_master_dir.join("w1_master_pullup").write("0\n")
+    bus_master = BusMaster("w1_bus_master1")
+    write_attribute = mocker.patch.object(
+        bus_master, "_write_attribute", side_effect=W1ThermSensorError("permission denied")
+    )
+
+    # when
+    first_readings = list(bus_master.sweep())
+    second_readings = list(bus_master.sweep())
+
+    # then
+    expected_readings = {s["id"]: s["temperature"] for s in sensors}
+    assert {s.id: t for s, t in first_readings} == expected_readings
+    assert {s.id: t for s, t in second_readings} == expected_readings
+    assert write_attribute.call_count == 1  # not retried with the second sweep
+    assert bus_master.select_conversion_strategy() is ConversionStrategy.SERIAL
+    assert not bus_master.get_pullup()
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 1, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_reports_errors(sensors, kernel_module_dir, bus_master_dir):
+    # given
+    failing_sensor = "{0}-{1}".format(hex(sensors[0]["type"])[2:], sensors[0]["id"])
+    kernel_module_dir.join(failing_sensor).join("w1_slave").remove()
+    errors = []
+
+    # when
+    readings = list(
+        BusMaster("w1_bus_master1").sweep(on_error=lambda s, e: errors.append((s.id, e)))
+    )
+
+    # then
+    assert [(s.id, t) for s, t in readings] == [(sensors[1]["id"], 25)]
+    assert errors[0][0] == sensors[0]["id"]
+    assert isinstance(errors[0][1], NoSensorFoundError)
+
+    # when no error callback is given
+    with pytest.raises(NoSensorFoundError):
+        list(BusMaster("w1_bus_master1").sweep())
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"ext_power": 1, "temperature": 20}, {"ext_power": 1, "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_sweep_all_sensors(sensors, kernel_module_dir, bus_master_dir):
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+    kernel_module_dir.mkdir("28-00000588806a").join("w1_slave").write(
+        kernel_module_dir.join(
+            "{0}-{1}".format(hex(sensors[0]["type"])[2:], sensors[0]["id"])
+        ).join("w1_slave").read()
+    )
+
+    # when
+    readings = list(sweep())
+
+    # then
+    assert bus_master_dir.join("therm_bulk_read").read() == "trigger\n"
+    assert {s.id: t for s, t in readings} == {
+        sensors[0]["id"]: 20,
+        sensors[1]["id"]: 25,
+        "00000588806a": 20,  # not connected to a bus master
+    }
+
+
+def test_sweep_without_sensors(kernel_module_dir):
+    # given
+    errors = []
+    disconnected_sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+
+    # when & then
+    assert list(sweep([])) == []
+    assert list(sweep([disconnected_sensor], on_error=lambda s, e: errors.append(s))) == []
+    assert errors == [disconnected_sensor]
@@ -10,7 +10,14 @@ A Python package and CLI tool to work with w1 temperature sensors.
 
 import pytest
 
-from w1thermsensor.calibration_data import CalibrationData
+from w1thermsensor.calibration_data import (
+    CalibrationData,
+    PiecewiseCalibrationData,
+    calibration_data_from_dict,
+    fit_calibration_data,
+    load_calibration_data,
+    save_calibration_data
+)
 from w1thermsensor.errors import InvalidCalibrationDataError
 
 
@@ -68,3 +75,174 @@ def test_temperature_correction(
         expected = correction_function(raw_temp)
         actual = calibration_data.correct_temperature_for_calibration_data(raw_temp)
         assert actual == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "points",
+    [
+        ((0.0, 0.0),),  # a single point is not enough
+        ((10.0, 10.0), (0.0, 0.0)),  # measured points not increasing
+        ((0.0, 10.0), (10.0, 0.0)),  # reference points not increasing
+    ],
+)
+def test_piecewise_init_raises_error_on_invalid_input(points):
+    with pytest.raises(InvalidCalibrationDataError):
+        PiecewiseCalibrationData(points)
+
+
+@pytest.mark.parametrize(
+    "raw_temperature, expected_temperature",
+    [
+        (0.0, 1.0),
+        (5.0, 6.0),  # within the first segment
+        (10.0, 11.0),
+        (15.0, 13.0),  # within the second segment
+        (20.0, 15.0),
+        (-10.0, -9.0),  # extrapolated with the first segment
+        (30.0, 19.0),  # extrapolated with the last segment
+    ],
+)
+def test_piecewise_temperature_correction(raw_temperature, expected_temperature):
+    calibration_data = PiecewiseCalibrationData(((0.0, 1.0), (10.0, 11.0), (20.0, 15.0)))
+
+    actual = calibration_data.correct_temperature_for_calibration_data(raw_temperature)
+
+    assert actual == pytest.approx(expected_temperature)
+
+
+def test_fit_two_point_calibration_data():
+    # given
+    reference = [float(t) for t in range(-10, 50)]
+    readings = {
+        "offset": [t + 1.5 for t in reference],
+        "scaled": [t * 0.9 - 0.5 for t in reference],
+        "gaps": [None if i % 3 else t - 2.0 for i, t in enumerate(reference)],
+    }
+
+    # when
+    calibrations = fit_calibration_data(readings, reference)
+
+    # then
+    for sensor_id, values in readings.items():
+        calibration = calibrations[sensor_id]
+        assert isinstance(calibration, CalibrationData)
+        for measured, expected in zip(values, reference):
+            if measured is not None:
+                actual = calibration.correct_temperature_for_calibration_data(measured)
+                assert actual == pytest.approx(expected)
+
+
+def test_fit_piecewise_calibration_data():
+    # given
+    reference = [0.0, 1.0, 10.0, 11.0, 20.0, 21.0]
+    readings = {"sensor": [1.0, 2.0, 11.0, 12.0, 25.0, 26.0]}
+
+    # when
+    calibrations = fit_calibration_data(readings, reference, breakpoints=[5.0, 15.0])
+
+    # then
+    assert calibrations["sensor"] == PiecewiseCalibrationData(
+        ((1.5, 0.5), (11.5, 10.5), (25.5, 20.5))
+    )
+
+
+@pytest.mark.parametrize(
+    "readings",
+    [
+        [20.0, 20.0, 20.0],  # no variation in the readings
+        [30.0, 20.0, 10.0],  # reverse correlated
+        [None, None, 10.0],  # not enough readings
+    ],
+)
+def test_fit_calibration_data_raises_error_on_degenerated_readings(readings):
+    with pytest.raises(InvalidCalibrationDataError):
+        fit_calibration_data({"sensor": readings}, [10.0, 20.0, 30.0])
+
+
+def test_save_and_load_calibration_data(tmp_path):
+    # given
+    calibrations = {
+        "two-point": CalibrationData(
+            measured_high_point=99.0,
+            measured_low_point=1.0,
+            reference_high_point=100.0,
+        ),
+        "piecewise": PiecewiseCalibrationData(((0.0, 1.0), (10.0, 11.0))),
+    }
+    path = tmp_path / "calibrations.json"
+
+    # when
+    save_calibration_data(path, calibrations)
+    loaded = load_calibration_data(path)
+
+    # then
+    assert loaded == calibrations
+
+
+def test_load_unknown_calibration_kind_raises_error():
+    with pytest.raises(InvalidCalibrationDataError):
+        calibration_data_from_dict({"kind": "unknown"})
+
+
+@pytest.mark.parametrize(
+    "data, expected_error",
+    [
+        (
+            {
+                "kind": "two-point",
+                "measured_high_point": 99.0,
+                "measured_low_point": 1.0,
+                "reference_high_point": 100.0,
+            },
+            "Key 'reference_low_point' must be provided",
+        ),
+        ({"kind": "piecewise"}, "Key 'points' must be provided"),
+        ({"kind": "piecewise", "points": 42}, "must be numbers"),
+        ({"kind": "piecewise", "points": [[1.0, 2.0], ["a", 3.0]]}, "must be numbers"),
+        (["not", "a", "mapping"], "must be numbers"),
+    ],
+)
+def test_load_invalid_calibration_data_raises_error(data, expected_error):
+    with pytest.raises(InvalidCalibrationDataError, match=expected_error):
+        calibration_data_from_dict(data)
+
+
+def test_load_calibration_data_not_keyed_by_sensor_id_raises_error(tmp_path):
+    # given
+    path = tmp_path / "calibrations.json"
+    path.write_text("[]")
+
+    # when & then
+    with pytest.raises(InvalidCalibrationDataError, match="keyed by sensor id"):
+        load_calibration_data(path)
+
+
+def test_fit_calibration_data_reports_sensors_which_cannot_be_fitted():
+    # given
+    reference = [10.0, 20.0, 30.0]
+    readings = {"good": [11.0, 21.0, 31.0], "constant": [20.0, 20.0, 20.0]}
+    errors = []
+
+    # when
+    calibrations = fit_calibration_data(
+        readings, reference, on_error=lambda sensor_id, exc: errors.append(sensor_id)
+    )
+
+    # then
+    assert list(calibrations) == ["good"]
+    assert errors == ["constant"]
+
+
+def test_fit_piecewise_calibration_data_reports_sensors_in_a_single_bin():
+    # given
+    reference = [10.0, 20.0, 30.0]
+    readings = {"good": [1.0, 11.0, 21.0], "single-bin": [1.0, 2.0, 3.0]}
+
+    # when & then
+    with pytest.raises(InvalidCalibrationDataError, match="sensors single-bin cannot"):
+        fit_calibration_data(readings, reference, breakpoints=[5.0, 15.0])
+
+
+def test_fit_calibration_data_raises_error_on_missing_readings():
+    with pytest.raises(InvalidCalibrationDataError, match="sensors short are fewer"):
+        fit_calibration_data({"short": [10.0, 20.0], "long": [10.0, 20.0, 30.0]}, [10.0] * 3)
@@ -10,14 +10,42 @@ A Python package and CLI tool to work with w1 temperature sensors.
 
 import itertools
 import json
+import socket
 
 import pytest
 from click.testing import CliRunner
 
+from w1thermsensor.bus import BusMaster
 from w1thermsensor.cli import cli
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.daemon import Daemon
+from w1thermsensor.errors import NoSensorFoundError, W1ThermSensorError
 from w1thermsensor.sensors import Sensor
 
 
+@pytest.fixture(autouse=True)
+def daemon_socket(socket_path):
+    """Isolate the tests from a w1thermsensor daemon running on this machine"""
+    return socket_path
+
+
+@pytest.fixture
+def daemon(sensors, kernel_module_dir):
+    """
+    Fixture to run the w1thermsensor daemon,
+    which sampled the sensors before their w1_slave files were removed
+    """
+    daemon = Daemon(interval=3600)
+    daemon.start()
+    daemon.sampler.sample()
+    for sensor in sensors:
+        kernel_module_dir.join(
+            "{0}-{1}".format(hex(sensor["type"])[2:], sensor["id"]), W1ThermSensor.SLAVE_FILE
+        ).remove()
+    yield daemon
+    daemon.stop()
+
+
 @pytest.mark.parametrize(
     "sensors",
     [
@@ -572,3 +600,314 @@ def test_set_resolution_of_sensor_with_invalid_id(sensors):
         "No sensor with id 1 available. Use the ls command to show all available sensors."
         in result.output
     )  # noqa
+
+
+DAEMON_SENSORS = (
+    {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+    {"id": "2", "type": Sensor.DS1822, "temperature": 25.5},
+)
+
+
+@pytest.mark.parametrize("sensors", [DAEMON_SENSORS], indirect=["sensors"])
+def test_list_sensors_of_daemon(sensors, daemon, kernel_module_dir):
+    """Test listing the sensors sampled by the daemon"""
+    # given
+    kernel_module_dir.join("22-2").remove()
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["ls", "--json"])
+    # then the daemon lists the sensors in the order of the devices directory
+    assert result.exit_code == 0
+    listed = json.loads(result.output)
+    assert [s["id"] for s in listed] == [1, 2]
+    assert sorted((s["hwid"], s["type"]) for s in listed) == [("1", "DS18B20"), ("2", "DS1822")]
+
+
+@pytest.mark.parametrize("sensors", [DAEMON_SENSORS], indirect=["sensors"])
+def test_get_temperature_all_sensors_of_daemon(sensors, daemon):
+    """Test getting the temperatures of all sensors sampled by the daemon"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--json", "--type", "DS1822", "-u", "fahrenheit"])
+    # then
+    assert result.exit_code == 0
+    assert json.loads(result.output) == [
+        {"id": 1, "hwid": "2", "type": "DS1822", "temperature": 77.9, "unit": "fahrenheit"}
+    ]
+
+
+@pytest.mark.parametrize("sensors", [DAEMON_SENSORS], indirect=["sensors"])
+def test_get_temperature_all_sensors_with_stale_daemon(sensors, daemon):
+    """Test reading the sensors if the readings of the daemon are too old"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--max-age", "0"])
+    # then the sensors are read directly, which fails since their files were removed
+    assert result.exit_code != 0
+    assert isinstance(result.exception, NoSensorFoundError)
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (  # bulk conversion
+            {"id": "1", "temperature": 20.0, "ext_power": 1},
+            {"id": "2", "temperature": 25.5, "ext_power": 1},
+        ),
+        (  # strong pull-up
+            {"id": "1", "temperature": 20.0, "ext_power": 0},
+            {"id": "2", "temperature": 25.5, "ext_power": 0},
+        ),
+    ],
+    indirect=["sensors"],
+)
+def test_get_temperature_all_sensors_without_root(sensors, bus_master_dir, mocker):
+    """Test reading all sensors serially if the bus master settings cannot be written"""
+    # given
+    bus_master_dir.join("therm_bulk_read").write("0\n")
+    bus_master_dir.join("w1_master_pullup").write("0\n")
+    mocker.patch.object(
+        BusMaster,
+        "_write_attribute",
+        side_effect=W1ThermSensorError("You might have to be root"),
+    )
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--json", "--max-age", "0"])
+    # then
+    assert result.exit_code == 0
+    assert [(s["hwid"], s["temperature"]) for s in json.loads(result.output)] == [
+        ("1", 20.0),
+        ("2", 25.5),
+    ]
+    assert bus_master_dir.join("therm_bulk_read").read() == "0\n"
+    assert bus_master_dir.join("w1_master_pullup").read() == "0\n"
+
+
+@pytest.mark.parametrize(
+    "sensors, args, expected_hwid, expected_temperature",
+    [
+        (DAEMON_SENSORS, [], "1", 20.0),
+        (DAEMON_SENSORS, ["2"], "2", 25.5),
+        (DAEMON_SENSORS, ["--hwid", "2"], "2", 25.5),
+        (DAEMON_SENSORS, ["--type", "DS1822"], "2", 25.5),
+        (DAEMON_SENSORS, ["1", "--offset", "1.5"], "1", 21.5),
+    ],
+    indirect=["sensors"],
+)
+def test_get_temperature_of_sensor_of_daemon(
+    sensors, daemon, args, expected_hwid, expected_temperature
+):
+    """Test getting the temperature of a sensor sampled by the daemon"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["get", "--json"] + args)
+    # then
+    assert result.exit_code == 0
+    data = json.loads(result.output)
+    assert data["hwid"] == expected_hwid
+    assert data["temperature"] == expected_temperature
+
+
+@pytest.mark.parametrize("sensors", [DAEMON_SENSORS], indirect=["sensors"])
+def test_serve_with_running_daemon(sensors, daemon):
+    """Test serving if a daemon is already running"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["serve"])
+    # then
+    assert result.exit_code != 0
+    assert "A daemon is already running" in result.output
+
+
+def test_serve_with_invalid_interval():
+    """Test serving with an invalid interval"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["serve", "--interval", "0"])
+    # then
+    assert result.exit_code != 0
+    assert "must be greater than 0" in result.output
+
+
+def test_exporter_with_port_in_use():
+    """Test exporting on a port which is already in use"""
+    # given
+    runner = CliRunner()
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        # when
+        result = runner.invoke(cli, ["exporter", "--address", "127.0.0.1", "--port", str(port)])
+    # then
+    assert result.exit_code != 0
+    assert "Address already in use" in result.output
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+            {"id": "2", "type": Sensor.DS1822, "temperature": 25.5, "ready": False},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_get_temperature_all_sensors_as_openmetrics_file(sensors, tmpdir):
+    """Test writing the temperatures of all sensors as OpenMetrics into a file"""
+    # given
+    runner = CliRunner()
+    output = tmpdir.mkdir("textfiles").join("w1thermsensor.prom")
+    output.write("outdated")
+    # when
+    result = runner.invoke(
+        cli, ["all", "--format", "openmetrics", "--output", str(output), "--max-age", "0"]
+    )
+    # then
+    assert result.exit_code == 0
+    assert result.output == ""
+    assert output.dirpath().listdir() == [output]
+    lines = output.read().splitlines()
+    assert lines[:3] == [
+        "# TYPE w1thermsensor_temperature_celsius gauge",
+        "# UNIT w1thermsensor_temperature_celsius celsius",
+        "# HELP w1thermsensor_temperature_celsius Temperature of the sensor",
+    ]
+    assert 'w1thermsensor_temperature_celsius{sensor_id="1",type="DS18B20"} 20' in lines
+    assert not any(
+        line.startswith('w1thermsensor_temperature_celsius{sensor_id="2"') for line in lines
+    )
+    assert 'w1thermsensor_last_read_error{sensor_id="1",type="DS18B20"} 0' in lines
+    assert 'w1thermsensor_last_read_error{sensor_id="2",type="DS1822"} 1' in lines
+    assert sum(line.startswith("w1thermsensor_last_read_duration_seconds{") for line in lines) == 2
+    assert lines[-1] == "# EOF"
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"id": "1", "temperature": 20.0},)], indirect=["sensors"]
+)
+def test_get_temperature_all_sensors_into_file_in_unit(sensors, tmpdir):
+    """Test writing the temperatures of all sensors in another unit into a file"""
+    # given
+    runner = CliRunner()
+    output = tmpdir.join("temperatures.json")
+    # when
+    result = runner.invoke(cli, ["all", "--json", "-u", "kelvin", "--output", str(output)])
+    # then
+    assert result.exit_code == 0
+    assert json.loads(output.read()) == [
+        {"id": 1, "hwid": "1", "type": "DS18B20", "temperature": 293.15, "unit": "kelvin"}
+    ]
+
+
+STREAM_SENSORS = (
+    {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+    {"id": "2", "type": Sensor.DS1822, "temperature": 25.5},
+)
+
+
+@pytest.mark.parametrize("sensors", [STREAM_SENSORS], indirect=["sensors"])
+def test_get_temperature_all_sensors_as_ndjson(sensors):
+    """Test streaming the temperatures of all sensors as newline delimited JSON"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--format", "ndjson"])
+    # then
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.output.splitlines()]
+    assert [(r["id"], r["hwid"], r["type"], r["temperature"]) for r in records] == [
+        (1, "1", "DS18B20", 20.0),
+        (2, "2", "DS1822", 25.5),
+    ]
+    assert all(r["unit"] == "celsius" and r["timestamp"] > 0 for r in records)
+
+
+@pytest.mark.parametrize("sensors", [STREAM_SENSORS], indirect=["sensors"])
+def test_get_temperature_all_sensors_as_csv(sensors):
+    """Test streaming the temperatures of all sensors as CSV"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--format", "csv", "--unit", "kelvin"])
+    # then
+    assert result.exit_code == 0
+    lines = [line.split(",") for line in result.output.splitlines()]
+    assert lines[0] == ["id", "hwid", "type", "timestamp", "temperature", "unit"]
+    assert [line[:3] + line[4:] for line in lines[1:]] == [
+        ["1", "1", "DS18B20", "293.15", "kelvin"],
+        ["2", "2", "DS1822", "298.65", "kelvin"],
+    ]
+
+
+@pytest.mark.parametrize("sensors", [STREAM_SENSORS], indirect=["sensors"])
+def test_get_temperature_all_sensors_as_influx(sensors):
+    """Test streaming the temperatures of all sensors in the InfluxDB line protocol"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--format", "influx", "--type", "DS1822"])
+    # then
+    assert result.exit_code == 0
+    measurement, fields, timestamp = result.output.strip().split(" ")
+    assert measurement == "w1thermsensor,hwid=2,type=DS1822,unit=celsius"
+    assert fields == "temperature=25.5"
+    assert len(timestamp) == 19
+
+
+def test_get_temperature_all_sensors_streamed_into_file(tmpdir):
+    """Test writing a streaming format into a file"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(
+        cli, ["all", "--format", "ndjson", "--output", str(tmpdir.join("out"))]
+    )
+    # then
+    assert result.exit_code != 0
+    assert "The ndjson format is written to stdout only" in result.output
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+            {"id": "2", "type": Sensor.DS1822, "temperature": 25.5, "ready": False},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_watch_temperature_all_sensors(sensors, mocker):
+    """Test watching the temperatures of all sensors"""
+    # given
+    runner = CliRunner()
+    sleep_mock = mocker.patch("w1thermsensor.cli.time.sleep")
+    sleep_mock.side_effect = [None, KeyboardInterrupt]
+    # when
+    result = runner.invoke(cli, ["all", "--format", "csv", "--watch", "5"])
+    # then the failed reads are reported without aborting
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert sum(line.startswith("1,1,DS18B20,") for line in lines) == 2
+    assert sum(line.startswith("Failed to read sensor 2 (2):") for line in lines) == 2
+    assert sleep_mock.call_count == 2
+    assert 0 < sleep_mock.call_args_list[0][0][0] <= 5
+
+
+def test_watch_with_invalid_interval():
+    """Test watching with an invalid interval"""
+    # given
+    runner = CliRunner()
+    # when
+    result = runner.invoke(cli, ["all", "--watch", "-1"])
+    # then
+    assert result.exit_code != 0
+    assert "must be greater than 0" in result.output
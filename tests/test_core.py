@@ -24,7 +24,7 @@ from w1thermsensor.errors import (
     UnsupportedUnitError,
     W1ThermSensorError
 )
-from w1thermsensor.sensors import Sensor
+from w1thermsensor.sensors import PowerMode, Sensor
 from w1thermsensor.units import Unit
 
 
@@ -224,6 +224,45 @@ def test_init_sensor_by_type_and_id(sensors, sensor_specs):
     assert sensor.type == sensor_specs["sensor_type"]
 
 
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_init_known_sensor_without_validation(sensors, mocker):
+    """Test that a known sensor is initialized without file system access"""
+    # given
+    exists_spy = mocker.spy(W1ThermSensor, "exists")
+    # when
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, sensors[0]["id"])
+    # then
+    assert sensor.id == sensors[0]["id"]
+    assert sensor.get_temperature() == pytest.approx(sensors[0]["temperature"])
+    assert exists_spy.call_count == 0
+
+
+def test_init_known_sensor_not_existent(kernel_module_dir):
+    """Test that a missing known sensor is detected on validation or the first read"""
+    # when
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    # then
+    with pytest.raises(NoSensorFoundError):
+        sensor.get_temperature()
+
+    with pytest.raises(NoSensorFoundError):
+        W1ThermSensor.from_known(Sensor.DS18B20, "1", validate=True)
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_get_available_sensors_without_validation(sensors, mocker):
+    """Test that the available sensors are not validated again"""
+    # given
+    exists_spy = mocker.spy(W1ThermSensor, "exists")
+    # when
+    available_sensors = W1ThermSensor.get_available_sensors()
+    # then
+    assert len(available_sensors) == 2
+    assert exists_spy.call_count == 0
+
+
 @pytest.mark.parametrize(
     "sensors, unit, expected_temperature",
     [
@@ -831,3 +870,124 @@ def test_handling_reset_value(sensors):
     # when & then
     with pytest.raises(ResetValueError, match=expected_error_msg):
         sensor.get_temperature()
+
+
+@pytest.mark.parametrize(
+    "sensors, expected_power_mode",
+    [
+        (({"ext_power": 1},), PowerMode.EXTERNAL),
+        (({"ext_power": 0},), PowerMode.PARASITE),
+    ],
+    indirect=["sensors"],
+)
+def test_get_power_mode(sensors, expected_power_mode):
+    """Test getting the sensor power mode"""
+    # given
+    sensor = W1ThermSensor()
+    # when
+    power_mode = sensor.get_power_mode()
+    # then
+    assert power_mode == expected_power_mode
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"ext_power": -5},), ({"ext_power": "x"},), ({},)], indirect=["sensors"]
+)
+def test_get_power_mode_failure(sensors):
+    """Test getting the sensor power mode if the kernel does not support it"""
+    # given
+    sensor = W1ThermSensor()
+    # when & then
+    with pytest.raises(W1ThermSensorError, match="Failed to read power mode"):
+        sensor.get_power_mode()
+
+
+def test_get_power_mode_of_disconnected_sensor(kernel_module_dir):
+    """Test getting the power mode of a disconnected sensor"""
+    # given
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    # when & then
+    with pytest.raises(NoSensorFoundError):
+        sensor.get_power_mode()
+
+
+def get_sensor_dir(kernel_module_dir, sensor):
+    """Return the sysfs directory of the given sensor"""
+    return kernel_module_dir.join("{0}-{1}".format(hex(sensor["type"])[2:], sensor["id"]))
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_get_alarms(sensors, kernel_module_dir):
+    """Test getting the alarm thresholds"""
+    # given
+    get_sensor_dir(kernel_module_dir, sensors[0]).join("alarms").write("-10 85\n")
+    sensor = W1ThermSensor()
+    # when
+    alarms = sensor.get_alarms()
+    # then
+    assert alarms == (-10, 85)
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_get_alarms_failure(sensors):
+    """Test getting the alarm thresholds if the kernel does not support it"""
+    # given
+    sensor = W1ThermSensor()
+    # when & then
+    with pytest.raises(W1ThermSensorError, match="Failed to read alarms"):
+        sensor.get_alarms()
+
+
+def test_get_alarms_of_disconnected_sensor(kernel_module_dir):
+    """Test getting the alarm thresholds of a disconnected sensor"""
+    # given
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    # when & then
+    with pytest.raises(NoSensorFoundError):
+        sensor.get_alarms()
+
+
+@pytest.mark.parametrize(
+    "sensors, persist",
+    [(({"type": Sensor.DS18B20},), False), (({"type": Sensor.DS18B20},), True)],
+    indirect=["sensors"],
+)
+def test_set_alarms(sensors, kernel_module_dir, persist):
+    """Test setting the alarm thresholds"""
+    # given
+    sensor_dir = get_sensor_dir(kernel_module_dir, sensors[0])
+    sensor = W1ThermSensor()
+    # when
+    sensor.set_alarms(2, 8, persist=persist)
+    # then
+    assert sensor_dir.join("alarms").read() == "2 8\n"
+    assert sensor_dir.join("eeprom_cmd").exists() == persist
+
+
+@pytest.mark.parametrize(
+    "sensors, low, high",
+    [
+        (({"type": Sensor.DS18B20},), -56, 10),
+        (({"type": Sensor.DS18B20},), 10, 126),
+        (({"type": Sensor.DS18B20},), 10, 5),
+    ],
+    indirect=["sensors"],
+)
+def test_set_invalid_alarms(sensors, low, high):
+    """Test setting invalid alarm thresholds"""
+    # given
+    sensor = W1ThermSensor()
+    # when & then
+    with pytest.raises(ValueError, match="alarm thresholds"):
+        sensor.set_alarms(low, high)
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_set_alarms_failure(sensors, kernel_module_dir):
+    """Test setting the alarm thresholds if they cannot be written"""
+    # given
+    get_sensor_dir(kernel_module_dir, sensors[0]).mkdir("alarms")
+    sensor = W1ThermSensor()
+    # when & then
+    with pytest.raises(W1ThermSensorError, match="You might have to be root"):
+        sensor.set_alarms(2, 8)
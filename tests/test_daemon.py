@@ -0,0 +1,301 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.daemon import (
+    SYSTEM_SOCKET_PATH,
+    Daemon,
+    DaemonClient,
+    Sampler,
+    SensorState,
+    get_socket_path,
+)
+from w1thermsensor.errors import DaemonError
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import Sensor
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+            {"id": "2", "type": Sensor.DS1822, "temperature": 25.5},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_sampler_samples_all_sensors(sensors):
+    # given
+    readings = []
+    sampler = Sampler(on_reading=readings.append)
+
+    # when
+    sampler.sample()
+
+    # then
+    states = sampler.states
+    assert [(s.id, s.type, s.reading.temperature, s.errors) for s in states] == [
+        ("1", Sensor.DS18B20, 20.0, 0),
+        ("2", Sensor.DS1822, 25.5, 0),
+    ]
+    assert all(s.duration >= 0 for s in states)
+    assert [r.temperature for r in readings] == [20.0, 25.5]
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"id": "1", "temperature": 20.0},)], indirect=["sensors"]
+)
+def test_sampler_counts_errors_and_keeps_latest_reading(sensors, kernel_module_dir):
+    # given
+    sampler = Sampler()
+    sampler.sample()
+
+    # when
+    kernel_module_dir.join("28-1", W1ThermSensor.SLAVE_FILE).write("")
+    sampler.sample()
+
+    # then
+    state = sampler.states[0]
+    assert state.errors == 1
+    assert state.reading.temperature == 20.0
+
+
+def test_sensor_state_age():
+    assert SensorState("1", Sensor.DS18B20).get_age() is None
+    assert SensorState("1", Sensor.DS18B20, Reading("1", 10.0, 20.0)).get_age(15.0) == 5.0
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"id": "1", "type": Sensor.DS18B20, "temperature": 20.0},
+            {"id": "2", "type": Sensor.DS1822, "temperature": 25.5},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_daemon_serves_sampled_sensors(sensors, socket_path):
+    # given
+    daemon = Daemon(interval=3600)
+    daemon.start()
+    daemon.sampler.sample()
+
+    # when
+    try:
+        states = DaemonClient().get_sensors()
+    finally:
+        daemon.stop()
+
+    # then
+    assert [(s.id, s.type, s.reading.temperature) for s in states] == [
+        ("1", Sensor.DS18B20, 20.0),
+        ("2", Sensor.DS1822, 25.5),
+    ]
+
+
+def test_daemon_removes_socket(kernel_module_dir, socket_path):
+    # given
+    daemon = Daemon(socket_path, interval=3600)
+    daemon.start()
+
+    # when
+    daemon.stop()
+
+    # then
+    with pytest.raises(DaemonError, match="not running"):
+        DaemonClient(socket_path).get_sensors()
+
+
+def test_daemon_replaces_stale_socket(kernel_module_dir, socket_path):
+    # given
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+
+    # when
+    daemon = Daemon(socket_path, interval=3600)
+    daemon.start()
+
+    # then
+    try:
+        assert DaemonClient(socket_path).get_sensors() is not None
+    finally:
+        daemon.stop()
+
+
+def test_client_refuses_daemon_of_other_user(kernel_module_dir, socket_path, monkeypatch):
+    # given
+    daemon = Daemon(socket_path, interval=3600)
+    daemon.start()
+    monkeypatch.setattr("w1thermsensor.daemon._get_peer_uid", lambda client: 4242)
+
+    # when & then
+    try:
+        with pytest.raises(DaemonError, match=r"run by another user \(uid 4242\)"):
+            DaemonClient(socket_path).get_sensors()
+    finally:
+        daemon.stop()
+
+
+@pytest.mark.parametrize(
+    "environ, euid, expected_path",
+    [
+        ({"W1THERMSENSOR_SOCKET": "/foo.sock"}, 1000, "/foo.sock"),
+        ({"XDG_RUNTIME_DIR": "/run/user/1000"}, 1000, "/run/user/1000/w1thermsensor.sock"),
+        ({"XDG_RUNTIME_DIR": "/run/user/0"}, 0, str(SYSTEM_SOCKET_PATH)),
+        ({}, 1000, str(SYSTEM_SOCKET_PATH)),
+    ],
+)
+def test_get_socket_path(monkeypatch, environ, euid, expected_path):
+    # given
+    monkeypatch.delenv("W1THERMSENSOR_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr("os.geteuid", lambda: euid)
+
+    # when & then
+    assert str(get_socket_path()) == expected_path
+
+
+def test_client_falls_back_to_system_socket(tmpdir, monkeypatch):
+    # given
+    system_path = tmpdir.join("system.sock")
+    system_path.write("")
+    monkeypatch.delenv("W1THERMSENSOR_SOCKET", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmpdir.join("user")))
+    monkeypatch.setattr("os.geteuid", lambda: 1000)
+    monkeypatch.setattr("w1thermsensor.daemon.SYSTEM_SOCKET_PATH", Path(system_path))
+
+    # when
+    client = DaemonClient()
+
+    # then
+    assert client.socket_path == Path(system_path)
+
+
+def test_client_does_not_fall_back_from_configured_socket(tmpdir, monkeypatch):
+    # given
+    system_path = tmpdir.join("system.sock")
+    system_path.write("")
+    monkeypatch.setenv("W1THERMSENSOR_SOCKET", str(tmpdir.join("configured.sock")))
+    monkeypatch.setattr("w1thermsensor.daemon.SYSTEM_SOCKET_PATH", Path(system_path))
+
+    # when
+    client = DaemonClient()
+
+    # then
+    assert client.socket_path == Path(tmpdir.join("configured.sock"))
+
+
+def test_daemon_already_running(kernel_module_dir, socket_path):
+    # given
+    daemon = Daemon(socket_path, interval=3600)
+    daemon.start()
+
+    # when & then
+    try:
+        with pytest.raises(DaemonError, match="already running"):
+            Daemon(socket_path).start()
+    finally:
+        daemon.stop()
+
+
+def test_daemon_rejects_unknown_command(kernel_module_dir, socket_path):
+    # given
+    daemon = Daemon(socket_path, interval=3600)
+    daemon.start()
+
+    # when & then
+    try:
+        with pytest.raises(DaemonError, match="unknown command foo"):
+            DaemonClient(socket_path)._request({"command": "foo"})
+    finally:
+        daemon.stop()
+
+
+def test_sampler_runs_periodically(kernel_module_dir):
+    # given
+    sampler = Sampler(interval=0.01)
+    calls = []
+    sampler.sample = lambda: calls.append(time.monotonic())
+
+    # when
+    sampler.start()
+    time.sleep(0.1)
+    sampler.stop()
+
+    # then
+    assert len(calls) >= 2
+
+
+def test_sampler_survives_missing_devices_directory(kernel_module_dir):
+    # given
+    kernel_module_dir.remove()
+    errors = []
+    sampler = Sampler(interval=0.01, on_error=errors.append)
+
+    # when
+    sampler.start()
+    time.sleep(0.05)
+
+    # then
+    assert sampler._thread.is_alive()
+    sampler.stop()
+    assert sampler.errors == len(errors) >= 1
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"},)], indirect=["sensors"])
+def test_sampler_survives_failing_callback(sensors):
+    # given
+    errors = []
+
+    def on_update(state):
+        raise ValueError("callback failed")
+
+    sampler = Sampler(interval=0.01, on_update=on_update, on_error=errors.append)
+
+    # when
+    sampler.start()
+    deadline = time.monotonic() + 5
+    while len(errors) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # then
+    assert sampler._thread.is_alive()
+    sampler.stop()
+    assert sampler.errors == len(errors) >= 2
+    assert str(errors[0]) == "callback failed"
+
+
+def test_sampler_logs_failed_samples(kernel_module_dir, caplog):
+    # given
+    kernel_module_dir.remove()
+    sampler = Sampler(interval=3600)
+
+    # when
+    sampler.start()
+    deadline = time.monotonic() + 5
+    while not sampler.errors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sampler.stop()
+
+    # then
+    assert sampler.errors == 1
+    assert [r.getMessage() for r in caplog.records] == ["Failed to sample the sensors"]
+    assert caplog.records[0].name == "w1thermsensor.daemon"
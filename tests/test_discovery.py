@@ -0,0 +1,269 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.discovery import (
+    DiscoveredSensor,
+    DiscoveryCache,
+    SensorIndex,
+    SensorRegistry,
+    get_index_cache_path,
+    parse_slave_name,
+    read_bus_membership,
+    scan_sensors
+)
+from w1thermsensor.sensors import Sensor
+
+
+@pytest.mark.parametrize(
+    "slave_name, expected",
+    [
+        ("28-00000588806a", (Sensor.DS18B20, "00000588806a")),
+        ("10-00000588806a", (Sensor.DS18S20, "00000588806a")),
+        ("3b-00000588806a", (Sensor.DS1825, "00000588806a")),
+        ("3B-00000588806a", (Sensor.DS1825, "00000588806a")),
+        ("2d-00000588806a", None),  # DS2431 EEPROM
+        ("100-00000588806a", None),
+        ("w1_bus_master1", None),
+    ],
+)
+def test_parse_slave_name(slave_name, expected):
+    assert parse_slave_name(slave_name) == expected
+
+
+def test_read_bus_membership_without_bus_master(kernel_module_dir):
+    assert read_bus_membership(Path(str(kernel_module_dir))) is None
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_scan_sensors_assigns_bus_master(sensors, kernel_module_dir, bus_master_dir):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    membership = read_bus_membership(base_directory)
+
+    # when
+    discovered = scan_sensors(base_directory, membership)
+
+    # then
+    assert {(s.type, s.id) for s in discovered} == {(s["type"], s["id"]) for s in sensors}
+    assert {s.bus_master for s in discovered} == {"w1_bus_master1"}
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_discovery_cache_is_used_until_membership_changes(
+    sensors, kernel_module_dir, bus_master_dir, mocker
+):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    cache = DiscoveryCache()
+    scan_spy = mocker.patch(
+        "w1thermsensor.discovery.scan_sensors",
+        wraps=scan_sensors,
+    )
+
+    # when
+    first = cache.get_sensors(base_directory)
+    second = cache.get_sensors(base_directory)
+
+    # then
+    assert first == second
+    assert scan_spy.call_count == 1
+
+    # when a sensor joins the bus
+    kernel_module_dir.mkdir("22-00000588806b")
+    bus_master_dir.join("w1_master_slaves").write(
+        "28-{0}\n22-00000588806b\n".format(sensors[0]["id"])
+    )
+    third = cache.get_sensors(base_directory)
+
+    # then
+    assert scan_spy.call_count == 2
+    assert len(third) == 2
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_discovery_cache_without_bus_master_always_scans(sensors, kernel_module_dir, mocker):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    cache = DiscoveryCache()
+    scan_spy = mocker.patch(
+        "w1thermsensor.discovery.scan_sensors",
+        wraps=scan_sensors,
+    )
+
+    # when
+    cache.get_sensors(base_directory)
+    cache.get_sensors(base_directory)
+
+    # then
+    assert scan_spy.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS18S20})], indirect=["sensors"]
+)
+def test_get_available_sensors_with_bus_master(sensors, bus_master_dir):
+    # when
+    available_sensors = W1ThermSensor.get_available_sensors([Sensor.DS18S20])
+
+    # then
+    assert [s.id for s in available_sensors] == [sensors[1]["id"]]
+
+
+@pytest.mark.parametrize(
+    "env, expected_path",
+    [
+        ({}, None),
+        ({"W1THERMSENSOR_INDEX_CACHE": "0"}, None),
+        ({"W1THERMSENSOR_INDEX_CACHE": "1"}, None),
+        (
+            {"W1THERMSENSOR_INDEX_CACHE": "1", "XDG_RUNTIME_DIR": "/run/user/1000"},
+            Path("/run/user/1000/w1thermsensor/sensors.json"),
+        ),
+        ({"W1THERMSENSOR_INDEX_CACHE": "/tmp/index.json"}, Path("/tmp/index.json")),
+    ],
+)
+def test_get_index_cache_path(monkeypatch, env, expected_path):
+    # given
+    monkeypatch.delenv("W1THERMSENSOR_INDEX_CACHE", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    # when & then
+    assert get_index_cache_path() == expected_path
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_sensor_index_is_shared_between_caches(
+    sensors, kernel_module_dir, bus_master_dir, tmp_path, mocker
+):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    index_path = tmp_path / "w1thermsensor" / "sensors.json"
+    scan_spy = mocker.patch(
+        "w1thermsensor.discovery.scan_sensors",
+        wraps=scan_sensors,
+    )
+
+    # when
+    first = DiscoveryCache(index_path).get_sensors(base_directory)
+    second = DiscoveryCache(index_path).get_sensors(base_directory)
+
+    # then
+    assert index_path.exists()
+    assert first == second
+    assert scan_spy.call_count == 1
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_sensor_index_is_ignored_if_membership_changed(
+    sensors, kernel_module_dir, bus_master_dir, tmp_path
+):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    index = SensorIndex(tmp_path / "sensors.json")
+    index.store(
+        base_directory,
+        (("w1_bus_master1", "28-00000588806a\n"),),
+        [DiscoveredSensor(Sensor.DS18B20, "00000588806a", "w1_bus_master1")],
+    )
+
+    # when
+    discovered = DiscoveryCache(index.path).get_sensors(base_directory)
+
+    # then
+    assert [s.id for s in discovered] == [sensors[0]["id"]]
+
+
+def test_sensor_index_load_ignores_invalid_file(kernel_module_dir, tmp_path):
+    # given
+    index = SensorIndex(tmp_path / "sensors.json")
+    index.path.write_text("{ invalid")
+
+    # when & then
+    assert index.load(Path(str(kernel_module_dir)), (("w1_bus_master1", ""),)) is None
+
+
+def test_sensor_registry_lookups():
+    # given
+    sensors = [
+        DiscoveredSensor(Sensor.DS18B20, "1", "w1_bus_master1"),
+        DiscoveredSensor(Sensor.DS1822, "2", "w1_bus_master1"),
+        DiscoveredSensor(Sensor.DS18B20, "3", "w1_bus_master2"),
+    ]
+
+    # when
+    registry = SensorRegistry(sensors)
+
+    # then
+    assert list(registry) == sensors
+    assert len(registry) == 3
+    assert "2" in registry
+    assert "4" not in registry
+    assert registry.get("3") == sensors[2]
+    assert registry.get("4") is None
+    assert registry.get_by_bus_master("w1_bus_master1") == sensors[:2]
+    assert registry.get_by_bus_master("w1_bus_master3") == []
+    assert registry.get_by_type(Sensor.DS18B20) == [sensors[0], sensors[2]]
+    assert registry.bus_masters == ["w1_bus_master1", "w1_bus_master2"]
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"type": Sensor.DS18B20, "id": "1"}, {"type": Sensor.DS1822, "id": "2"})],
+    indirect=["sensors"],
+)
+def test_init_sensors_by_id_scans_once(sensors, bus_master_dir, mocker):
+    # given
+    scan_spy = mocker.patch(
+        "w1thermsensor.discovery.scan_sensors",
+        wraps=scan_sensors,
+    )
+
+    # when
+    initialized = [W1ThermSensor(sensor_id=s["id"]) for s in sensors * 10]
+
+    # then
+    assert [s.type for s in initialized[:2]] == [Sensor.DS18B20, Sensor.DS1822]
+    assert scan_spy.call_count == 1
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_discovery_cache_only_lists_devices_directory_once(
+    sensors, kernel_module_dir, bus_master_dir, mocker
+):
+    # given
+    base_directory = Path(str(kernel_module_dir))
+    cache = DiscoveryCache()
+    cache.get_sensors(base_directory)
+    glob_spy = mocker.spy(Path, "glob")
+
+    # when
+    for _ in range(60):
+        cache.get_registry(base_directory)
+
+    # then
+    assert glob_spy.call_count == 0
+
+    # when the bus master vanishes
+    bus_master_dir.remove()
+
+    # then the devices directory is listed again
+    assert [s.bus_master for s in cache.get_sensors(base_directory)] == [None]
+    assert glob_spy.call_count >= 1
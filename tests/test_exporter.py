@@ -0,0 +1,90 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.exporter import Exporter
+from w1thermsensor.openmetrics import CONTENT_TYPE
+from w1thermsensor.sensors import Sensor
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [
+        (
+            {"id": "1", "type": Sensor.DS18B20, "temperature": 20.5},
+            {"id": "2", "type": Sensor.DS1822, "temperature": 25.0},
+        )
+    ],
+    indirect=["sensors"],
+)
+def test_exporter_metrics(sensors, kernel_module_dir):
+    # given
+    exporter = Exporter(buckets=[1000])
+    exporter.sampler.sample()
+    kernel_module_dir.join("22-2", W1ThermSensor.SLAVE_FILE).write("")
+    exporter.sampler.sample()
+    exporter.clock = FakeClock(exporter.sampler.states[1].reading.timestamp + 12.5)
+
+    # when
+    lines = exporter.get_metrics().splitlines()
+
+    # then
+    assert 'w1thermsensor_temperature_celsius{sensor_id="1",type="DS18B20"} 20.5' in lines
+    assert 'w1thermsensor_temperature_celsius{sensor_id="2",type="DS1822"} 25' in lines
+    assert 'w1thermsensor_reading_age_seconds{sensor_id="2",type="DS1822"} 12.5' in lines
+    assert 'w1thermsensor_read_duration_seconds_count{sensor_id="1",type="DS18B20"} 2' in lines
+    assert (
+        'w1thermsensor_read_duration_seconds_bucket{sensor_id="2",type="DS1822",le="1000.0"} 2'
+        in lines
+    )
+    assert 'w1thermsensor_read_errors_total{sensor_id="1",type="DS18B20"} 0' in lines
+    assert 'w1thermsensor_read_errors_total{sensor_id="2",type="DS1822"} 1' in lines
+    assert "w1thermsensor_sample_errors_total 0" in lines
+    assert lines[-1] == "# EOF"
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"id": "1", "temperature": 20.5},)], indirect=["sensors"]
+)
+def test_exporter_serves_metrics(sensors):
+    # given
+    exporter = Exporter("127.0.0.1", 0, interval=3600)
+    exporter.start()
+    exporter.sampler.sample()
+    url = "http://127.0.0.1:{0}".format(exporter.port)
+
+    try:
+        # when
+        with urllib.request.urlopen(url + "/metrics") as response:
+            content_type = response.headers["Content-Type"]
+            body = response.read().decode("utf-8")
+
+        # then
+        assert content_type == CONTENT_TYPE
+        assert 'w1thermsensor_temperature_celsius{sensor_id="1",type="DS18B20"} 20.5' in body
+
+        with pytest.raises(urllib.error.HTTPError) as exc_info:
+            urllib.request.urlopen(url + "/other")
+        assert exc_info.value.code == 404
+    finally:
+        exporter.stop()
@@ -0,0 +1,117 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import math
+
+import pytest
+
+from w1thermsensor.frames import Resampling, build_frame
+from w1thermsensor.history import HistoryStore
+from w1thermsensor.readings import Reading
+
+numpy = pytest.importorskip("numpy")
+
+#: Holds readings of two sensors read one after the other every 10 seconds
+READINGS = [
+    Reading("1", 0, 20.0),
+    Reading("2", 1, 30.0),
+    Reading("1", 10, 21.0),
+    Reading("2", 11, 31.0),
+    Reading("1", 20, 22.0),
+    Reading("2", 21, 32.0),
+]
+
+
+def to_list(values):
+    return [[None if math.isnan(v) else v for v in row] for row in values.tolist()]
+
+
+def test_build_frame_with_linear_interpolation():
+    # when
+    frame = build_frame(READINGS, interval=5)
+
+    # then
+    assert frame.sensor_ids == ["1", "2"]
+    assert frame.timestamps.tolist() == [0, 5, 10, 15, 20]
+    assert frame.values.shape == (2, 5)
+    assert to_list(frame.values) == [
+        [20.0, 20.5, 21.0, 21.5, 22.0],
+        [None, 30.4, 30.9, 31.4, 31.9],
+    ]
+
+
+def test_build_frame_with_last_value_hold():
+    # when
+    frame = build_frame(READINGS, interval=5, start=0, end=25, resampling=Resampling.HOLD)
+
+    # then
+    assert frame.timestamps.tolist() == [0, 5, 10, 15, 20, 25]
+    assert to_list(frame.values) == [
+        [20.0, 20.0, 21.0, 21.0, 22.0, 22.0],
+        [None, 30.0, 30.0, 31.0, 31.0, 32.0],
+    ]
+
+
+def test_build_frame_aligns_grid_to_interval():
+    frame = build_frame(READINGS, interval=4, start=1, end=13)
+    assert frame.timestamps.tolist() == [4, 8, 12]
+
+
+def test_build_frame_of_selected_sensors_from_unsorted_readings():
+    # when
+    frame = build_frame(list(reversed(READINGS)), interval=10, sensor_ids=["2", "3"])
+
+    # then
+    assert frame.sensor_ids == ["2", "3"]
+    assert frame.timestamps.tolist() == [10, 20]
+    assert to_list(frame.values) == [[30.9, 31.9], [None, None]]
+
+
+def test_build_frame_from_history_store():
+    # given
+    history = HistoryStore(capacity=10)
+    for reading in READINGS:
+        history.add(reading)
+
+    # when
+    frame = build_frame(history, interval=10)
+
+    # then
+    assert frame.timestamps.tolist() == [0, 10, 20]
+    assert to_list(frame.values) == [[20.0, 21.0, 22.0], [None, 30.9, 31.9]]
+
+
+def test_build_frame_of_bulk_conversions_is_exact():
+    # given
+    readings = [
+        Reading("1", 0.5, 20.0),
+        Reading("2", 0.5, 30.0),
+        Reading("1", 10.5, 21.0),
+        Reading("2", 10.5, 31.0),
+    ]
+
+    # when
+    frame = build_frame(readings)
+
+    # then
+    assert frame.timestamps.tolist() == [0.5, 10.5]
+    assert frame.values.tolist() == [[20.0, 21.0], [30.0, 31.0]]
+
+
+def test_build_frame_without_readings():
+    frame = build_frame([], interval=10)
+    assert frame.sensor_ids == []
+    assert frame.timestamps.tolist() == []
+    assert frame.values.shape == (0, 0)
+
+
+def test_build_frame_with_invalid_interval():
+    with pytest.raises(ValueError):
+        build_frame(READINGS, interval=0)
@@ -0,0 +1,188 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import pytest
+
+from w1thermsensor.history import HistoryStore, SensorHistory
+from w1thermsensor.readings import Reading
+from w1thermsensor.streams import pipe
+
+
+def test_empty_history():
+    history = SensorHistory(3)
+    assert len(history) == 0
+    assert history.timestamps.tolist() == []
+    assert history.values.tolist() == []
+
+
+def test_history_keeps_last_readings():
+    # given
+    history = SensorHistory(3)
+
+    # when
+    for i in range(5):
+        history.append(1000 + i, 20.0 + i)
+
+    # then
+    assert len(history) == 3
+    assert history.timestamps.tolist() == [1002000000000, 1003000000000, 1004000000000]
+    assert history.values.tolist() == [22.0, 23.0, 24.0]
+    assert history.timestamps.format == "q"
+    assert history.values.format == "d"
+
+
+@pytest.mark.parametrize("appended", range(1, 8))
+def test_history_is_contiguous_after_every_append(appended):
+    # given
+    history = SensorHistory(3)
+
+    # when
+    for i in range(appended):
+        history.append(i, float(i))
+
+    # then
+    assert history.values.tolist() == [float(i) for i in range(max(0, appended - 3), appended)]
+    assert history.values.contiguous
+
+
+def test_history_is_exported_without_copying():
+    # given
+    numpy = pytest.importorskip("numpy")
+    history = SensorHistory(2)
+    history.append(1, 20.0)
+    history.append(2, 21.0)
+
+    # when
+    values = numpy.frombuffer(history.values, dtype=numpy.float64)
+    timestamps = numpy.frombuffer(history.timestamps, dtype=numpy.int64)
+
+    # then
+    assert values.tolist() == [20.0, 21.0]
+    assert timestamps.tolist() == [1000000000, 2000000000]
+
+    # when the oldest reading is overwritten
+    history.append(3, 22.0)
+
+    # then the arrays share the memory with the ring buffer
+    assert values[0] == 22.0
+    assert not values.flags.owndata
+
+
+def test_invalid_history_capacity():
+    with pytest.raises(ValueError):
+        SensorHistory(0)
+    with pytest.raises(ValueError):
+        HistoryStore(0)
+
+
+def test_history_store_records_readings_passing_through():
+    # given
+    store = HistoryStore(capacity=10)
+    readings = [Reading("1", 1, 20.0), Reading("2", 1, 30.0), Reading("1", 2, 21.0)]
+
+    # when
+    passed = list(pipe(readings, store))
+
+    # then
+    assert passed == readings
+    assert list(store) == ["1", "2"]
+    assert len(store) == 2
+    assert "1" in store and "3" not in store
+    assert store["1"].values.tolist() == [20.0, 21.0]
+    assert store.get("2").values.tolist() == [30.0]
+    assert store.get("3") is None
+
+
+def test_history_store_skips_readings_out_of_order():
+    # given
+    store = HistoryStore(capacity=10)
+    readings = [Reading("1", 10, 20.0), Reading("1", 9, 21.0), Reading("1", 11, 22.0)]
+
+    # when
+    passed = list(pipe(readings, store))
+
+    # then
+    assert passed == readings
+    assert store.skipped == 1
+    assert store["1"].values.tolist() == [20.0, 22.0]
+
+
+def make_history(*timestamps, capacity=10):
+    history = SensorHistory(capacity)
+    for timestamp in timestamps:
+        history.append(timestamp, float(timestamp))
+    return history
+
+
+def test_history_rejects_readings_out_of_order():
+    history = make_history(10)
+    with pytest.raises(ValueError):
+        history.append(9, 20.0)
+
+
+@pytest.mark.parametrize(
+    "start, end, expected_values",
+    [
+        (0, 100, [10.0, 20.0, 30.0, 40.0]),
+        (20, 30, [20.0, 30.0]),
+        (15, 35, [20.0, 30.0]),
+        (41, 50, []),
+        (30, 20, []),
+    ],
+)
+def test_history_between(start, end, expected_values):
+    # given
+    history = make_history(0, 10, 20, 30, 40, capacity=4)
+
+    # when
+    timestamps, values = history.between(start, end)
+
+    # then
+    assert values.tolist() == expected_values
+    assert timestamps.tolist() == [int(v) * 1000000000 for v in expected_values]
+    assert values.obj is history.values.obj
+
+
+@pytest.mark.parametrize(
+    "duration, expected_values", [(0, [40.0]), (15, [30.0, 40.0]), (100, [10.0, 20.0, 30.0, 40.0])]
+)
+def test_history_last(duration, expected_values):
+    history = make_history(0, 10, 20, 30, 40, capacity=4)
+    assert history.last(duration)[1].tolist() == expected_values
+
+
+def test_history_last_of_empty_history():
+    assert SensorHistory(3).last(10)[1].tolist() == []
+
+
+@pytest.mark.parametrize(
+    "timestamp, interpolate, expected_value",
+    [
+        (20, False, 20.0),
+        (24, False, 20.0),
+        (25, False, 20.0),
+        (26, False, 30.0),
+        (-5, False, 10.0),
+        (100, False, 40.0),
+        (20, True, 20.0),
+        (25, True, 25.0),
+        (37.5, True, 37.5),
+        (5, True, None),
+        (41, True, None),
+    ],
+)
+def test_history_at(timestamp, interpolate, expected_value):
+    history = make_history(0, 10, 20, 30, 40, capacity=4)
+    assert history.at(timestamp, interpolate) == expected_value
+
+
+def test_history_at_without_readings():
+    assert SensorHistory(3).at(10) is None
+    assert SensorHistory(3).at(10, interpolate=True) is None
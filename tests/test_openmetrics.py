@@ -0,0 +1,58 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+from w1thermsensor.openmetrics import Histogram, MetricFamily, Sample, format_metrics
+
+
+def test_histogram_counts_cumulative_buckets():
+    # given
+    histogram = Histogram([0.1, 1])
+
+    # when
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    # then
+    assert histogram.get_samples({"sensor_id": "1"}) == [
+        Sample("_bucket", {"sensor_id": "1", "le": "0.1"}, 2),
+        Sample("_bucket", {"sensor_id": "1", "le": "1.0"}, 3),
+        Sample("_bucket", {"sensor_id": "1", "le": "+Inf"}, 4),
+        Sample("_count", {"sensor_id": "1"}, 4),
+        Sample("_sum", {"sensor_id": "1"}, 3.65),
+    ]
+
+
+def test_format_metrics():
+    # given
+    families = [
+        MetricFamily(
+            "w1thermsensor_temperature_celsius",
+            "gauge",
+            "Latest temperature",
+            [Sample("", {"sensor_id": "1", "type": 'a"b\\c'}, 20.5)],
+            "celsius",
+        ),
+        MetricFamily("w1thermsensor_read_errors", "counter", "Errors", [Sample("_total", {}, 3)]),
+    ]
+
+    # when
+    text = format_metrics(families)
+
+    # then
+    assert text == (
+        "# TYPE w1thermsensor_temperature_celsius gauge\n"
+        "# UNIT w1thermsensor_temperature_celsius celsius\n"
+        "# HELP w1thermsensor_temperature_celsius Latest temperature\n"
+        'w1thermsensor_temperature_celsius{sensor_id="1",type="a\\"b\\\\c"} 20.5\n'
+        "# TYPE w1thermsensor_read_errors counter\n"
+        "# HELP w1thermsensor_read_errors Errors\n"
+        "w1thermsensor_read_errors_total 3\n"
+        "# EOF\n"
+    )
@@ -0,0 +1,447 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import queue
+import threading
+
+import pytest
+
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import BusOverloadError, NoSensorFoundError, W1ThermSensorError
+from w1thermsensor.scheduler import (
+    AdaptiveSampling,
+    BusUtilization,
+    OverloadPolicy,
+    Scheduler,
+    get_conversion_time,
+)
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.units import Unit
+
+
+class FakeClock:
+    """A clock which only advances when told to"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.parametrize(
+    "resolution, expected_conversion_time", [(9, 0.09375), (10, 0.1875), (11, 0.375), (12, 0.75)]
+)
+def test_get_conversion_time(resolution, expected_conversion_time):
+    assert get_conversion_time(resolution) == expected_conversion_time
+
+
+def test_get_conversion_time_of_invalid_resolution():
+    with pytest.raises(ValueError):
+        get_conversion_time(13)
+
+
+@pytest.mark.parametrize(
+    "sensors",
+    [({"id": "1", "temperature": 20}, {"id": "2", "temperature": 25})],
+    indirect=["sensors"],
+)
+def test_scheduler_reads_sensors_in_their_intervals(sensors):
+    # given
+    clock = FakeClock()
+    readings = queue.Queue()
+    scheduler = Scheduler(queue=readings, unit=Unit.KELVIN, clock=clock)
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=5)
+    scheduler.add(W1ThermSensor(sensor_id="2"), interval=60)
+
+    # when & then
+    assert sorted(r.sensor_id for r in scheduler.run_pending()) == ["1", "2"]
+    assert scheduler.run_pending() == []
+
+    clock.now = 5.0
+    assert [r.sensor_id for r in scheduler.run_pending()] == ["1"]
+
+    clock.now = 60.0
+    assert [r.sensor_id for r in scheduler.run_pending()] == ["1", "2"]
+
+    received = [readings.get_nowait() for _ in range(readings.qsize())]
+    assert len(received) == 5
+    assert all(r.unit == Unit.KELVIN for r in received)
+    assert {r.sensor_id: r.temperature for r in received} == {
+        "1": pytest.approx(20 + 273.15),
+        "2": pytest.approx(25 + 273.15),
+    }
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"id": "1"}, {"id": "2"}, {"id": "3"})], indirect=["sensors"]
+)
+def test_scheduler_reads_earliest_deadline_first(sensors):
+    # given
+    clock = FakeClock()
+    read_order = []
+    scheduler = Scheduler(callback=lambda r: read_order.append(r.sensor_id), clock=clock)
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=60)
+    scheduler.add(W1ThermSensor(sensor_id="2"), interval=60, priority=1)
+    scheduler.add(W1ThermSensor(sensor_id="3"), interval=5)
+
+    # when
+    scheduler.run_pending()
+
+    # then
+    assert read_order == ["3", "2", "1"]
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"}, {"id": "2"})], indirect=["sensors"])
+def test_scheduler_does_not_block_higher_priority_sensors(sensors):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=5, priority=10)
+    scheduler.run_pending()
+
+    # when the high priority sensor gets due during the low priority conversion
+    clock.now = 4.5
+    scheduler.add(W1ThermSensor(sensor_id="2"), interval=60)
+    assert [r.sensor_id for r in scheduler.run_pending()] == []
+
+    # then the low priority sensor waits for it
+    clock.now = 5.0
+    assert [r.sensor_id for r in scheduler.run_pending()] == ["1", "2"]
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"}, {"id": "2"})], indirect=["sensors"])
+def test_scheduler_does_not_starve_lower_priority_sensors(sensors, mocker):
+    # given
+    clock = FakeClock()
+    read_order = []
+    scheduler = Scheduler(callback=lambda r: read_order.append(r.sensor_id), clock=clock)
+    high_priority_sensor = W1ThermSensor(sensor_id="1")
+    low_priority_sensor = W1ThermSensor(sensor_id="2")
+
+    def read_slowly(*args):
+        clock.now += 0.75
+        return 20.0
+
+    for sensor in (high_priority_sensor, low_priority_sensor):
+        mocker.patch.object(sensor, "get_temperature", side_effect=read_slowly)
+    scheduler.add(high_priority_sensor, interval=1, priority=10)
+    scheduler.add(low_priority_sensor, interval=60)
+
+    # when each low priority read overlaps the next high priority release
+    tick = 0
+    while clock.now < 600:
+        scheduler.run_pending()
+        tick += 1
+        clock.now = max(clock.now, tick * 0.05)
+
+    # then the low priority sensor is still read within each of its intervals
+    assert read_order.count("2") == 10
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"},)], indirect=["sensors"])
+def test_scheduler_skips_missed_reads(sensors):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=5)
+    scheduler.run_pending()
+
+    # when
+    clock.now = 100.0
+
+    # then
+    assert len(scheduler.run_pending()) == 1
+    assert scheduler.sensors[0].release == 105.0
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"}, {"id": "2"})], indirect=["sensors"])
+def test_scheduler_remove_and_reschedule(sensors):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    sensor_1 = W1ThermSensor(sensor_id="1")
+    sensor_2 = W1ThermSensor(sensor_id="2")
+    scheduler.add(sensor_1, interval=5)
+    scheduler.add(sensor_2, interval=5)
+
+    # when
+    scheduler.remove(sensor_1)
+    scheduler.add(sensor_2, interval=10, priority=3)
+
+    # then
+    assert [r.sensor_id for r in scheduler.run_pending()] == ["2"]
+    assert [(s.sensor.id, s.interval, s.priority) for s in scheduler.sensors] == [("2", 10, 3)]
+
+
+def test_scheduler_rejects_invalid_interval(kernel_module_dir):
+    with pytest.raises(ValueError):
+        Scheduler().add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=0)
+
+
+def test_scheduler_reports_errors(kernel_module_dir):
+    # given
+    errors = []
+    scheduler = Scheduler(on_error=lambda s, e: errors.append(e))
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=5)
+
+    # when
+    readings = scheduler.run_pending()
+
+    # then
+    assert readings == []
+    assert isinstance(errors[0], NoSensorFoundError)
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"},)], indirect=["sensors"])
+def test_scheduler_thread_survives_failing_callback(sensors, bus_master_dir):
+    # given
+    readings = queue.Queue()
+    errors = queue.Queue()
+
+    def callback(reading):
+        readings.put(reading)
+        raise RuntimeError("callback failed")
+
+    scheduler = Scheduler(callback=callback, on_error=lambda s, e: errors.put((s.id, e)))
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=0.01)
+
+    # when
+    scheduler.start()
+    try:
+        received = [readings.get(timeout=5).sensor_id for _ in range(3)]
+        sensor_id, error = errors.get(timeout=5)
+    finally:
+        scheduler.stop()
+
+    # then the sensor is still read after the callback failed
+    assert received == ["1", "1", "1"]
+    assert sensor_id == "1"
+    assert str(error) == "callback failed"
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"},)], indirect=["sensors"])
+def test_scheduler_logs_unexpected_errors(sensors, mocker, caplog):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    sensor = W1ThermSensor(sensor_id="1")
+    mocker.patch.object(sensor, "get_temperature", side_effect=ValueError("garbled"))
+    scheduler.add(sensor, interval=5)
+
+    # when
+    first = scheduler.run_pending()
+    clock.now = 5.0
+    second = scheduler.run_pending()
+
+    # then the failed read is logged and the sensor is read again
+    assert first == second == []
+    assert caplog.text.count("Failed to read sensor 1") == 2
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"}, {"id": "2"})], indirect=["sensors"])
+def test_scheduler_threads(sensors, bus_master_dir):
+    # given
+    readings = queue.Queue()
+    scheduler = Scheduler(queue=readings)
+    scheduler.add(W1ThermSensor(sensor_id="1"), interval=0.01)
+
+    # when
+    scheduler.start()
+    try:
+        scheduler.add(W1ThermSensor(sensor_id="2"), interval=0.01, bus_master="w1_bus_master2")
+        received = {readings.get(timeout=5).sensor_id for _ in range(10)}
+    finally:
+        scheduler.stop()
+
+    # then
+    assert received == {"1", "2"}
+    assert {s.bus_master for s in scheduler.sensors} == {"w1_bus_master1", "w1_bus_master2"}
+
+
+def test_scheduler_rejects_invalid_max_utilization():
+    with pytest.raises(ValueError):
+        Scheduler(max_utilization=1.5)
+
+
+def test_scheduler_stretches_low_priority_intervals(kernel_module_dir):
+    # given
+    scheduler = Scheduler(clock=FakeClock())
+    sensor_1 = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    sensor_2 = W1ThermSensor.from_known(Sensor.DS18B20, "2")
+    scheduler.add(sensor_1, interval=1, priority=10, conversion_time=0.5)
+
+    # when
+    scheduler.add(sensor_2, interval=1, conversion_time=0.75)
+
+    # then
+    intervals = {s.sensor.id: s.interval for s in scheduler.sensors}
+    assert intervals == {"1": 1, "2": pytest.approx(1.5)}
+    assert scheduler.utilization == {None: BusUtilization(1.25, pytest.approx(1.0))}
+
+    # when the bus is no longer overloaded the intervals are restored
+    scheduler.remove(sensor_1)
+    assert [s.interval for s in scheduler.sensors] == [1]
+
+
+def test_scheduler_stretches_all_intervals_if_needed(kernel_module_dir):
+    # given
+    scheduler = Scheduler(clock=FakeClock(), max_utilization=0.5)
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), 1, 10, conversion_time=0.75)
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "2"), 1, 0, conversion_time=0.25)
+
+    # then
+    intervals = {s.sensor.id: s.interval for s in scheduler.sensors}
+    assert intervals == {"1": pytest.approx(2), "2": pytest.approx(2)}
+
+
+def test_scheduler_refuses_overloading_sensors(kernel_module_dir):
+    # given
+    scheduler = Scheduler(clock=FakeClock(), overload_policy=OverloadPolicy.REFUSE)
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=1)
+
+    # when
+    with pytest.raises(BusOverloadError, match="need 150% of the bus time"):
+        scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "2"), interval=1)
+
+    # then
+    assert [s.sensor.id for s in scheduler.sensors] == ["1"]
+
+
+def test_scheduler_reduces_low_priority_resolutions(kernel_module_dir, mocker):
+    # given
+    mocker.patch.object(W1ThermSensor, "get_resolution", return_value=12)
+    set_resolution = mocker.patch.object(W1ThermSensor, "set_resolution", return_value=True)
+    scheduler = Scheduler(
+        clock=FakeClock(), overload_policy=OverloadPolicy.REDUCE_RESOLUTION
+    )
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=1, priority=10)
+
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "2"), interval=1)
+    assert not set_resolution.called
+
+    # when
+    scheduler.run_pending()
+
+    # then
+    assert set_resolution.call_args_list == [mocker.call(11), mocker.call(10)]
+    assert {s.sensor.id: s.resolution for s in scheduler.sensors} == {"1": None, "2": 10}
+    assert [s.interval for s in scheduler.sensors] == [1, 1]
+    assert scheduler.utilization[None].demand == pytest.approx(0.9375)
+
+
+def test_scheduler_stretches_if_resolution_cannot_be_reduced(kernel_module_dir, mocker):
+    # given
+    mocker.patch.object(W1ThermSensor, "get_resolution", return_value=12)
+    not_root = W1ThermSensorError("not root")
+    mocker.patch.object(W1ThermSensor, "set_resolution", side_effect=not_root)
+    errors = []
+    scheduler = Scheduler(
+        clock=FakeClock(),
+        overload_policy=OverloadPolicy.REDUCE_RESOLUTION,
+        on_error=lambda s, e: errors.append(s.id) if e is not_root else None,
+    )
+
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=1)
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "2"), interval=1)
+
+    # when
+    scheduler.run_pending()
+
+    # then
+    assert errors == ["1", "2"]
+    assert scheduler.utilization[None] == BusUtilization(1.5, pytest.approx(1.0))
+
+
+def test_scheduler_changes_resolutions_on_the_bus_thread(kernel_module_dir, mocker):
+    # given
+    threads = queue.Queue()
+    mocker.patch.object(W1ThermSensor, "get_temperature", return_value=20.0)
+    mocker.patch.object(W1ThermSensor, "get_resolution", return_value=12)
+    mocker.patch.object(
+        W1ThermSensor,
+        "set_resolution",
+        side_effect=lambda *args: threads.put(threading.current_thread().name),
+    )
+    scheduler = Scheduler(overload_policy=OverloadPolicy.REDUCE_RESOLUTION)
+    scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "1"), interval=1, priority=10)
+    scheduler.start()
+
+    # when
+    try:
+        scheduler.add(W1ThermSensor.from_known(Sensor.DS18B20, "2"), interval=1)
+        thread_name = threads.get(timeout=5)
+    finally:
+        scheduler.stop()
+
+    # then
+    assert thread_name.startswith("w1-scheduler-")
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1"},)], indirect=["sensors"])
+def test_scheduler_measures_conversion_times(sensors, mocker):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    sensor = W1ThermSensor(sensor_id="1")
+    scheduled = scheduler.add(sensor, interval=5)
+
+    def read_slowly(*args):
+        clock.now += 0.5
+        return 20.0
+
+    mocker.patch.object(sensor, "get_temperature", side_effect=read_slowly)
+
+    # when
+    scheduler.run_pending()
+
+    # then
+    assert scheduled.conversion_time == pytest.approx(0.7)
+    assert scheduler.utilization[None].utilization == pytest.approx(0.14)
+
+
+@pytest.mark.parametrize(
+    "deadband, max_interval, backoff", [(-1, 10, 2), (0.1, 10, 1)]
+)
+def test_invalid_adaptive_sampling(deadband, max_interval, backoff):
+    with pytest.raises(ValueError):
+        AdaptiveSampling(deadband, max_interval, backoff)
+
+
+def test_scheduler_rejects_max_interval_below_interval(kernel_module_dir):
+    with pytest.raises(ValueError):
+        Scheduler().add(
+            W1ThermSensor.from_known(Sensor.DS18B20, "1"),
+            interval=5,
+            adaptive=AdaptiveSampling(deadband=0.1, max_interval=1),
+        )
+
+
+def test_scheduler_adapts_interval_to_rate_of_change(kernel_module_dir, mocker):
+    # given
+    clock = FakeClock()
+    scheduler = Scheduler(clock=clock)
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    mocker.patch.object(
+        sensor, "get_temperature", side_effect=[20.0, 20.0, 20.05, 19.95, 20.0, 20.2, 20.2]
+    )
+    scheduled = scheduler.add(
+        sensor, interval=1, adaptive=AdaptiveSampling(deadband=0.1, max_interval=4)
+    )
+
+    # when & then
+    releases = []
+    for now in [0, 1, 3, 7, 11, 15, 16]:
+        clock.now = now
+        assert len(scheduler.run_pending()) == 1
+        releases.append(scheduled.release)
+
+    assert releases == [1, 3, 7, 11, 15, 16, 18]
+    assert scheduled.anchor == 20.2
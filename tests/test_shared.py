@@ -0,0 +1,249 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+from w1thermsensor.errors import W1ThermSensorError
+from w1thermsensor.readings import Reading
+from w1thermsensor.shared import (
+    SYSTEM_SHARED_READINGS_PATH,
+    SharedReadingsReader,
+    SharedReadingsWriter,
+    get_shared_readings_path,
+)
+from w1thermsensor.streams import pipe
+from w1thermsensor.units import Unit
+
+
+@pytest.fixture
+def table_path(tmpdir):
+    return str(tmpdir.join("latest"))
+
+
+def test_shared_readings_roundtrip(table_path):
+    # given
+    writer = SharedReadingsWriter(table_path, capacity=4)
+    reader = SharedReadingsReader(table_path)
+
+    # when
+    writer.write(Reading("00000588806a", 10.0, 20.5))
+    writer.write(Reading("00000588806b", 11.0, 68.0, Unit.DEGREES_F))
+    writer.write(Reading("00000588806a", 12.0, 21.0))
+
+    # then
+    assert reader.sensor_ids == ["00000588806a", "00000588806b"]
+    assert reader.get("00000588806a") == Reading("00000588806a", 12.0, 21.0)
+    assert reader.get("00000588806b", Unit.DEGREES_F) == Reading(
+        "00000588806b", 11.0, 68.0, Unit.DEGREES_F
+    )
+    assert reader.get("00000588806c") is None
+    assert reader.get_all() == [
+        Reading("00000588806a", 12.0, 21.0),
+        Reading("00000588806b", 11.0, 20.0),
+    ]
+    writer.close()
+    reader.close()
+
+
+def test_shared_readings_writer_as_stage(table_path):
+    # given
+    readings = [Reading("1", 1.0, 20.0), Reading("2", 2.0, 21.0)]
+
+    # when
+    with SharedReadingsWriter(table_path) as writer:
+        passed = list(pipe(readings, writer))
+
+    # then
+    assert passed == readings
+    with SharedReadingsReader(table_path) as reader:
+        assert reader.get_all() == readings
+
+
+def test_shared_readings_writer_reuses_table(table_path):
+    # given
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+    reader = SharedReadingsReader(table_path)
+
+    # when the collector restarts
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        writer.write(Reading("2", 2.0, 21.0))
+        writer.write(Reading("1", 3.0, 22.0))
+
+        # then the reader keeps working
+        assert reader.get_all() == [Reading("1", 3.0, 22.0), Reading("2", 2.0, 21.0)]
+    reader.close()
+
+
+def test_shared_readings_writer_resets_slots_left_in_the_middle_of_a_write(table_path):
+    # given the writer crashed in the middle of a write
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+        writer.write(Reading("2", 2.0, 21.0))
+        struct.pack_into("<I", writer._mmap, 16, 3)
+
+    # when the collector restarts
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        # then the torn reading is dropped and the slot can be read again
+        with SharedReadingsReader(table_path) as reader:
+            assert reader.get("1") is None
+            assert reader.get("2") == Reading("2", 2.0, 21.0)
+
+            writer.write(Reading("1", 3.0, 22.0))
+            assert reader.get("1") == Reading("1", 3.0, 22.0)
+
+
+def test_shared_readings_reader_follows_replaced_table(table_path):
+    # given
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+    reader = SharedReadingsReader(table_path)
+    assert reader.get("1") == Reading("1", 1.0, 20.0)
+
+    # when the collector restarts with another capacity
+    with SharedReadingsWriter(table_path, capacity=4) as writer:
+        writer.write(Reading("1", 2.0, 21.0))
+
+        # then the reader maps the new table
+        assert reader.get("1") == Reading("1", 2.0, 21.0)
+        assert reader.sensor_ids == ["1"]
+    reader.close()
+
+
+def test_shared_readings_writer_replaces_other_table(table_path):
+    # given
+    with open(table_path, "wb") as table_file:
+        table_file.write(b"something else")
+
+    # when
+    with SharedReadingsWriter(table_path, capacity=2) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+
+    # then
+    with SharedReadingsReader(table_path) as reader:
+        assert reader.get("1") == Reading("1", 1.0, 20.0)
+
+
+def test_shared_readings_table_is_full(table_path):
+    with SharedReadingsWriter(table_path, capacity=1) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+        with pytest.raises(W1ThermSensorError, match="full with 1 sensors"):
+            writer.write(Reading("2", 1.0, 20.0))
+
+
+def test_shared_readings_reader_retries_while_slot_is_written(table_path, monkeypatch):
+    # given
+    monkeypatch.setattr("w1thermsensor.shared.MAX_READ_RETRIES", 3)
+    with SharedReadingsWriter(table_path) as writer:
+        writer.write(Reading("1", 1.0, 20.0))
+        reader = SharedReadingsReader(table_path)
+
+        # when the writer crashed in the middle of a write
+        struct.pack_into("<I", writer._mmap, 16, 3)
+
+        # then
+        with pytest.raises(W1ThermSensorError, match="Failed to read"):
+            reader.get("1")
+        reader.close()
+
+
+def test_shared_readings_reader_without_table(table_path):
+    with pytest.raises(W1ThermSensorError, match="Is the collector running"):
+        SharedReadingsReader(table_path)
+
+
+@pytest.mark.parametrize(
+    "environ, euid, expected_path",
+    [
+        ({"W1THERMSENSOR_SHARED_READINGS": "/foo"}, 1000, "/foo"),
+        ({"XDG_RUNTIME_DIR": "/run/user/1000"}, 1000, "/run/user/1000/w1thermsensor-latest"),
+        ({"XDG_RUNTIME_DIR": "/run/user/0"}, 0, str(SYSTEM_SHARED_READINGS_PATH)),
+        ({}, 1000, str(SYSTEM_SHARED_READINGS_PATH)),
+    ],
+)
+def test_get_shared_readings_path(monkeypatch, environ, euid, expected_path):
+    # given
+    monkeypatch.delenv("W1THERMSENSOR_SHARED_READINGS", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr("os.geteuid", lambda: euid)
+
+    # when & then
+    assert str(get_shared_readings_path()) == expected_path
+
+
+def owned_by(uid):
+    return lambda *args: os.stat_result((0, 0, 0, 0, uid) + (0,) * 5)
+
+
+def test_shared_readings_reader_refuses_table_of_other_user(table_path, monkeypatch):
+    # given
+    SharedReadingsWriter(table_path).close()
+    monkeypatch.setattr("os.geteuid", lambda: 4242)
+    monkeypatch.setattr("os.fstat", owned_by(1000))
+
+    # when & then
+    with pytest.raises(W1ThermSensorError, match=r"owned by another user \(uid 1000\)"):
+        SharedReadingsReader(table_path)
+
+
+def test_shared_readings_writer_refuses_table_of_other_user(table_path, monkeypatch):
+    # given
+    SharedReadingsWriter(table_path).close()
+    monkeypatch.setattr("os.geteuid", lambda: 4242)
+    monkeypatch.setattr("pathlib.Path.lstat", owned_by(1000))
+
+    # when & then
+    with pytest.raises(W1ThermSensorError, match=r"owned by another user \(uid 1000\)"):
+        SharedReadingsWriter(table_path)
+
+
+def test_shared_readings_reader_trusts_table_of_root(table_path, monkeypatch):
+    # given
+    SharedReadingsWriter(table_path).close()
+    monkeypatch.setattr("os.geteuid", lambda: 4242)
+    monkeypatch.setattr("os.fstat", owned_by(0))
+
+    # when
+    with SharedReadingsReader(table_path) as table:
+        # then
+        assert table.get_all() == []
+
+
+def test_shared_readings_reader_falls_back_to_system_table(tmpdir, monkeypatch):
+    # given
+    system_path = tmpdir.join("system")
+    SharedReadingsWriter(str(system_path)).close()
+    monkeypatch.delenv("W1THERMSENSOR_SHARED_READINGS", raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmpdir.join("user")))
+    monkeypatch.setattr("os.geteuid", lambda: 1000)
+    monkeypatch.setattr("w1thermsensor.shared.SYSTEM_SHARED_READINGS_PATH", Path(system_path))
+
+    # when
+    with SharedReadingsReader() as table:
+        # then
+        assert table.path == Path(system_path)
+
+
+def test_shared_readings_reader_does_not_fall_back_from_configured_path(tmpdir, monkeypatch):
+    # given
+    system_path = tmpdir.join("system")
+    SharedReadingsWriter(str(system_path)).close()
+    monkeypatch.setenv("W1THERMSENSOR_SHARED_READINGS", str(tmpdir.join("configured")))
+    monkeypatch.setattr("w1thermsensor.shared.SYSTEM_SHARED_READINGS_PATH", Path(system_path))
+
+    # when & then
+    with pytest.raises(W1ThermSensorError, match="Is the collector running"):
+        SharedReadingsReader()
@@ -0,0 +1,210 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import statistics
+
+import pytest
+
+from w1thermsensor.readings import Reading
+from w1thermsensor.stats import (
+    Ewma,
+    QuantileSketch,
+    RunningStats,
+    SlidingWindow,
+    TumblingWindow,
+)
+from w1thermsensor.streams import pipe
+from w1thermsensor.units import Unit
+
+VALUES = [20.0, 21.5, 19.25, 22.0, 20.0625, 18.5, 25.0]
+
+
+def test_running_stats():
+    # given
+    stats = RunningStats()
+
+    # when
+    for value in VALUES:
+        stats.update(value)
+
+    # then
+    assert stats.count == len(VALUES)
+    assert stats.mean == pytest.approx(statistics.mean(VALUES))
+    assert stats.variance == pytest.approx(statistics.variance(VALUES))
+    assert stats.stddev == pytest.approx(statistics.stdev(VALUES))
+    assert (stats.min, stats.max) == (18.5, 25.0)
+
+
+def test_running_stats_merge():
+    # given
+    stats, first, second = RunningStats(), RunningStats(), RunningStats()
+    for value in VALUES[:3]:
+        first.update(value)
+    for value in VALUES[3:]:
+        second.update(value)
+
+    # when
+    stats.merge(first)
+    stats.merge(second)
+    stats.merge(RunningStats())
+
+    # then
+    assert stats.count == len(VALUES)
+    assert stats.mean == pytest.approx(statistics.mean(VALUES))
+    assert stats.variance == pytest.approx(statistics.variance(VALUES))
+    assert (stats.min, stats.max) == (18.5, 25.0)
+
+
+def test_running_stats_variance_of_single_value():
+    stats = RunningStats()
+    stats.update(20.0)
+    assert stats.variance == 0.0
+
+
+def test_ewma():
+    ewma = Ewma(0.5)
+    assert [ewma.update(v) for v in [20.0, 22.0, 22.0]] == [20.0, 21.0, 21.5]
+
+
+def test_invalid_ewma_alpha():
+    with pytest.raises(ValueError):
+        Ewma(0)
+
+
+@pytest.mark.parametrize("q, expected_quantile", [(0, 18.5), (0.5, 20.0625), (1, 25.0)])
+def test_quantile_sketch(q, expected_quantile):
+    # given
+    sketch = QuantileSketch()
+    for value in VALUES:
+        sketch.update(value)
+
+    # then
+    assert sketch.quantile(q) == expected_quantile
+
+
+def test_quantile_sketch_is_bounded():
+    # given
+    sketch = QuantileSketch(resolution=1)
+
+    # when
+    for i in range(10000):
+        sketch.update(20 + (i % 10) / 10)
+
+    # then
+    assert len(sketch._bins) == 2
+    assert sketch.quantile(0.5) == 20
+
+
+def test_quantile_sketch_merge():
+    # given
+    first, second = QuantileSketch(), QuantileSketch()
+    for value in VALUES[:3]:
+        first.update(value)
+    for value in VALUES[3:]:
+        second.update(value)
+
+    # when
+    first.merge(second)
+
+    # then
+    assert first.count == len(VALUES)
+    assert first.quantile(0.5) == 20.0625
+
+
+@pytest.mark.parametrize("q", [-0.1, 1.1])
+def test_quantile_sketch_invalid_quantile(q):
+    sketch = QuantileSketch()
+    sketch.update(20)
+    with pytest.raises(ValueError):
+        sketch.quantile(q)
+
+
+def test_quantile_sketch_without_values():
+    with pytest.raises(ValueError):
+        QuantileSketch().quantile(0.5)
+
+
+def test_tumbling_window():
+    # given
+    readings = [Reading("1", t, float(t), Unit.KELVIN) for t in range(26)]
+
+    # when
+    rollups = list(pipe(readings, TumblingWindow(10, quantiles=(0.5, 0.9))))
+
+    # then
+    assert [(r.start, r.end, r.samples, r.mean) for r in rollups] == [
+        (0, 10, 10, 4.5),
+        (10, 20, 10, 14.5),
+        (20, 30, 6, 22.5),
+    ]
+    assert rollups[0].quantiles == {0.5: 4.0, 0.9: 8.0}
+    assert (rollups[0].min, rollups[0].max) == (0, 9)
+    assert rollups[0].stddev == pytest.approx(statistics.stdev(range(10)))
+    assert rollups[0].unit == Unit.KELVIN
+    assert rollups[0].ewma == pytest.approx(3.486784401)
+
+
+def test_tumbling_window_skips_empty_windows_and_tracks_sensors_independently():
+    # given
+    readings = [
+        Reading("1", 0, 20.0),
+        Reading("2", 5, 30.0),
+        Reading("1", 100, 21.0),
+        Reading("2", 101, 31.0),
+    ]
+
+    # when
+    rollups = list(pipe(readings, TumblingWindow(10)))
+
+    # then
+    assert [(r.sensor_id, r.start, r.mean) for r in rollups] == [
+        ("1", 0, 20.0),
+        ("2", 0, 30.0),
+        ("1", 100, 21.0),
+        ("2", 100, 31.0),
+    ]
+
+
+def test_sliding_window():
+    # given
+    readings = [Reading("1", t, float(t)) for t in range(15)]
+
+    # when
+    rollups = list(pipe(readings, SlidingWindow(10, 5)))
+
+    # then
+    assert [(r.start, r.end, r.samples, r.mean) for r in rollups] == [
+        (-5, 5, 5, 2.0),
+        (0, 10, 10, 4.5),
+        (5, 15, 10, 9.5),
+    ]
+
+
+def test_sliding_window_after_gap():
+    # given
+    readings = [Reading("1", 0, 20.0), Reading("1", 100, 21.0)]
+
+    # when
+    rollups = list(pipe(readings, SlidingWindow(10, 5)))
+
+    # then
+    assert [(r.start, r.end, r.mean) for r in rollups] == [
+        (-5, 5, 20.0),
+        (0, 10, 20.0),
+        (95, 105, 21.0),
+    ]
+
+
+@pytest.mark.parametrize(
+    "size, step, quantiles", [(10, 3, (0.5,)), (10, 0, (0.5,)), (5, 10, (0.5,)), (10, 5, (2,))]
+)
+def test_invalid_sliding_window(size, step, quantiles):
+    with pytest.raises(ValueError):
+        SlidingWindow(size, step, quantiles)
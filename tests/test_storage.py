@@ -0,0 +1,153 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import sqlite3
+
+import pytest
+
+from w1thermsensor.readings import Reading
+from w1thermsensor.storage import DAY, RollupResolution, SQLiteSink, StoredRollup
+from w1thermsensor.streams import pipe
+from w1thermsensor.units import Unit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def database_path(tmpdir):
+    return str(tmpdir.join("readings.db"))
+
+
+def count_readings(path):
+    with sqlite3.connect(path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+
+
+def test_sink_uses_wal_and_index(database_path):
+    # when
+    SQLiteSink(database_path).close()
+
+    # then
+    with sqlite3.connect(database_path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = connection.execute("PRAGMA index_list(readings)").fetchall()
+        assert [i[1] for i in indexes] == ["readings_sensor_ts"]
+
+
+def test_sink_batches_inserts(database_path):
+    # given
+    clock = FakeClock()
+    sink = SQLiteSink(database_path, batch_size=3, flush_interval=10, clock=clock)
+
+    # when & then
+    sink.write(Reading("1", 0, 20.0))
+    sink.write(Reading("1", 1, 20.0))
+    assert count_readings(database_path) == 0
+
+    sink.write(Reading("1", 2, 20.0))
+    assert count_readings(database_path) == 3
+
+    sink.write(Reading("1", 3, 20.0))
+    clock.now = 10
+    sink.write(Reading("1", 4, 20.0))
+    assert count_readings(database_path) == 5
+
+    sink.write(Reading("1", 5, 20.0))
+    sink.close()
+    assert count_readings(database_path) == 6
+
+
+def test_sink_stores_readings_in_celsius(database_path):
+    # given
+    with SQLiteSink(database_path) as sink:
+        # when
+        sink.write(Reading("1", 10, 68.0, Unit.DEGREES_F))
+        sink.write(Reading("2", 10, 25.0))
+        sink.commit()
+
+        # then
+        assert sink.get_readings("1", 0, 20) == [Reading("1", 10, 20.0)]
+        assert sink.get_readings("1", 0, 10) == []
+
+
+def test_sink_maintains_rollups(database_path):
+    # given
+    readings = [
+        Reading("1", 0, 20.0),
+        Reading("1", 30, 22.0),
+        Reading("1", 60, 24.0),
+        Reading("2", 30, 30.0),
+        Reading("1", 3600, 10.0),
+    ]
+
+    with SQLiteSink(database_path, batch_size=2) as sink:
+        # when
+        list(pipe(readings, sink))
+
+        # then
+        assert sink.get_rollups("1", 0, 7200) == [
+            StoredRollup("1", 0, 60, 2, 21.0, 20.0, 22.0),
+            StoredRollup("1", 60, 120, 1, 24.0, 24.0, 24.0),
+            StoredRollup("1", 3600, 3660, 1, 10.0, 10.0, 10.0),
+        ]
+        assert sink.get_rollups("1", 0, 7200, RollupResolution.HOUR) == [
+            StoredRollup("1", 0, 3600, 3, 22.0, 20.0, 24.0),
+            StoredRollup("1", 3600, 7200, 1, 10.0, 10.0, 10.0),
+        ]
+        assert sink.get_rollups("2", 0, 7200, RollupResolution.HOUR) == [
+            StoredRollup("2", 0, 3600, 1, 30.0, 30.0, 30.0),
+        ]
+
+
+def test_sink_prunes_old_data(database_path):
+    # given
+    clock = FakeClock()
+    sink = SQLiteSink(
+        database_path, batch_size=1, retention=DAY, minute_retention=2 * DAY, clock=clock
+    )
+    sink.write(Reading("1", 0, 20.0))
+
+    # when
+    clock.now = 3600
+    sink.write(Reading("1", 1.5 * DAY, 21.0))
+
+    # then
+    assert [r.timestamp for r in sink.get_readings("1", 0, 3 * DAY)] == [1.5 * DAY]
+    assert len(sink.get_rollups("1", 0, 3 * DAY)) == 2
+
+    # when
+    clock.now = 7200
+    sink.write(Reading("1", 2.5 * DAY, 21.0))
+
+    # then the minute rollups are pruned but the hour rollups are kept
+    assert [r.start for r in sink.get_rollups("1", 0, 3 * DAY)] == [1.5 * DAY, 2.5 * DAY]
+    assert len(sink.get_rollups("1", 0, 3 * DAY, RollupResolution.HOUR)) == 3
+    sink.close()
+
+
+def test_sink_prunes_at_most_hourly(database_path):
+    # given
+    clock = FakeClock()
+    sink = SQLiteSink(database_path, batch_size=1, retention=DAY, clock=clock)
+    sink.write(Reading("1", 0, 20.0))
+
+    # when
+    clock.now = 60
+    sink.write(Reading("1", 2 * DAY, 21.0))
+
+    # then
+    assert len(sink.get_readings("1", 0, 3 * DAY)) == 2
+    sink.close()
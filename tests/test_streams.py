@@ -0,0 +1,196 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import itertools
+
+import pytest
+
+from w1thermsensor.async_core import AsyncW1ThermSensor
+from w1thermsensor.core import W1ThermSensor
+from w1thermsensor.errors import NoSensorFoundError
+from w1thermsensor.readings import Reading
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.streams import Deadband, Hampel, Stage, apipe, astream, pipe, stream
+from w1thermsensor.units import Unit
+
+
+def make_readings(*temperatures, sensor_id="1", interval=1.0):
+    return [
+        Reading(sensor_id, i * interval, temperature) for i, temperature in enumerate(temperatures)
+    ]
+
+
+async def aiterate(items):
+    for item in items:
+        yield item
+
+
+class Pairs(Stage):
+    """Emits pairs of temperatures and the pending one at the end"""
+
+    def __init__(self):
+        self.pending = []
+
+    def process(self, item):
+        self.pending.append(item.temperature)
+        if len(self.pending) == 2:
+            pair, self.pending = tuple(self.pending), []
+            return (pair,)
+        return ()
+
+    def flush(self):
+        return (tuple(self.pending),) if self.pending else ()
+
+
+def test_stage_requires_process():
+    # given
+    class Incomplete(Stage):
+        pass
+
+    # when & then
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("sensors", [({"id": "1", "temperature": 20},)], indirect=["sensors"])
+def test_stream(sensors):
+    # given
+    sensor = W1ThermSensor(sensor_id="1")
+
+    # when
+    readings = list(itertools.islice(stream(sensor, 0.001, Unit.KELVIN), 3))
+
+    # then
+    assert [(r.sensor_id, r.unit) for r in readings] == [("1", Unit.KELVIN)] * 3
+    assert [r.temperature for r in readings] == [pytest.approx(293.15)] * 3
+
+
+def test_stream_raises_errors(kernel_module_dir):
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    with pytest.raises(NoSensorFoundError):
+        next(stream(sensor, 0.001))
+
+
+def test_stream_reports_errors(kernel_module_dir, mocker):
+    # given
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    mocker.patch.object(
+        sensor, "get_temperature", side_effect=[NoSensorFoundError("gone"), 20.0]
+    )
+    errors = []
+
+    # when
+    reading = next(stream(sensor, 0.001, on_error=lambda s, e: errors.append(s)))
+
+    # then
+    assert reading.temperature == 20.0
+    assert errors == [sensor]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sensors", [({"id": "1", "temperature": 20},)], indirect=["sensors"])
+async def test_astream(sensors):
+    # given
+    sensor = AsyncW1ThermSensor(sensor_id="1")
+
+    # when
+    readings = []
+    async for reading in astream(sensor, 0.001):
+        readings.append(reading)
+        if len(readings) == 2:
+            break
+
+    # then
+    assert [r.temperature for r in readings] == [20.0, 20.0]
+
+
+def test_pipe_passes_items_through_stages_and_flushes():
+    readings = make_readings(1, 2, 3)
+    assert list(pipe(readings, Pairs())) == [(1, 2), (3,)]
+    assert list(pipe(readings)) == readings
+
+
+@pytest.mark.asyncio
+async def test_apipe():
+    readings = make_readings(1, 2, 3)
+    assert [p async for p in apipe(aiterate(readings), Pairs())] == [(1, 2), (3,)]
+
+
+def test_deadband_emits_changes_only():
+    readings = make_readings(20.0, 20.0, 20.0625, 20.0625, 20.0)
+    emitted = list(pipe(readings, Deadband()))
+    assert [r.temperature for r in emitted] == [20.0, 20.0625, 20.0]
+
+
+@pytest.mark.parametrize(
+    "deadband, expected_temperatures",
+    [
+        (Deadband(absolute=0.3), [20.0, 20.45, 21.5]),
+        (Deadband(relative=0.03), [20.0, 20.7, 21.5]),
+        (Deadband(absolute=0.1, relative=0.03), [20.0, 20.7, 21.5]),
+        (Deadband(absolute=0.3, relative=0.01), [20.0, 20.45, 21.5]),
+        (Deadband(absolute=0.3, heartbeat=3), [20.0, 20.45, 20.5, 21.5]),
+    ],
+)
+def test_deadband(deadband, expected_temperatures):
+    readings = make_readings(20.0, 20.2, 20.45, 20.7, 20.5, 20.5, 21.5)
+    emitted = list(pipe(readings, deadband))
+    assert [r.temperature for r in emitted] == expected_temperatures
+
+
+def test_deadband_tracks_sensors_independently():
+    readings = [Reading("1", 0, 20.0), Reading("2", 1, 20.0), Reading("1", 2, 20.0)]
+    emitted = list(pipe(readings, Deadband()))
+    assert [r.sensor_id for r in emitted] == ["1", "2"]
+
+
+def test_stream_rejects_invalid_interval(kernel_module_dir):
+    sensor = W1ThermSensor.from_known(Sensor.DS18B20, "1")
+    with pytest.raises(ValueError):
+        next(stream(sensor, 0))
+
+
+def test_invalid_deadband():
+    with pytest.raises(ValueError):
+        Deadband(absolute=-1)
+
+
+def test_hampel_suppresses_glitches():
+    # given
+    rejected = []
+    hampel = Hampel(window=5, on_reject=lambda r, m: rejected.append((r.temperature, m)))
+    readings = make_readings(20.0, 20.0625, 20.0, 20.125, 20.0625, 85.0, 20.0625, -3.0, 20.125)
+
+    # when
+    emitted = list(pipe(readings, hampel))
+
+    # then
+    assert [r.temperature for r in emitted] == [
+        20.0, 20.0625, 20.0, 20.125, 20.0625, 20.0625, 20.125
+    ]
+    assert rejected == [(85.0, 20.0625), (-3.0, 20.0625)]
+    assert hampel.rejected == 2
+
+
+def test_hampel_replaces_glitches():
+    readings = make_readings(20.0, 20.0, 20.0, 85.0, 20.0, sensor_id="1")
+    emitted = list(pipe(readings, Hampel(window=3, replace=True)))
+    assert [r.temperature for r in emitted] == [20.0] * 5
+
+
+def test_hampel_passes_steps():
+    readings = make_readings(20.0, 20.0, 20.0, 30.0, 30.0, 30.0)
+    emitted = list(pipe(readings, Hampel(window=3)))
+    assert [r.temperature for r in emitted] == [20.0, 20.0, 20.0, 30.0]
+
+
+def test_invalid_hampel_window():
+    with pytest.raises(ValueError):
+        Hampel(window=1)
@@ -0,0 +1,207 @@
+"""
+w1thermsensor
+~~~~~~~~~~~~~
+
+A Python package and CLI tool to work with w1 temperature sensors.
+
+:copyright: (c) 2020 by Timo Furrer <tuxtimo@gmail.com>
+:license: MIT, see LICENSE for more details.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from w1thermsensor.async_core import AsyncW1ThermSensor
+from w1thermsensor.sensors import Sensor
+from w1thermsensor.watcher import AsyncBusWatcher, BusWatcher
+
+
+def remove_sensor(kernel_module_dir, bus_master_dir, sensor):
+    """Simulate the given sensor leaving the bus"""
+    slave_name = "{0}-{1}".format(hex(sensor["type"])[2:], sensor["id"])
+    kernel_module_dir.join(slave_name).remove()
+    slaves = bus_master_dir.join("w1_master_slaves").read().replace(slave_name + "\n", "")
+    bus_master_dir.join("w1_master_slaves").write(slaves)
+
+
+def add_sensor(kernel_module_dir, bus_master_dir, slave_name):
+    """Simulate the sensor with the given slave name joining the bus"""
+    kernel_module_dir.mkdir(slave_name)
+    slaves = bus_master_dir.join("w1_master_slaves").read()
+    bus_master_dir.join("w1_master_slaves").write(slaves + slave_name + "\n")
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_bus_watcher_reports_added_and_removed_sensors(
+    sensors, kernel_module_dir, bus_master_dir
+):
+    # given
+    added, removed = [], []
+    watcher = BusWatcher(on_added=added.append, on_removed=removed.append)
+
+    # when
+    watcher.poll()
+
+    # then
+    assert {s.id for s in added} == {s["id"] for s in sensors}
+    assert removed == []
+
+    # when nothing changed
+    assert watcher.poll() == ([], [])
+
+    # when sensors join and leave
+    remove_sensor(kernel_module_dir, bus_master_dir, sensors[0])
+    add_sensor(kernel_module_dir, bus_master_dir, "28-00000588806a")
+    new_added, new_removed = watcher.poll()
+
+    # then
+    assert [s.id for s in new_added] == ["00000588806a"]
+    assert new_added[0].type == Sensor.DS18B20
+    assert [s.id for s in new_removed] == [sensors[0]["id"]]
+    assert [s.id for s in removed] == [sensors[0]["id"]]
+    assert {s.id for s in watcher.sensors} == {sensors[1]["id"], "00000588806a"}
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_bus_watcher_thread(sensors, bus_master_dir):
+    # given
+    added_event = threading.Event()
+    watcher = BusWatcher(on_added=lambda s: added_event.set(), interval=0.01)
+
+    # when
+    watcher.start()
+    try:
+        # then
+        assert added_event.wait(timeout=5)
+    finally:
+        watcher.stop()
+
+    assert [s.id for s in watcher.sensors] == [sensors[0]["id"]]
+
+
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+def test_bus_watcher_thread_reports_failed_polls(sensors, kernel_module_dir, bus_master_dir):
+    # given
+    errors = []
+    error_event = threading.Event()
+    added_event = threading.Event()
+
+    def on_added(sensor):
+        if not errors:
+            raise RuntimeError("callback failed")
+        added_event.set()
+
+    def on_error(exc):
+        errors.append(exc)
+        error_event.set()
+
+    watcher = BusWatcher(on_added=on_added, on_error=on_error, interval=0.01)
+
+    # when
+    watcher.start()
+    try:
+        assert error_event.wait(timeout=5)
+        add_sensor(kernel_module_dir, bus_master_dir, "28-00000588806a")
+
+        # then
+        assert added_event.wait(timeout=5)
+    finally:
+        watcher.stop()
+
+    assert str(errors[0]) == "callback failed"
+    assert watcher.errors == 1
+
+
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+def test_bus_watcher_reports_every_failed_callback(sensors, caplog):
+    # given
+    added = []
+
+    def on_added(sensor):
+        added.append(sensor.id)
+        raise RuntimeError("callback failed")
+
+    watcher = BusWatcher(on_added=on_added)
+
+    # when
+    watcher.poll()
+
+    # then all sensors were reported and every failure logged
+    assert sorted(added) == sorted(s["id"] for s in sensors)
+    assert watcher.errors == 2
+    assert caplog.text.count("Failed to watch the buses") == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+async def test_async_bus_watcher_reports_added_and_removed_sensors(
+    sensors, kernel_module_dir, bus_master_dir
+):
+    # given
+    added, removed = [], []
+
+    async def on_removed(sensor):
+        removed.append(sensor)
+
+    watcher = AsyncBusWatcher(on_added=added.append, on_removed=on_removed)
+
+    # when
+    await watcher.poll()
+    remove_sensor(kernel_module_dir, bus_master_dir, sensors[0])
+    await watcher.poll()
+
+    # then
+    assert [s.id for s in added] == [sensors[0]["id"]]
+    assert isinstance(added[0], AsyncW1ThermSensor)
+    assert [s.id for s in removed] == [sensors[0]["id"]]
+    assert watcher.sensors == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "sensors", [({"type": Sensor.DS18B20}, {"type": Sensor.DS1822})], indirect=["sensors"]
+)
+async def test_async_bus_watcher_reports_every_failed_callback(sensors):
+    # given
+    added, errors = [], []
+
+    async def on_added(sensor):
+        added.append(sensor.id)
+        raise RuntimeError("callback failed")
+
+    async def on_error(exc):
+        errors.append(exc)
+
+    watcher = AsyncBusWatcher(on_added=on_added, on_error=on_error)
+
+    # when
+    await watcher.poll()
+
+    # then
+    assert sorted(added) == sorted(s["id"] for s in sensors)
+    assert [str(e) for e in errors] == ["callback failed"] * 2
+    assert watcher.errors == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sensors", [({"type": Sensor.DS18B20},)], indirect=["sensors"])
+async def test_async_bus_watcher_task(sensors, bus_master_dir):
+    # given
+    added_event = asyncio.Event()
+    watcher = AsyncBusWatcher(on_added=lambda s: added_event.set(), interval=0.01)
+
+    # when
+    watcher.start()
+    try:
+        await asyncio.wait_for(added_event.wait(), timeout=5)
+    finally:
+        await watcher.stop()
+
+    # then
+    assert [s.id for s in watcher.sensors] == [sensors[0]["id"]]